@@ -4,14 +4,35 @@ from core.models import (
     Cart,
     CartItem,
     CustomUser,
+    Job,
     Order,
     Payment,
+    PaymentEvent,
+    PaymentOutbox,
     Product,
+    ProductDailySales,
     ShippingAddress,
+    StockReservation,
     Vendor,
+    VendorDailySales,
 )
 
 # Register your models here.
 admin.site.register(
-    [Cart, CustomUser, CartItem, Order, Payment, Product, ShippingAddress, Vendor]
+    [
+        Cart,
+        CustomUser,
+        Job,
+        CartItem,
+        Order,
+        Payment,
+        PaymentEvent,
+        PaymentOutbox,
+        Product,
+        ProductDailySales,
+        ShippingAddress,
+        StockReservation,
+        Vendor,
+        VendorDailySales,
+    ]
 )
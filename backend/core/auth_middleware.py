@@ -1,10 +1,56 @@
 from typing import Any
+from django.utils.translation import gettext_lazy as _
 from rest_framework.request import Request
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import Token
+from rest_framework_simplejwt.utils import get_md5_hash_password
 
+from core.cache import USER_FIELDS, cached_user
 
-class JWTCookieAuthentication(JWTAuthentication):
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through core.cache
+    instead of querying custom_users on every request
+    """
+
+    def get_user(self, validated_token: Token) -> Any:
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        try:
+            user = cached_user(
+                user_id,
+                lambda: self.user_model.objects.only(*USER_FIELDS).get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                ),
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found"
+            ) from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class JWTCookieAuthentication(CachedJWTAuthentication):
     """
     Custome authentication to read read jwt from cookie instead of header
     """
@@ -12,7 +58,7 @@ class JWTCookieAuthentication(JWTAuthentication):
     def authenticate(self, request: Request) -> tuple[Any, Token] | None:
         raw_token = request.COOKIES.get("access_token")
 
-        if raw_token is None:
+        if not raw_token:  # missing, or cleared by logout
             return None
 
         validated_token = self.get_validated_token(raw_token)
@@ -1,18 +1,26 @@
 from django.contrib.auth import authenticate
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from core.tokens import RefreshToken
+from core.emails import send_welcome_email
 from core.serializers import RegisterSerializer
+from core.throttling import (
+    LoginEmailRateThrottle,
+    LoginRateThrottle,
+    RegisterRateThrottle,
+)
 
 
 @api_view(["POST"])
+@throttle_classes([RegisterRateThrottle])
 def register_user(request: Request) -> Response:
     user_serializer = RegisterSerializer(data=request.data)
     if user_serializer.is_valid(raise_exception=True):
-        user_serializer.save()
+        user = user_serializer.save()
+        send_welcome_email(user.email)
         return Response(status=status.HTTP_201_CREATED)
 
     return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -20,6 +28,7 @@ def register_user(request: Request) -> Response:
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle, LoginEmailRateThrottle])
 def login_view(request: Request) -> Response:
     email = request.data.get("email")  # type: ignore
     password = request.data.get("password")  # type: ignore
@@ -0,0 +1,396 @@
+"""
+Latency and throughput benchmarks for the hot API endpoints.
+
+Each endpoint is called `warmup` times untimed and then `requests` times
+timed, either in process through the DRF test client, which also counts the
+queries every request runs, or over HTTP against a gunicorn server started
+for the run (see the benchmark command). Results are plain JSON-ready dicts;
+compare() lists the regressions between two of them.
+
+Throttling is off for the endpoint runs, which log in and add to carts far
+faster than the rate limits allow; run_throttles() times the throttles of
+those endpoints on their own instead.
+
+Benchmarks write (logins, carts, orders) to the configured database, so
+point it at a scratch database.
+"""
+
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from types import SimpleNamespace
+
+import requests
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Cart, CartItem, CustomUser, Product, ShippingAddress, Vendor
+from core.throttling import (
+    CartRateThrottle,
+    LoginEmailRateThrottle,
+    LoginRateThrottle,
+    RegisterRateThrottle,
+)
+
+PASSWORD = "Password@2"
+ENDPOINTS = ["products/all", "products/details", "carts", "auth/login", "checkout"]
+CART_LINES = 5
+SAMPLE_PRODUCTS = 1000
+THROTTLED = {
+    "auth/login": [LoginRateThrottle, LoginEmailRateThrottle],
+    "auth/register": [RegisterRateThrottle],
+    "cart/add": [CartRateThrottle],
+    "carts/batch": [CartRateThrottle],
+}
+
+# (method, path, json body)
+Call = tuple[str, str, dict | None]
+
+
+def prepare(workers: int) -> dict:
+    """
+    Benchmark users (one per concurrent worker) with an address and a
+    filled cart, plus the products requests are spread over.
+    """
+    products = [
+        str(pk)
+        for pk in Product.objects.filter(stock__gt=0)
+        .order_by("id")
+        .values_list("id", flat=True)[:SAMPLE_PRODUCTS]
+    ]
+    if not products:
+        raise ValueError("No products in stock; seed the database first")
+
+    vendor_user, _ = CustomUser.objects.get_or_create(
+        email="bench-vendor@example.com", defaults={"is_vendor": True}
+    )
+    vendor, _ = Vendor.objects.get_or_create(
+        user=vendor_user,
+        defaults={"brand_email": "bench-brand@example.com", "brand_name": "Bench"},
+    )
+    # checkout takes stock; this product never runs out
+    stocked, _ = Product.objects.update_or_create(
+        vendor=vendor,
+        name="Benchmark product",
+        defaults={
+            "stock": 10**9,
+            "description": "Bought by the checkout benchmark",
+            "current_price": Decimal("1000.00"),
+            "thumbnail": "products/placeholder.webp",
+        },
+    )
+
+    users = []
+    for worker in range(workers):
+        user, created = CustomUser.objects.get_or_create(
+            email=f"bench{worker}@example.com"
+        )
+        if created:
+            user.set_password(PASSWORD)
+            user.save(update_fields=["password"])
+        address, _ = ShippingAddress.objects.get_or_create(
+            user=user,
+            defaults={
+                "first_name": "Bench",
+                "last_name": "User",
+                "phone": "+2348000000000",
+                "address": "1 Marina",
+                "country": "Nigeria",
+                "state": "Lagos",
+                "lga": "Lagos Island",
+                "zip_code": "101001",
+            },
+        )
+        cart, _ = Cart.objects.get_or_create(user=user)
+        cart.cart_items.all().delete()
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product_id=pk) for pk in products[:CART_LINES]
+        )
+        users.append(
+            {
+                "email": user.email,
+                "address": str(address.id),
+                "token": str(RefreshToken.for_user(user).access_token),
+            }
+        )
+    return {"products": products, "stocked": str(stocked.id), "users": users}
+
+
+def plan(endpoint: str, fixture: dict, worker: int, i: int) -> tuple[list[Call], Call]:
+    """Untimed setup calls and the timed call for request `i` of `worker`."""
+    user = fixture["users"][worker]
+    product = fixture["products"][i % len(fixture["products"])]
+    if endpoint == "products/all":
+        return [], ("GET", "/api/products/all", None)
+    if endpoint == "products/details":
+        return [], ("GET", f"/api/products/details/{product}", None)
+    if endpoint == "carts":
+        return [], ("GET", "/api/carts", None)
+    if endpoint == "auth/login":
+        credentials = {"email": user["email"], "password": PASSWORD}
+        return [], ("POST", "/api/auth/login", credentials)
+    if endpoint == "checkout":
+        add = ("POST", f"/api/cart/add/{fixture['stocked']}", {"quantity": 1})
+        return [add], ("POST", f"/api/checkout/{user['address']}", None)
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+class ClientDriver:
+    """In process, through the test client; counts queries per request."""
+
+    def __init__(self, token: str):
+        self.api = APIClient()
+        self.api.cookies["access_token"] = token
+
+    def send(self, call: Call) -> tuple[int, int | None]:
+        method, path, data = call
+        with CaptureQueriesContext(connection) as queries:
+            if method == "GET":
+                response = self.api.get(path)
+            else:
+                response = self.api.post(path, data, format="json")
+        return response.status_code, len(queries)
+
+
+class HttpDriver:
+    """Over HTTP, one keep-alive session per worker; queries are not visible."""
+
+    def __init__(self, base_url: str, token: str):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.cookies.set("access_token", token)
+
+    def send(self, call: Call) -> tuple[int, int | None]:
+        method, path, data = call
+        response = self.session.request(
+            method, self.base_url + path, json=data, timeout=30
+        )
+        return response.status_code, None
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(
+    latencies: list[float], queries: list[int], errors: int, wall: float
+) -> dict:
+    ordered = sorted(latencies)
+    ms = [value * 1000 for value in ordered]
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(ms) / len(ms), 3),
+            "p50": round(percentile(ms, 50), 3),
+            "p95": round(percentile(ms, 95), 3),
+            "p99": round(percentile(ms, 99), 3),
+            "max": round(ms[-1], 3),
+        },
+        "queries_per_request": (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+    }
+
+
+def run_endpoint(
+    endpoint: str, drivers: list, fixture: dict, count: int, warmup: int
+) -> dict:
+    """
+    Benchmark one endpoint with one thread per driver. Throughput is wall
+    clock, so it includes untimed setup calls (checkout adds to the cart).
+    """
+    for i in range(warmup):
+        setup, call = plan(endpoint, fixture, 0, i)
+        for step in [*setup, call]:
+            drivers[0].send(step)
+
+    def work(worker: int):
+        latencies, queries, errors = [], [], 0
+        for i in range(warmup + worker, warmup + count, len(drivers)):
+            setup, call = plan(endpoint, fixture, worker, i)
+            for step in setup:
+                drivers[worker].send(step)
+            started = time.perf_counter()
+            status, ran = drivers[worker].send(call)
+            latencies.append(time.perf_counter() - started)
+            errors += status >= 400
+            if ran is not None:
+                queries.append(ran)
+        return latencies, queries, errors
+
+    started = time.perf_counter()
+    if len(drivers) == 1:
+        results = [work(0)]
+    else:
+        with ThreadPoolExecutor(len(drivers)) as executor:
+            results = list(executor.map(work, range(len(drivers))))
+    wall = time.perf_counter() - started
+
+    latencies, queries, errors = [], [], 0
+    for worker_latencies, worker_queries, worker_errors in results:
+        latencies += worker_latencies
+        queries += worker_queries
+        errors += worker_errors
+    return summarize(latencies, queries, errors, wall)
+
+
+def run_client(endpoints: list[str], fixture: dict, count: int, warmup: int):
+    drivers = [ClientDriver(fixture["users"][0]["token"])]
+    with override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], THROTTLING=False
+    ):
+        return {
+            endpoint: run_endpoint(endpoint, drivers, fixture, count, warmup)
+            for endpoint in endpoints
+        }
+
+
+def run_http(
+    base_url: str, endpoints: list[str], fixture: dict, count: int, warmup: int
+):
+    drivers = [HttpDriver(base_url, user["token"]) for user in fixture["users"]]
+    return {
+        endpoint: run_endpoint(endpoint, drivers, fixture, count, warmup)
+        for endpoint in endpoints
+    }
+
+
+def run_throttles(count: int) -> dict:
+    """
+    Time what the throttles add to each throttled endpoint, against the
+    configured cache. Every request comes from a new address, email and
+    user, so each one also creates its window counters, the slower path.
+    Errors are requests the throttles rejected.
+    """
+    factory = APIRequestFactory()
+    results = {}
+    with override_settings(THROTTLING=True):
+        for endpoint, throttles in THROTTLED.items():
+            latencies, errors = [], 0
+            started = time.perf_counter()
+            for i in range(count):
+                request = Request(
+                    factory.post(
+                        "/",
+                        {"email": f"throttle{i}@example.com"},
+                        format="json",
+                        REMOTE_ADDR=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                    ),
+                    parsers=[JSONParser()],
+                )
+                request.user = SimpleNamespace(pk=f"throttle{i}", is_authenticated=True)
+                request.data  # parsed by the view anyway; not the throttle's cost
+                begun = time.perf_counter()
+                allowed = all(
+                    throttle().allow_request(request, None) for throttle in throttles
+                )
+                latencies.append(time.perf_counter() - begun)
+                errors += not allowed
+            wall = time.perf_counter() - started
+            results[endpoint] = summarize(latencies, [], errors, wall)
+    return results
+
+
+@contextmanager
+def gunicorn(workers: int, threads: int, timeout: float = 30):
+    """Serve the project with gunicorn on a free local port; yields its URL."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+    env = os.environ | {
+        "ALLOWED_HOSTS": ",".join([*settings.ALLOWED_HOSTS, "127.0.0.1"]),
+        "THROTTLING": "False",
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "zconfig.wsgi:application",
+            f"--bind=127.0.0.1:{port}",
+            f"--workers={workers}",
+            f"--threads={threads}",
+            "--log-level=warning",
+        ],
+        cwd=settings.BASE_DIR,
+        env=env,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {process.returncode}")
+            try:
+                requests.get(f"{base_url}/health", timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn did not start in time")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout)
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Regressions of `current` against `baseline`: p95 latency up, or
+    throughput down, by more than `threshold` (a fraction), more errors, or
+    at least one more query per request.
+    """
+    regressions = []
+    for server, endpoints in current["results"].items():
+        for endpoint, now in endpoints.items():
+            before = baseline["results"].get(server, {}).get(endpoint)
+            if not before:
+                continue
+            name = f"{server} {endpoint}"
+            p95, old_p95 = now["latency_ms"]["p95"], before["latency_ms"]["p95"]
+            if p95 > old_p95 * (1 + threshold):
+                regressions.append(f"{name}: p95 {old_p95}ms -> {p95}ms")
+            rps, old_rps = now["throughput_rps"], before["throughput_rps"]
+            if rps and old_rps and rps < old_rps * (1 - threshold):
+                regressions.append(f"{name}: throughput {old_rps}/s -> {rps}/s")
+            if now["errors"] > before["errors"]:
+                regressions.append(
+                    f"{name}: errors {before['errors']} -> {now['errors']}"
+                )
+            queries, old_queries = (
+                now["queries_per_request"],
+                before["queries_per_request"],
+            )
+            if queries is not None and old_queries is not None:
+                if queries - old_queries >= 1:
+                    regressions.append(
+                        f"{name}: queries/request {old_queries} -> {queries}"
+                    )
+    return regressions
+
+
+def revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
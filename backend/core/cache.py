@@ -0,0 +1,245 @@
+"""
+Read-through caching for the product catalog and authenticated users.
+
+Keys are versioned instead of deleted: every product and every vendor has
+its own version counter and the catalog as a whole has one more. A write
+bumps its own counter and the catalog's, which orphans every cached entry
+built from the old versions without having to know which listing pages
+contained the product. Product details embed the vendor, so their keys carry
+the vendor's version too and a vendor write is a single bump however large
+its catalog. Orphans age out via TTL.
+
+Concurrent misses on the same key are collapsed (single-flight): threads in
+one worker queue on a process-local lock, and workers race for a short
+cache.add() lock, so only one of them runs the query while the others wait
+for its result.
+
+Users resolved from JWTs are cached the same way, under a per-user version
+that CustomUser.save()/delete() bump. Every request reads the version, so
+a change is seen at once; the user itself comes from a small per-process
+LRU, then the shared cache, then the database. Only the fields in
+USER_FIELDS are cached, never the password hash; the rest are deferred and
+load from the database if a view reads them.
+"""
+
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+
+CATALOG_VERSION_KEY = "catalog:version"
+# what authentication and permission checks read from request.user
+USER_FIELDS = (
+    "id",
+    "email",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "is_customer",
+    "is_vendor",
+)
+
+_MISS = object()
+_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+_locks_guard = threading.Lock()
+# "user:<id>:v<version>" -> (expires at, fields), least recently used first
+_users: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+_users_guard = threading.Lock()
+
+
+def _product_version_key(product_id: UUID | str) -> str:
+    return f"product:{product_id}:version"
+
+
+def _get_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        # never read, so nothing can be cached under the current version
+        cache.add(key, 1, timeout=None)
+
+
+def _process_lock(key: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _locks[key] = lock
+        return lock
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], timeout: int) -> Any:
+    """
+    Return the cached value for `key`, computing and storing it on a miss.
+    Exceptions from `compute` propagate and nothing is cached.
+    """
+    value = cache.get(key, _MISS)
+    if value is not _MISS:
+        return value
+
+    with _process_lock(key):
+        value = cache.get(key, _MISS)
+        if value is not _MISS:
+            return value
+
+        lock_key = f"{key}:lock"
+        lock_timeout = settings.CATALOG_CACHE_LOCK_TIMEOUT
+        if cache.add(lock_key, 1, timeout=lock_timeout):
+            try:
+                value = compute()
+                cache.set(key, value, timeout=timeout)
+                return value
+            finally:
+                cache.delete(lock_key)
+
+        # another worker holds the lock; wait for it to publish the value
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key, _MISS)
+            if value is not _MISS:
+                return value
+        # the holder died or is too slow; compute without caching
+        return compute()
+
+
+def _vendor_version_key(vendor_id: UUID | str) -> str:
+    return f"vendor:{vendor_id}:version"
+
+
+def product_detail_key(product_id: UUID | str, host: str) -> str:
+    version = _get_version(_product_version_key(product_id))
+
+    def vendor():
+        # only queried again after the product changes
+        from core.models import Product
+
+        return (
+            Product.objects.filter(id=product_id)
+            .values_list("vendor_id", flat=True)
+            .first()
+        )
+
+    vendor_id = get_or_compute(
+        f"product:{product_id}:v{version}:vendor",
+        vendor,
+        settings.CATALOG_CACHE_TIMEOUT,
+    )
+    vendor_version = _get_version(_vendor_version_key(vendor_id)) if vendor_id else 0
+    return f"product:{product_id}:v{version}:{vendor_version}:{host}"
+
+
+def product_list_key(url: str) -> str:
+    version = _get_version(CATALOG_VERSION_KEY)
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    return f"products:list:v{version}:{digest}"
+
+
+def _invalidate(product_ids: Iterable[UUID | str]) -> None:
+    for product_id in product_ids:
+        _bump(_product_version_key(product_id))
+    _bump(CATALOG_VERSION_KEY)
+
+
+def invalidate_products(product_ids: Iterable[UUID | str]) -> None:
+    """
+    Orphan cached details for `product_ids` and every cached listing once
+    the current transaction commits, so readers cannot re-cache the old rows
+    in between. Call this after writes that bypass Product.save(), such as
+    queryset.update() or bulk_create().
+    """
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: _invalidate(product_ids))
+
+
+def invalidate_catalog() -> None:
+    """
+    Orphan every cached listing once the current transaction commits, for
+    writes that add products without changing existing ones (bulk loads).
+    """
+    transaction.on_commit(lambda: _bump(CATALOG_VERSION_KEY))
+
+
+def _invalidate_vendors(vendor_ids: Iterable[UUID | str]) -> None:
+    for vendor_id in vendor_ids:
+        _bump(_vendor_version_key(vendor_id))
+    _bump(CATALOG_VERSION_KEY)
+
+
+def invalidate_vendors(vendor_ids: Iterable[UUID | str]) -> None:
+    """
+    Orphan cached details of every product of `vendor_ids` and every cached
+    listing once the current transaction commits. Vendor.save() and delete()
+    call this; writes that bypass them (queryset.update()) must call it
+    themselves.
+    """
+    vendor_ids = list(vendor_ids)
+    transaction.on_commit(lambda: _invalidate_vendors(vendor_ids))
+
+
+def _user_version_key(user_id: UUID | str) -> str:
+    return f"user:{user_id}:version"
+
+
+def _user_from(fields: dict[str, Any]) -> Any:
+    model = get_user_model()
+    # from_db() takes the values in field order
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in fields]
+    return model.from_db(
+        router.db_for_read(model), names, [fields[name] for name in names]
+    )
+
+
+def cached_user(user_id: UUID | str, load: Callable[[], Any]) -> Any:
+    """
+    The user `user_id`, built from USER_FIELDS found in the process LRU, the
+    shared cache or `load()`. Returns a new instance, so callers may modify
+    it; other fields are deferred. Exceptions from `load` propagate and
+    nothing is cached.
+    """
+    key = f"user:{user_id}:v{_get_version(_user_version_key(user_id))}"
+    now = time.monotonic()
+    with _users_guard:
+        hit = _users.get(key)
+        if hit is not None and hit[0] > now:
+            _users.move_to_end(key)
+            return _user_from(hit[1])
+
+    fields = cache.get(key, _MISS)
+    if fields is _MISS:
+        user = load()
+        fields = {name: getattr(user, name) for name in USER_FIELDS}
+        cache.set(key, fields, timeout=settings.USER_CACHE_TIMEOUT)
+    with _users_guard:
+        _users[key] = (now + settings.USER_CACHE_LOCAL_TTL, fields)
+        _users.move_to_end(key)
+        while len(_users) > settings.USER_CACHE_LOCAL_SIZE:
+            _users.popitem(last=False)
+    return _user_from(fields)
+
+
+def invalidate_user(user_id: UUID | str) -> None:
+    """
+    Orphan the cached copies of a user once the current transaction
+    commits. CustomUser.save() and delete() call this; writes that bypass
+    them (queryset.update()) must call it themselves.
+    """
+    transaction.on_commit(lambda: _bump(_user_version_key(user_id)))
@@ -0,0 +1,86 @@
+"""
+Checkout: turn a cart into an order and take its stock, atomically.
+
+Product rows are locked in primary key order, so two checkouts sharing
+products always queue on the same row first and cannot deadlock. Lines
+covered by an unexpired stock reservation are converted as they are; only
+lines whose hold lapsed are checked against what other carts hold. Stock is
+then taken with one conditional UPDATE for the whole cart, guarded by
+stock >= quantity, so even a path that skipped the locks could not oversell.
+Payment initialization is queued in the same transaction (see core.outbox)
+rather than called inline, so checkout never waits on the gateway.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from core.cache import invalidate_products
+from core.models import Cart, Order, OrderItem, Product, ShippingAddress
+from core.outbox import enqueue_payment
+from core.reservations import OutOfStock, active_holds, held_by_others
+
+
+class EmptyCart(ValueError):
+    pass
+
+
+def place_order(cart: Cart, shipping_address: ShippingAddress) -> Order:
+    """
+    Create a pending order from `cart`, decrement stock, queue its payment
+    initialization and empty the cart.
+    Raises EmptyCart or OutOfStock, in which case nothing is written.
+    """
+    with transaction.atomic():
+        quantities = dict(cart.cart_items.values_list("product_id", "quantity"))
+        if not quantities:
+            raise EmptyCart("Cart is empty")
+
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by("id")
+            .only("id", "name", "stock", "current_price")
+        }
+        missing = [pk for pk in quantities if pk not in products]
+        if missing:
+            raise OutOfStock("Some products are no longer available", missing)
+
+        holds = active_holds(cart)
+        uncovered = [pk for pk, qty in quantities.items() if holds.get(pk, 0) < qty]
+        if uncovered:
+            held = held_by_others(uncovered, cart)
+            for pk in uncovered:
+                if products[pk].stock - held.get(pk, 0) < quantities[pk]:
+                    raise OutOfStock(
+                        f"Product '{products[pk].name}' does not have enough stock",
+                        [pk],
+                    )
+
+        wanted = Case(*(When(id=pk, then=Value(qty)) for pk, qty in quantities.items()))
+        updated = Product.objects.filter(id__in=quantities, stock__gte=wanted).update(
+            stock=F("stock") - wanted, updated_at=timezone.now()
+        )
+        if updated != len(quantities):
+            raise OutOfStock("Some products do not have enough stock", quantities)
+        invalidate_products(quantities)
+
+        order = Order.objects.create(
+            user=cart.user,
+            shipping_address=shipping_address,
+            amount=cart.total_price,
+        )
+        items = OrderItem.objects.bulk_create(
+            OrderItem(
+                product_id=pk,
+                quantity=qty,
+                price_per_item=products[pk].current_price,
+            )
+            for pk, qty in quantities.items()
+        )
+        order.order_items.add(*items)
+        enqueue_payment(order, cart.user.email)
+        cart.cart_items.all().delete()
+        cart.reservations.all().delete()
+    return order
@@ -0,0 +1,148 @@
+"""
+Conditional GET (ETag / Last-Modified) for function based API views.
+
+Each validator returns a (fingerprint, last_modified) pair computed from
+timestamps and counts alone, so a 304 never pays for loading or serializing
+the payload. The ETag is a hash of the fingerprint together with the full
+request URL (and the user for private resources), which keeps it strong:
+any change to the representation changes the tag.
+"""
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Callable
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.request import Request
+
+from core.cache import get_or_compute, product_detail_key, product_list_key
+from core.filters import filter_products
+from core.models import CartItem, Product, ShippingAddress
+from core.serializers import ProductFilterSerializer
+
+Validator = Callable[..., tuple[str, datetime | None] | None]
+
+
+def _latest(*values: datetime | None) -> datetime | None:
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+
+def conditional(validator: Validator, private: bool = False):
+    """
+    Answer If-None-Match / If-Modified-Since on GET and HEAD with 304 and
+    attach ETag and Last-Modified to successful responses. Goes beneath
+    @api_view so the validator sees the authenticated user. A validator may
+    return None to skip conditional handling (e.g. the resource is missing).
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request: Request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            validated = validator(request, *args, **kwargs)
+            if validated is None:
+                return view(request, *args, **kwargs)
+
+            fingerprint, last_modified = validated
+            scope = str(request.user.pk) if private else ""
+            source = f"{request.build_absolute_uri()}|{scope}|{fingerprint}"
+            etag = quote_etag(hashlib.sha1(source.encode()).hexdigest())
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers["ETag"] = etag
+                if timestamp is not None:
+                    response.headers["Last-Modified"] = http_date(timestamp)
+                if private:
+                    patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def product_validator(request: Request, id) -> tuple[str, datetime | None] | None:
+    def compute():
+        return (
+            Product.objects.filter(id=id)
+            .values_list("updated_at", "vendor__updated_at")
+            .first()
+        )
+
+    # cached beside the detail payload so a 304 costs no query; product and
+    # vendor saves both bump its version
+    key = f"{product_detail_key(id, request.get_host())}:validator"
+    row = get_or_compute(key, compute, settings.CATALOG_CACHE_TIMEOUT)
+    if row is None:
+        return None
+    updated_at, vendor_updated_at = row
+    return f"{updated_at.isoformat()}|{vendor_updated_at.isoformat()}", _latest(
+        updated_at, vendor_updated_at
+    )
+
+
+def product_list_validator(request: Request) -> tuple[str, datetime | None] | None:
+    params = ProductFilterSerializer(data=request.query_params)
+    if not params.is_valid():
+        return None
+    filters = params.validated_data
+
+    def compute():
+        products = Product.objects.all()
+        if not filters["facets"]:
+            # facet counts span every vendor and price, so they need it all
+            products = filter_products(products, filters)
+        return products.aggregate(
+            count=Count("id"),
+            latest=Max("updated_at"),
+            vendor_latest=Max("vendor__updated_at"),
+        )
+
+    key = f"{product_list_key(request.build_absolute_uri())}:validator"
+    agg = get_or_compute(key, compute, settings.CATALOG_CACHE_TIMEOUT)
+    latest = _latest(agg["latest"], agg["vendor_latest"])
+    return f"{agg['count']}|{agg['latest']}|{agg['vendor_latest']}", latest
+
+
+def cart_validator(request: Request) -> tuple[str, datetime | None] | None:
+    agg = CartItem.objects.filter(cart__user=request.user).aggregate(
+        count=Count("id"),
+        quantity=Sum("quantity"),
+        latest=Max("updated_at"),
+        product_latest=Max("product__updated_at"),
+    )
+    fingerprint = "|".join(
+        str(agg[name]) for name in ("count", "quantity", "latest", "product_latest")
+    )
+    return fingerprint, _latest(agg["latest"], agg["product_latest"])
+
+
+def address_list_validator(request: Request) -> tuple[str, datetime | None] | None:
+    agg = ShippingAddress.objects.filter(user=request.user).aggregate(
+        count=Count("id"), latest=Max("updated_at")
+    )
+    return f"{agg['count']}|{agg['latest']}", agg["latest"]
+
+
+def address_validator(request: Request, id) -> tuple[str, datetime | None] | None:
+    updated_at = (
+        ShippingAddress.objects.filter(id=id, user=request.user)
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+    if updated_at is None:
+        return None
+    return updated_at.isoformat(), updated_at
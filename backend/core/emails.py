@@ -1,6 +1,8 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
 
+from core.jobs import enqueue, task
+
 html_message = '''
 <html>
 <style>
@@ -22,16 +24,53 @@ html_message = '''
 </html>
 '''
 
+def queue_email(
+    to_email: str,
+    subject: str,
+    message: str,
+    html_message: str = "",
+    delay: float = 0,
+):
+    """Send an email from the job queue instead of the request."""
+    return enqueue(
+        deliver_emails,
+        {
+            "subject": subject,
+            "message": message,
+            "html_message": html_message,
+            "from_email": settings.DEFAULT_FROM_EMAIL,
+            "to": [to_email],
+        },
+        queue="email",
+        delay=delay,
+    )
+
+
+@task(batch=True)
+def deliver_emails(emails: list[dict]) -> list[Exception | None]:
+    """Job task: send a batch of queued emails over one backend connection."""
+    results = []
+    with get_connection() as connection:
+        for email in emails:
+            message = EmailMultiAlternatives(
+                subject=email["subject"],
+                body=email["message"],
+                from_email=email["from_email"],
+                to=email["to"],
+                connection=connection,
+            )
+            if email["html_message"]:
+                message.attach_alternative(email["html_message"], "text/html")
+            try:
+                connection.send_messages([message])
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+    return results
+
+
 def send_welcome_email(to_email: str):
     subject = "Welcome to Our Platform!"
     message = "Thank you for registering with us. We're excited to have you on board!"
-    from_email = settings.DEFAULT_FROM_EMAIL
-
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=from_email,
-        recipient_list=[to_email],
-        fail_silently=False,
-        html_message=html_message
-        )
\ No newline at end of file
+
+    return queue_email(to_email, subject, message, html_message=html_message)
@@ -0,0 +1,111 @@
+"""
+Query-string filtering and facet counts for the product listing.
+
+Facets are disjunctive: the vendor counts ignore the vendor filter and the
+price bucket counts ignore the price filter, so the client can show how
+many products each alternative choice would return. Both are computed in a
+single GROUP BY vendor query using conditional aggregates.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q, QuerySet
+
+SORT_ORDERINGS = {
+    "newest": ("-created_at", "-id"),
+    "price_asc": ("current_price", "id"),
+    "price_desc": ("-current_price", "-id"),
+}
+
+
+def _price_q(filters: dict) -> Q:
+    q = Q()
+    if filters.get("min_price") is not None:
+        q &= Q(current_price__gte=filters["min_price"])
+    if filters.get("max_price") is not None:
+        q &= Q(current_price__lte=filters["max_price"])
+    return q
+
+
+def _vendor_q(filters: dict) -> Q:
+    if filters.get("vendor"):
+        return Q(vendor_id__in=filters["vendor"])
+    return Q()
+
+
+def _base_q(filters: dict) -> Q:
+    """
+    Every filter except price and vendor, the two faceted dimensions.
+    """
+    q = Q()
+    if filters.get("flash_sale") is not None:
+        q &= Q(is_on_flash_sales=filters["flash_sale"])
+    if filters.get("in_stock"):
+        q &= Q(stock__gt=0)
+    elif filters.get("in_stock") is False:
+        q &= Q(stock=0)
+    return q
+
+
+def filter_products(queryset: QuerySet, filters: dict) -> QuerySet:
+    return queryset.filter(_base_q(filters), _price_q(filters), _vendor_q(filters))
+
+
+def price_buckets() -> list[tuple[Decimal, Decimal | None]]:
+    """
+    [lower, upper) ranges from settings.CATALOG_PRICE_BUCKETS; the last one
+    is open-ended.
+    """
+    edges = [Decimal(edge) for edge in settings.CATALOG_PRICE_BUCKETS]
+    return list(zip(edges, edges[1:] + [None]))
+
+
+def _bucket_q(lower: Decimal, upper: Decimal | None) -> Q:
+    q = Q(current_price__gte=lower)
+    if upper is not None:
+        q &= Q(current_price__lt=upper)
+    return q
+
+
+def product_facets(queryset: QuerySet, filters: dict) -> dict:
+    buckets = price_buckets()
+    aggregates = {"in_price": Count("id", filter=_price_q(filters))}
+    for i, (lower, upper) in enumerate(buckets):
+        aggregates[f"bucket_{i}"] = Count("id", filter=_bucket_q(lower, upper))
+
+    rows = (
+        queryset.filter(_base_q(filters))
+        .values("vendor_id", "vendor__brand_name")
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+    selected = set(filters.get("vendor") or [])
+    vendors = []
+    bucket_counts = [0] * len(buckets)
+    for row in rows:
+        if row["in_price"]:
+            vendors.append(
+                {
+                    "id": row["vendor_id"],
+                    "brand_name": row["vendor__brand_name"],
+                    "count": row["in_price"],
+                }
+            )
+        if not selected or row["vendor_id"] in selected:
+            for i in range(len(buckets)):
+                bucket_counts[i] += row[f"bucket_{i}"]
+
+    vendors.sort(key=lambda vendor: (-vendor["count"], vendor["brand_name"]))
+    return {
+        "vendors": vendors,
+        "price": [
+            {
+                "min": str(lower),
+                "max": None if upper is None else str(upper),
+                "count": count,
+            }
+            for (lower, upper), count in zip(buckets, bucket_counts)
+        ],
+    }
@@ -0,0 +1,252 @@
+"""
+Responsive variants of product thumbnails and vendor avatars.
+
+Uploads are stored as they arrive, so saving a product costs no encoding.
+A new upload queues a build_variants job. The job reads the original and
+hands the CPU bound resizing and encoding to a process pool (core.imaging).
+It writes IMAGE_VARIANT_WIDTHS x IMAGE_VARIANT_FORMATS files beside the
+original and records their names, along with the source they were built
+from, in one conditional UPDATE. The UPDATE only applies if the image has
+not been replaced in the meantime.
+
+srcset() ignores variants built from an older source. Readers therefore see
+the original upload until the current one's variants are ready.
+
+Products created by a bulk import (core.imports) have no upload yet: a
+fetch_thumbnails job downloads their image URL, stores it as the thumbnail
+and queues the variants. Only public addresses are fetched unless
+IMPORT_IMAGE_ALLOW_PRIVATE is on, so vendors cannot point the server at
+internal services; the host is resolved once and the download connects to
+the address that passed that check.
+"""
+
+import ipaddress
+import multiprocessing
+import os
+import socket
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import cache
+
+import httpx
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import features
+
+from core import imaging
+from core.cache import invalidate_products, invalidate_vendors
+from core.jobs import enqueue, task
+from core.models import Product, Vendor, product_thumbail_path
+
+# kind -> (model, image field, variants field)
+TARGETS = {
+    "product": (Product, "thumbnail", "thumbnail_variants"),
+    "vendor": (Vendor, "avatar", "avatar_variants"),
+}
+EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+
+
+@cache
+def variant_formats() -> list[str]:
+    """Configured formats this Pillow build can encode."""
+    return [
+        fmt
+        for fmt in settings.IMAGE_VARIANT_FORMATS
+        if fmt in imaging.PIL_FORMATS and features.check(fmt.replace("jpeg", "jpg"))
+    ]
+
+
+@cache
+def pool() -> ProcessPoolExecutor:
+    # spawned, not forked: the job worker that owns the pool runs threads
+    return ProcessPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def bounded_upload(upload: File) -> File:
+    """
+    `upload` checked against the IMAGE_UPLOAD_* limits and, when larger than
+    IMAGE_UPLOAD_MAX_SIDE, shrunk to fit it. That is the only image work done
+    on the request path, so the original served until the variants are
+    built stays small. Raises ValueError.
+    """
+    if upload.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        megabytes = settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)
+        raise ValueError(f"Image size cannot exceed {megabytes}MB")
+    upload.seek(0)
+    data = upload.read()
+    bounded, fmt = imaging.bound(
+        data,
+        set(settings.IMAGE_UPLOAD_FORMATS),
+        settings.IMAGE_UPLOAD_MAX_PIXELS,
+        settings.IMAGE_UPLOAD_MAX_SIDE,
+    )
+    if bounded is data:
+        upload.seek(0)
+        return upload
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return ContentFile(bounded, name=f"{stem}.{fmt.lower().replace('jpeg', 'jpg')}")
+
+
+def queue_variants(kind: str, pk, source: str):
+    return enqueue(
+        build_variants, {"kind": kind, "id": str(pk), "source": source}, queue="images"
+    )
+
+
+def _encode(source: str) -> Future:
+    with default_storage.open(source, "rb") as f:
+        data = f.read()
+    args = (data, settings.IMAGE_VARIANT_WIDTHS, variant_formats())
+    if not settings.IMAGE_WORKERS:
+        future = Future()
+        future.set_result(imaging.encode(*args, settings.IMAGE_VARIANT_QUALITY))
+        return future
+    return pool().submit(imaging.encode, *args, settings.IMAGE_VARIANT_QUALITY)
+
+
+def _store(kind: str, pk, source: str, encoded) -> None:
+    model, field, store = TARGETS[kind]
+    folder, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    formats: dict[str, list] = {}
+    for fmt, width, data in encoded:
+        name = os.path.join(folder, "variants", f"{stem}-{width}.{EXTENSIONS[fmt]}")
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        name = default_storage.save(name, ContentFile(data))
+        formats.setdefault(fmt, []).append([width, name])
+
+    now = timezone.now()
+    updated = model.objects.filter(pk=pk, **{field: source}).update(
+        **{store: {"source": source, "formats": formats}}, updated_at=now
+    )
+    if updated:
+        if kind == "product":
+            invalidate_products([pk])
+        else:
+            invalidate_vendors([pk])
+
+
+@task(batch=True)
+def build_variants(images: list[dict]) -> list[Exception | None]:
+    """Job task: encode a batch of images in parallel and record the results."""
+    pending: list[Future | Exception] = []
+    for image in images:
+        try:
+            pending.append(_encode(image["source"]))
+        except Exception as e:
+            pending.append(e)
+
+    results = []
+    for image, future in zip(images, pending):
+        try:
+            if isinstance(future, Exception):
+                raise future
+            _store(image["kind"], image["id"], image["source"], future.result())
+            results.append(None)
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _resolve(url: httpx.URL) -> str:
+    """
+    The vetted address to fetch `url` from. The connection goes to it rather
+    than to the host name, so a host that answers a second lookup with an
+    internal address (DNS rebinding) gains nothing.
+    """
+    host = url.raw_host.decode("ascii")
+    port = url.port or {"http": 80, "https": 443}[url.scheme]
+    addresses = [
+        info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    ]
+    if not settings.IMPORT_IMAGE_ALLOW_PRIVATE:
+        for address in addresses:
+            if not ipaddress.ip_address(address).is_global:
+                raise ValueError(f"{url.host} is not a public address")
+    return addresses[0]
+
+
+def _download(client: httpx.Client, url: str) -> bytes:
+    target = httpx.URL(url)
+    pinned = target.copy_with(host=_resolve(target))
+    # the certificate is still checked against the host name, sent as SNI
+    extensions = (
+        {"sni_hostname": target.raw_host.decode("ascii")}
+        if target.scheme == "https"
+        else {}
+    )
+    data = bytearray()
+    with client.stream(
+        "GET",
+        pinned,
+        headers={"Host": target.netloc.decode("ascii")},
+        extensions=extensions,
+    ) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            data += chunk
+            if len(data) > settings.IMPORT_IMAGE_MAX_BYTES:
+                raise ValueError(
+                    f"{url} exceeds {settings.IMPORT_IMAGE_MAX_BYTES} bytes"
+                )
+    return bytes(data)
+
+
+def _fetch_thumbnail(client: httpx.Client, pk: str, url: str) -> None:
+    data, fmt = imaging.bound(
+        _download(client, url),
+        set(settings.IMAGE_UPLOAD_FORMATS),
+        settings.IMAGE_UPLOAD_MAX_PIXELS,
+        settings.IMAGE_UPLOAD_MAX_SIDE,
+    )
+    extension = EXTENSIONS.get(fmt.lower(), fmt.lower())
+    name = default_storage.save(
+        product_thumbail_path(None, f"{pk}.{extension}"), ContentFile(data)
+    )
+    updated = Product.objects.filter(pk=pk, thumbnail="").update(
+        thumbnail=name, updated_at=timezone.now()
+    )
+    if not updated:  # deleted, or given an image in the meantime
+        default_storage.delete(name)
+        return
+    invalidate_products([pk])
+    queue_variants("product", pk, name)
+
+
+@task(batch=True)
+def fetch_thumbnails(images: list[dict]) -> list[Exception | None]:
+    """Job task: download imported products' images, then build their variants."""
+    results = []
+    # redirects are not followed: each hop would need the host check
+    with httpx.Client(timeout=settings.IMPORT_IMAGE_TIMEOUT) as client:
+        for image in images:
+            try:
+                _fetch_thumbnail(client, image["id"], image["url"])
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+    return results
+
+
+def srcset(variants: dict | None, source, request=None) -> dict | None:
+    """
+    `{format: "url 150w, url 300w, ..."}` for the variants of `source`, or
+    None while they are missing or were built from an earlier upload.
+    """
+    if not source or not variants or variants.get("source") != source.name:
+        return None
+
+    def url(name: str) -> str:
+        path = default_storage.url(name)
+        return request.build_absolute_uri(path) if request else path
+
+    return {
+        fmt: ", ".join(f"{url(name)} {width}w" for width, name in sizes)
+        for fmt, sizes in variants["formats"].items()
+    }
@@ -0,0 +1,82 @@
+"""
+Pillow-only image work for the image process pool and the seed command.
+
+Worker processes are spawned and import this module on their own, so it
+must not import Django or anything that needs configured settings.
+"""
+
+import io
+import random
+
+from PIL import Image, ImageOps
+
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "jpeg": "JPEG"}
+
+
+def fitting_widths(width: int, widths: list[int]) -> list[int]:
+    """The requested widths the image can fill without upscaling."""
+    return [w for w in widths if w <= width] or [width]
+
+
+def encode(
+    data: bytes, widths: list[int], formats: list[str], quality: int
+) -> list[tuple[str, int, bytes]]:
+    """
+    Resize the image in `data` to each width that fits, in every format.
+    Returns (format, width, encoded bytes) triples.
+    """
+    variants = []
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for width in fitting_widths(image.width, widths):
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                frame = resized.convert("RGB") if fmt == "jpeg" else resized
+                buffer = io.BytesIO()
+                frame.save(buffer, format=PIL_FORMATS[fmt], quality=quality)
+                variants.append((fmt, width, buffer.getvalue()))
+    return variants
+
+
+def bound(
+    data: bytes, formats: set[str], max_pixels: int, max_side: int
+) -> tuple[bytes, str]:
+    """
+    Check that `data` is an image in one of `formats` (Pillow names) with at
+    most `max_pixels`, and shrink it to fit `max_side` if needed. Returns the
+    image, unchanged when it already fits, and its format. Raises ValueError.
+    """
+    try:
+        source = Image.open(io.BytesIO(data))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError("Upload a valid image") from e
+    with source:
+        fmt = source.format
+        if fmt not in formats:
+            raise ValueError(f"Only {', '.join(sorted(formats))} images are allowed")
+        if source.width * source.height > max_pixels:
+            raise ValueError(f"Images cannot exceed {max_pixels:,} pixels")
+        if max(source.size) <= max_side:
+            return data, fmt
+        source.draft("RGB", (max_side, max_side))  # JPEG decodes at a reduced scale
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=85)
+    return buffer.getvalue(), fmt
+
+
+def placeholder(index: int, seed: int, size: int = 800) -> bytes:
+    """A deterministic two-tone JPEG, for seeding catalogs without photos."""
+    rng = random.Random(seed * 1_000_003 + index)
+    back = tuple(rng.randrange(256) for _ in range(3))
+    front = tuple(255 - c for c in back)
+    image = Image.new("RGB", (size, size), back)
+    inset = rng.randrange(size // 8, size // 3)
+    image.paste(front, (inset, inset, size - inset, size - inset))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
@@ -0,0 +1,207 @@
+"""
+Bulk product import from CSV or JSON Lines, for vendors onboarding a catalog.
+
+The file is read as a stream, one row at a time, so memory stays flat
+whatever its size. clean_row() validates a row with plain checks that mirror
+ProductSerializer, without building a serializer per row. Valid rows are
+written with bulk_create every IMPORT_CHUNK_SIZE rows, one transaction per
+chunk, so a failure loses at most the chunk in flight. Images are not
+touched here: products are created without a thumbnail, and a
+fetch_thumbnails job (core.images) downloads each image_url and then queues
+the usual variant build. Invalid rows are reported by line, keeping the
+first IMPORT_MAX_ERRORS.
+
+bulk_create bypasses Product.save(), so the cache entries are invalidated
+per chunk. The search index triggers (migration 0004) fire on bulk inserts
+like any other insert.
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from typing import IO, Iterator
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from core.cache import invalidate_products
+from core.images import fetch_thumbnails
+from core.jobs import enqueue_many
+from core.models import Product, Vendor
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+REQUIRED = "This field is required."
+_url = URLValidator(schemes=["http", "https"])
+
+
+class RowError(Exception):
+    def __init__(self, errors: dict[str, list[str]]):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def format_of(filename: str) -> str | None:
+    """The import format a file name's extension stands for."""
+    for extension, fmt in FORMATS.items():
+        if filename.lower().endswith(extension):
+            return fmt
+    return None
+
+
+def read_rows(stream: IO[bytes], fmt: str) -> Iterator[tuple[int, dict | RowError]]:
+    """(line, row) pairs of a binary stream; unreadable rows come as RowError."""
+    # undecodable bytes become U+FFFD and fail validation, not the import
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:  # the reader resumes at the next line
+                yield reader.line_num, RowError({"row": [str(e)]})
+                continue
+            yield reader.line_num, row
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            yield line, RowError({"row": [f"Invalid JSON: {e}"]})
+            continue
+        if not isinstance(row, dict):
+            yield line, RowError({"row": ["Expected a JSON object"]})
+            continue
+        yield line, row
+
+
+def _text(row: dict, field: str, errors: dict, max_length: int | None = None):
+    value = row.get(field)
+    if not isinstance(value, str) or not value.strip():
+        errors[field] = [REQUIRED]
+        return None
+    value = value.strip()
+    if max_length and len(value) > max_length:
+        errors[field] = [f"Ensure this field has no more than {max_length} characters."]
+    return value
+
+
+def clean_row(row: dict) -> dict:
+    """Product fields of a row, or RowError listing what is wrong with it."""
+    errors: dict[str, list[str]] = {}
+    name = _text(row, "name", errors, max_length=128)
+    description = _text(row, "description", errors)
+
+    price = row.get("current_price")
+    try:
+        if isinstance(price, bool) or price is None or price == "":
+            raise InvalidOperation
+        price = Decimal(str(price).strip())
+        if not price.is_finite():
+            raise InvalidOperation
+    except InvalidOperation:
+        errors["current_price"] = ["A valid number is required."]
+    else:
+        if price < 0:
+            errors["current_price"] = [
+                "Ensure this value is greater than or equal to 0."
+            ]
+        elif price.as_tuple().exponent < -2 or price >= 10**16:
+            errors["current_price"] = [
+                "Ensure there are no more than 16 digits before and 2 after the "
+                "decimal point."
+            ]
+
+    stock = row.get("stock")
+    try:
+        if isinstance(stock, bool) or isinstance(stock, float):
+            raise ValueError
+        stock = int(str(stock).strip())
+    except ValueError:
+        errors["stock"] = ["A valid integer is required."]
+    else:
+        if stock < 1:
+            errors["stock"] = ["Stock count cannot be less than one"]
+        elif stock > 2**31 - 1:
+            errors["stock"] = ["Ensure this value is less than or equal to 2147483647."]
+
+    image_url = _text(row, "image_url", errors, max_length=2000)
+    if image_url and "image_url" not in errors:
+        try:
+            _url(image_url)
+        except ValidationError:
+            errors["image_url"] = ["Enter a valid http(s) URL."]
+
+    if errors:
+        raise RowError(errors)
+    return {
+        "name": name,
+        "description": description,
+        "current_price": price,
+        "stock": stock,
+        "image_url": image_url,
+    }
+
+
+def _insert(vendor: Vendor, rows: list[dict]) -> None:
+    products = []
+    for row in rows:
+        # what Product.save() would have done
+        old_price = row["current_price"] if row["current_price"] > 1 else None
+        products.append(
+            Product(
+                vendor=vendor,
+                name=row["name"],
+                description=row["description"],
+                current_price=row["current_price"],
+                old_price=old_price,
+                stock=row["stock"],
+                thumbnail="",
+            )
+        )
+    with transaction.atomic():
+        Product.objects.bulk_create(products)
+        enqueue_many(
+            fetch_thumbnails,
+            (
+                {"id": str(product.id), "url": row["image_url"]}
+                for product, row in zip(products, rows)
+            ),
+            queue="images",
+        )
+        invalidate_products(product.id for product in products)
+
+
+def import_products(
+    vendor: Vendor, stream: IO[bytes], fmt: str, chunk_size: int | None = None
+) -> dict:
+    """
+    Create `vendor`'s products from a CSV or JSONL stream; returns a report
+    with the numbers of created and failed rows and the first errors.
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    report = {"created": 0, "failed": 0, "errors": []}
+    chunk: list[dict] = []
+    for line, row in read_rows(stream, fmt):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            chunk.append(clean_row(row))
+        except RowError as e:
+            report["failed"] += 1
+            if len(report["errors"]) < settings.IMPORT_MAX_ERRORS:
+                report["errors"].append({"line": line, "errors": e.errors})
+            continue
+        if len(chunk) >= chunk_size:
+            _insert(vendor, chunk)
+            report["created"] += len(chunk)
+            chunk = []
+    if chunk:
+        _insert(vendor, chunk)
+        report["created"] += len(chunk)
+    return report
@@ -0,0 +1,204 @@
+"""
+A small database backed job queue for slow side effects (emails, ...).
+
+`enqueue` writes a Job row, in the caller's transaction when there is one,
+so the job exists exactly when the change that caused it does. Workers
+(the runworker command) claim due jobs with SELECT ... FOR UPDATE SKIP
+LOCKED and lease them by moving run_at forward, so concurrent workers never
+run the same job and a crashed worker's jobs run again once the lease ends.
+
+A task is a module level function decorated with @task. Batch tasks take
+every payload claimed for them in one round and return one result per
+payload (None, or the exception that item failed with); this is how emails
+share a single SMTP connection. Successful jobs are deleted. Failed jobs are
+retried with exponential backoff and marked Dead after max_attempts.
+Delivery is at least once: a job whose outcome could not be recorded runs
+again after its lease, so tasks should tolerate a repeat.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def task(func: Callable | None = None, *, batch: bool = False):
+    """Mark a module level function as a job task."""
+
+    def decorator(func: Callable) -> Callable:
+        func.job_name = f"{func.__module__}.{func.__qualname__}"
+        func.batch = batch
+        return func
+
+    return decorator(func) if func else decorator
+
+
+def enqueue(
+    func: Callable,
+    payload: dict | None = None,
+    *,
+    delay: float = 0,
+    queue: str = "default",
+    max_attempts: int | None = None,
+) -> Job:
+    return Job.objects.create(
+        queue=queue,
+        task=func.job_name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+
+def enqueue_many(
+    func: Callable,
+    payloads: Iterable[dict],
+    *,
+    queue: str = "default",
+    max_attempts: int | None = None,
+) -> list[Job]:
+    """enqueue() for many payloads, in one INSERT."""
+    now = timezone.now()
+    return Job.objects.bulk_create(
+        Job(
+            queue=queue,
+            task=func.job_name,
+            payload=payload,
+            run_at=now,
+            max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        )
+        for payload in payloads
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    seconds = settings.JOBS_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.JOBS_BACKOFF_MAX))
+
+
+def claim(queues: Iterable[str], batch_size: int) -> list[Job]:
+    """Lease up to `batch_size` due jobs from `queues` to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.Queued, queue__in=queues, run_at__lte=now)
+            .order_by("run_at")[:batch_size]
+        )
+        if jobs:
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                attempts=F("attempts") + 1,
+                run_at=now + timedelta(seconds=settings.JOBS_LEASE),
+                updated_at=now,
+            )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def execute(jobs: list[Job]) -> list[Exception | None]:
+    """Run claimed jobs, batch tasks one call per task; returns their errors."""
+    errors: dict[int, Exception | None] = {}
+    by_task: dict[str, list[Job]] = {}
+    for job in jobs:
+        by_task.setdefault(job.task, []).append(job)
+
+    for name, group in by_task.items():
+        try:
+            func = import_string(name)
+        except ImportError as e:
+            errors.update((job.id, e) for job in group)
+            continue
+        if getattr(func, "batch", False):
+            try:
+                results = list(func([job.payload for job in group]))
+                if len(results) != len(group):
+                    raise RuntimeError(
+                        f"{name} returned {len(results)} results for "
+                        f"{len(group)} jobs"
+                    )
+            except Exception as e:
+                results = [e] * len(group)
+            errors.update(zip((job.id for job in group), results))
+            continue
+        for job in group:
+            try:
+                func(job.payload)
+                errors[job.id] = None
+            except Exception as e:
+                errors[job.id] = e
+    return [errors[job.id] for job in jobs]
+
+
+def record(jobs: list[Job], errors: list[Exception | None]) -> None:
+    now = timezone.now()
+    Job.objects.filter(
+        id__in=[job.id for job, error in zip(jobs, errors) if error is None]
+    ).delete()
+    for job, error in zip(jobs, errors):
+        if error is None:
+            continue
+        dead = job.attempts >= job.max_attempts
+        Job.objects.filter(id=job.id).update(
+            status=Job.Status.Dead if dead else Job.Status.Queued,
+            run_at=now + retry_delay(job.attempts),
+            last_error=repr(error)[:2000],
+            updated_at=now,
+        )
+
+
+def run_once(queues: Iterable[str], batch_size: int) -> int:
+    """Claim, run and record one batch; returns how many jobs it held."""
+    jobs = claim(queues, batch_size)
+    if jobs:
+        record(jobs, execute(jobs))
+    return len(jobs)
+
+
+def work(
+    queues: Iterable[str],
+    batch_size: int,
+    stop: threading.Event,
+    interval: float,
+    until_empty: bool = False,
+) -> None:
+    """A worker loop; runs until `stop` is set (or the queue is empty)."""
+    queues = list(queues)
+    try:
+        while not stop.is_set():
+            try:
+                ran = run_once(queues, batch_size)
+            except DatabaseError:
+                # leased jobs run again when their lease ends
+                logger.exception("Job round failed")
+                connection.close()
+                ran = 0
+            if not ran:
+                if until_empty:
+                    return
+                stop.wait(interval)
+    finally:
+        connection.close()
+
+
+def requeue_dead(task_name: str | None = None) -> int:
+    """Give dead jobs a fresh set of attempts; returns how many."""
+    dead = Job.objects.filter(status=Job.Status.Dead)
+    if task_name:
+        dead = dead.filter(task=task_name)
+    return dead.update(
+        status=Job.Status.Queued,
+        attempts=0,
+        run_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
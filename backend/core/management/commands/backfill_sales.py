@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.sales import backfill, reset
+
+
+class Command(BaseCommand):
+    help = (
+        "Count successful payments that are not in the daily sales rollups yet, "
+        "in chunks; --rebuild recomputes the rollups from scratch"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Clear the rollups and vendor totals first",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            reset()
+        count = backfill(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recorded {count} payments"))
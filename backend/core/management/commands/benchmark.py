@@ -0,0 +1,147 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmark
+from core.models import Order, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot API endpoints and report JSON; writes to the "
+        "configured database, so run it against a scratch one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--server", choices=["client", "gunicorn", "both"], default="client"
+        )
+        parser.add_argument(
+            "--endpoint",
+            choices=benchmark.ENDPOINTS,
+            action="append",
+            dest="endpoints",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument(
+            "--concurrency", type=int, default=4, help="Client threads (gunicorn)"
+        )
+        parser.add_argument("--gunicorn-workers", type=int, default=2)
+        parser.add_argument("--gunicorn-threads", type=int, default=1)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--vendors", type=int, default=5)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=0)
+        parser.add_argument(
+            "--no-seed", action="store_true", help="Use the data already there"
+        )
+        parser.add_argument("--output", help="Write results here, not stdout")
+        parser.add_argument(
+            "--baseline", help="Fail if this run regresses against these results"
+        )
+        parser.add_argument(
+            "--compare",
+            nargs=2,
+            metavar=("BASELINE", "CURRENT"),
+            help="Only compare two result files",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.10,
+            help="Allowed p95/throughput change, as a fraction",
+        )
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            baseline, current = (self.load(path) for path in options["compare"])
+        else:
+            baseline = self.load(options["baseline"]) if options["baseline"] else None
+            current = self.run(options)
+            report = json.dumps(current, indent=2)
+            if options["output"]:
+                with open(options["output"], "w") as f:
+                    f.write(report + "\n")
+            else:
+                self.stdout.write(report)
+            if baseline is None:
+                return
+
+        regressions = benchmark.compare(baseline, current, options["threshold"])
+        if regressions:
+            raise CommandError("Regressions:\n" + "\n".join(regressions))
+        self.stderr.write(self.style.SUCCESS("No regressions"))
+
+    def load(self, path: str) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+    def run(self, options) -> dict:
+        if not options["no_seed"]:
+            call_command(
+                "seed",
+                users=options["users"],
+                vendors=options["vendors"],
+                products=options["products"],
+                orders=options["orders"],
+                idempotent=True,
+                stdout=self.stderr,
+            )
+        servers = (
+            ["client", "gunicorn"]
+            if options["server"] == "both"
+            else [options["server"]]
+        )
+        endpoints = options["endpoints"] or benchmark.ENDPOINTS
+        count, warmup = options["requests"], options["warmup"]
+        try:
+            fixture = benchmark.prepare(
+                max(options["concurrency"], 1) if "gunicorn" in servers else 1
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        results = {}
+        for server in servers:
+            self.stderr.write(f"Benchmarking {', '.join(endpoints)} ({server})")
+            if server == "client":
+                results[server] = benchmark.run_client(
+                    endpoints, fixture, count, warmup
+                )
+                continue
+            try:
+                with benchmark.gunicorn(
+                    options["gunicorn_workers"], options["gunicorn_threads"]
+                ) as base_url:
+                    results[server] = benchmark.run_http(
+                        base_url, endpoints, fixture, count, warmup
+                    )
+            except RuntimeError as e:
+                raise CommandError(str(e))
+        self.stderr.write("Benchmarking throttles")
+        results["throttles"] = benchmark.run_throttles(count)
+
+        return {
+            "meta": {
+                "revision": benchmark.revision(),
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "products": Product.objects.count(),
+                "orders": Order.objects.count(),
+                "requests": count,
+                "warmup": warmup,
+                "concurrency": options["concurrency"],
+                "gunicorn_workers": options["gunicorn_workers"],
+                "gunicorn_threads": options["gunicorn_threads"],
+            },
+            "results": results,
+        }
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.images import TARGETS, queue_variants
+
+
+class Command(BaseCommand):
+    help = "Queue variant builds for images whose variants are missing or stale"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind", choices=sorted(TARGETS), action="append", dest="kinds"
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for kind in options["kinds"] or sorted(TARGETS):
+            model, field, store = TARGETS[kind]
+            rows = (
+                model.objects.exclude(**{field: ""})
+                .exclude(**{f"{field}__isnull": True})
+                .values_list("pk", field, store)
+                .iterator(chunk_size=options["chunk_size"])
+            )
+            queued = 0
+            for pk, source, variants in rows:
+                if not variants or variants.get("source") != source:
+                    queue_variants(kind, pk, source)
+                    queued += 1
+            self.stdout.write(self.style.SUCCESS(f"Queued {queued} {kind} images"))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import format_of, import_products
+from core.models import Vendor
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a vendor's products from a .csv or .jsonl file with the columns "
+        "name, description, current_price, stock and image_url"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--vendor", required=True, help="Vendor id or brand email")
+        parser.add_argument("--format", choices=["csv", "jsonl"], dest="fmt")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        fmt = options["fmt"] or format_of(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot tell the format; pass --format")
+        vendor = self.vendor(options["vendor"])
+        try:
+            with open(options["path"], "rb") as f:
+                report = import_products(vendor, f, fmt, options["chunk_size"])
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        for error in report["errors"]:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']} products, {report['failed']} rows failed"
+            )
+        )
+
+    def vendor(self, key: str) -> Vendor:
+        try:
+            return Vendor.objects.get(brand_email=key)
+        except Vendor.DoesNotExist:
+            pass
+        try:
+            return Vendor.objects.get(id=key)
+        except (Vendor.DoesNotExist, ValidationError):
+            raise CommandError(f"No vendor {key}")
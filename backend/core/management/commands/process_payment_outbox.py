@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Deliver queued payment initializations to the payment gateway"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.PAYMENT_OUTBOX_WORKERS
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.PAYMENT_OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the outbox is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain what is due, then exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain(
+                workers=options["workers"], batch_size=options["batch_size"]
+            )
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.tokens import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired refresh tokens and blacklist entries in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = purge_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} expired tokens"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired stock reservations in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = release_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {count} expired reservations"))
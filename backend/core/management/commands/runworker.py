@@ -0,0 +1,67 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import requeue_dead, work
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the jobs table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help="Worker threads, each claiming its own batches",
+        )
+        parser.add_argument(
+            "--queue",
+            action="append",
+            dest="queues",
+            help="Queue to serve (repeatable); defaults to default, email and images",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.JOBS_BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=float, default=settings.JOBS_POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no job is due"
+        )
+        parser.add_argument(
+            "--requeue-dead",
+            action="store_true",
+            help="Move dead jobs back to the queue before starting",
+        )
+
+    def handle(self, *args, **options):
+        queues = options["queues"] or ["default", "email", "images"]
+        if options["requeue_dead"]:
+            self.stdout.write(f"Requeued {requeue_dead()} dead jobs")
+
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        threads = [
+            threading.Thread(
+                target=work,
+                args=(queues, options["batch_size"], stop, options["interval"]),
+                kwargs={"until_empty": options["once"]},
+                name=f"runworker-{i}",
+            )
+            for i in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS("Worker stopped"))
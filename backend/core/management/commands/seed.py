@@ -1,80 +1,305 @@
+"""
+Seed the database with synthetic data, from a handful of rows for local
+development up to load test scale (e.g. --products 1000000 --orders 1000000,
+about 5M order items).
+
+Rows are built in memory and written with chunked bulk_create, one
+transaction per chunk. Every value comes from generators seeded with --seed
+and primary keys are uuid5 names of the row index, so the same arguments
+always produce the same data. --idempotent skips rows that already exist,
+which also makes an interrupted run resumable.
+"""
+
 import os
 import random
-from django.core.files import File
-from django.db import transaction
-from django.core.management.base import BaseCommand
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import batched, repeat
+from multiprocessing import get_context
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
 from faker import Faker
 
-from core.models import Product, Vendor
+from core import sales
+from core.cache import invalidate_catalog
+from core.imaging import placeholder
+from core.models import Order, OrderItem, Payment, Product, Vendor
 from zconfig.settings import BASE_DIR
 
 User = get_user_model()
 
+NAMESPACE = uuid.UUID("0c6f3f9e-5b0e-4d8a-a1f4-2f1d7c3b9e10")
+PASSWORD = "Password@2"
+# orders draw their lines from this many products
+ORDER_PRODUCT_POOL = 100_000
+ORDER_STATUSES = [
+    (Order.Status.Pending, 10),
+    (Order.Status.Processing, 10),
+    (Order.Status.Successful, 50),
+    (Order.Status.Delivered, 25),
+    (Order.Status.Cancelled, 5),
+]
+PAID = {Order.Status.Successful, Order.Status.Delivered}
+
 
 class Command(BaseCommand):
     help = "Seed database with custom data"
 
-    def handle(self, *args, **kwargs):
-        # create 5 users if they do not exist
-        fake = Faker()
-        users = []
-        password = "Password@2"
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--vendors", type=int, default=2)
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--orders", type=int, default=0)
+        parser.add_argument(
+            "--items-per-order",
+            type=int,
+            default=5,
+            help="Average lines per order (drawn from 1 to twice this, minus one)",
+        )
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=20,
+            help="Placeholder images to generate when BASE_DIR/images is absent",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=0,
+            help="Processes generating placeholder images (0: this process)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=1234)
+        parser.add_argument(
+            "--idempotent",
+            action="store_true",
+            help="Keep existing rows, add only missing ones, never delete on error",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.seed = options["seed"]
+        self.rng = random.Random(self.seed)
+        self.fake = Faker()
+        self.fake.seed_instance(self.seed)
+
+        if options["products"] > 0 and options["vendors"] < 1:
+            self.stdout.write(self.style.ERROR("Products need at least one vendor"))
+            return
+
+        if not options["idempotent"] and User.objects.count() > 1:
+            self.stdout.write(self.style.ERROR("At least more than one user exists"))
+            return
+
         try:
-            if User.objects.count() > 1:
-                self.stdout.write(
-                    self.style.ERROR("At least more than one user exists")
-                )
-            else:
-                with transaction.atomic():
-                    for i in range(1, 6):
-                        email = f"user{i}@gmail.com"
-                        data = {"email": email, "password": password}
-
-                        users.append(User.objects.create_user(**data))  # create user
-
-                    # create two vendors
-                    vendors = [
-                        Vendor.objects.create(
-                            user=users[i + 3],
-                            brand_email=fake.company_email(),
-                            brand_name=fake.company(),
-                            is_activated=True,
-                        )
-                        for i in range(2)
-                    ]
-
-                    # Handle dummy images
-                    images_folder = os.path.join(BASE_DIR, "images")
-                    placeholder_images = os.listdir(images_folder)
-
-                    # create 100 products
-                    for index in range(100):
-                        img_name = random.choice(placeholder_images)
-                        image_path = os.path.join(images_folder, img_name)
-                        index = index + 1
-                        vi = index % 2
-                        stock = fake.random_int(50, 999)
-                        price = float(fake.pricetag().replace(",", "_")[1:])
-                        old_price = price + fake.random_int(100, 10_000)
-
-                        with open(image_path, "rb") as img:
-                            Product.objects.create(
-                                vendor=vendors[vi],
-                                name=f"Product {index + 1}",
-                                stock=stock,
-                                is_on_flash_sales=(index % 10 == 0)
-                                or (index % 15 == 0),
-                                current_price=price,
-                                old_price=old_price if (index % 7 == 0) else None,
-                                thumbnail=File(img, name=img_name),
-                            )
-
-                    self.stdout.write(self.style.SUCCESS("Data seeded successfully"))
+            customers, vendor_users = self.seed_users()
+            vendors = self.seed_vendors(vendor_users)
+            self.seed_products(vendors, self.seed_images())
+            self.seed_orders(customers)
         except Exception as e:
-            for user in User.objects.all():
-                if user.is_staff:
-                    pass
-                else:
-                    user.delete()
+            if not options["idempotent"]:
+                for user in User.objects.all():
+                    if user.is_staff:
+                        pass
+                    else:
+                        user.delete()
             self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS("Data seeded successfully"))
+
+    def key(self, kind: str, index) -> uuid.UUID:
+        return uuid.uuid5(NAMESPACE, f"{self.seed}:{kind}:{index}")
+
+    def insert(self, model, rows, label: str) -> None:
+        """bulk_create `rows` in chunks of --chunk-size, one transaction each."""
+        started, total = time.monotonic(), 0
+        for chunk in batched(rows, self.options["chunk_size"]):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    chunk, ignore_conflicts=self.options["idempotent"]
+                )
+            total += len(chunk)
+        self.report(label, total, started)
+
+    def report(self, label: str, total: int, started: float) -> None:
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(f"{label}: {total} rows in {elapsed:.1f}s ({rate:,.0f}/s)")
+
+    def seed_users(self) -> tuple[list[uuid.UUID], list[uuid.UUID]]:
+        password = make_password(PASSWORD)  # hashing is slow; share one hash
+        customers = [self.key("user", i) for i in range(self.options["users"])]
+        vendors = [self.key("vendor-user", i) for i in range(self.options["vendors"])]
+        rows = [
+            User(id=pk, email=f"user{i + 1}@gmail.com", password=password)
+            for i, pk in enumerate(customers)
+        ] + [
+            User(
+                id=pk,
+                email=f"vendor{i + 1}@gmail.com",
+                password=password,
+                is_vendor=True,
+            )
+            for i, pk in enumerate(vendors)
+        ]
+        self.insert(User, rows, "users")
+        return customers, vendors
+
+    def seed_vendors(self, users: list[uuid.UUID]) -> list[uuid.UUID]:
+        rows = [
+            Vendor(
+                id=self.key("vendor", i),
+                user_id=user_id,
+                brand_email=f"brand{i + 1}@example.com",
+                brand_name=self.fake.company(),
+                is_activated=True,
+            )
+            for i, user_id in enumerate(users)
+        ]
+        self.insert(Vendor, rows, "vendors")
+        return [vendor.id for vendor in rows]
+
+    def seed_images(self) -> list[str]:
+        """Storage names of the thumbnails products are spread over."""
+        folder = os.path.join(BASE_DIR, "images")
+        if os.path.isdir(folder) and os.listdir(folder):
+            names = []
+            for filename in sorted(os.listdir(folder)):
+                name = f"products/seed/{filename}"
+                if not default_storage.exists(name):
+                    with open(os.path.join(folder, filename), "rb") as f:
+                        name = default_storage.save(name, f)
+                names.append(name)
+            return names
+
+        names = [
+            f"products/seed/{self.seed}-{i}.jpg" for i in range(self.options["images"])
+        ]
+        missing = [
+            i for i, name in enumerate(names) if not default_storage.exists(name)
+        ]
+        processes = self.options["processes"]
+        if processes:
+            with ProcessPoolExecutor(
+                processes, mp_context=get_context("spawn")
+            ) as pool:
+                images = list(pool.map(placeholder, missing, repeat(self.seed)))
+        else:
+            images = [placeholder(i, self.seed) for i in missing]
+        for i, data in zip(missing, images):
+            default_storage.save(names[i], ContentFile(data))
+        return names
+
+    def seed_products(self, vendors: list[uuid.UUID], images: list[str]) -> None:
+        # Faker is the slow part; draw from pools built with it instead
+        words = [self.fake.word().title() for _ in range(2000)]
+        sentences = [self.fake.sentence(nb_words=12) for _ in range(500)]
+        rng = self.rng
+
+        def rows():
+            for i in range(self.options["products"]):
+                # log-uniform between NGN 1,000 and 1,000,000
+                price = Decimal(int(10 ** rng.uniform(5, 8))).scaleb(-2)
+                yield Product(
+                    id=self.key("product", i),
+                    vendor_id=vendors[i % len(vendors)],
+                    name=f"{rng.choice(words)} {rng.choice(words)} {i + 1}",
+                    stock=0 if rng.random() < 0.05 else rng.randint(1, 999),
+                    description=rng.choice(sentences),
+                    is_on_flash_sales=(i % 10 == 0) or (i % 15 == 0),
+                    current_price=price,
+                    old_price=price + rng.randint(100, 10_000) if i % 7 == 0 else None,
+                    thumbnail=images[i % len(images)],
+                )
+
+        self.insert(Product, rows(), "products")
+
+    def seed_orders(self, customers: list[uuid.UUID]) -> None:
+        count, average = self.options["orders"], self.options["items_per_order"]
+        if not count or not customers:
+            return
+        pool = list(
+            Product.objects.order_by("id").values_list("id", "current_price")[
+                :ORDER_PRODUCT_POOL
+            ]
+        )
+        statuses, weights = zip(*ORDER_STATUSES)
+        Link = Order.order_items.through
+        rng = self.rng
+        started, total_items = time.monotonic(), 0
+
+        for chunk in batched(range(count), self.options["chunk_size"]):
+            orders, lines = [], []
+            for i in chunk:
+                order = Order(
+                    id=self.key("order", i),
+                    user_id=rng.choice(customers),
+                    status=rng.choices(statuses, weights)[0],
+                    order_refrence=f"SEED-{self.seed}-{i}",
+                    payment_refrence=f"SEED-{self.seed}-{i}",
+                    amount=Decimal("0.00"),
+                )
+                picks = rng.sample(
+                    pool, min(rng.randint(1, 2 * average - 1), len(pool))
+                )
+                for product_id, price in picks:
+                    quantity = rng.randint(1, 3)
+                    order.amount += quantity * price
+                    lines.append(
+                        (
+                            order.id,
+                            OrderItem(
+                                product_id=product_id,
+                                quantity=quantity,
+                                price_per_item=price,
+                            ),
+                        )
+                    )
+                orders.append(order)
+
+            if self.options["idempotent"]:
+                existing = set(
+                    Order.objects.filter(id__in=[o.id for o in orders]).values_list(
+                        "id", flat=True
+                    )
+                )
+                orders = [o for o in orders if o.id not in existing]
+                lines = [line for line in lines if line[0] not in existing]
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                items = OrderItem.objects.bulk_create(item for _, item in lines)
+                Link.objects.bulk_create(
+                    Link(order_id=order_id, orderitem_id=item.id)
+                    for (order_id, _), item in zip(lines, items)
+                )
+                Payment.objects.bulk_create(
+                    Payment(
+                        id=self.key("payment", order.order_refrence),
+                        order_id=order.id,
+                        user_id=order.user_id,
+                        amount=order.amount,
+                        payment_refrence=order.order_refrence,
+                        payment_status=Payment.Payment_Status.Successful,
+                        is_verified=True,
+                    )
+                    for order in orders
+                    if order.status in PAID
+                )
+            total_items += len(lines)
+
+        self.report("orders", count, started)
+        self.stdout.write(f"order items: {total_items} rows")
+
+        # count the paid orders in the sales rollups, as confirm_charge would
+        started = time.monotonic()
+        self.report("sales rollups", sales.backfill(), started)
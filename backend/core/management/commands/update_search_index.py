@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index, or refresh recently updated products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only reindex products updated at or after this ISO datetime",
+        )
+        parser.add_argument(
+            "--hours",
+            type=float,
+            help="Only reindex products updated within the last N hours",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"] and options["hours"]:
+            raise CommandError("Use either --since or --hours, not both")
+        if options["since"]:
+            try:
+                since = datetime.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError(f"Invalid datetime: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        elif options["hours"]:
+            since = timezone.now() - timedelta(hours=options["hours"])
+
+        count = rebuild_index(since=since, chunk_size=options["chunk_size"])
+        mode = "Refreshed" if since else "Rebuilt"
+        self.stdout.write(
+            self.style.SUCCESS(f"{mode} search index for {count} products")
+        )
@@ -0,0 +1,118 @@
+"""
+Prometheus metrics, served in text format at /metrics.
+
+Under gunicorn each worker is its own process, so metrics are kept with
+prometheus_client's multiprocess mode: set PROMETHEUS_MULTIPROC_DIR to an
+empty directory (a tmpfs is best) in the environment of every process,
+including job and outbox workers. Each process then writes its samples to
+mmap'd files in it and a scrape aggregates them. gunicorn.conf.py empties
+the directory at startup and retires the files of workers that exit.
+Without the variable, samples stay in the serving process, which is right
+for runserver and tests.
+
+Queue depths are read from the database at scrape time instead of being
+tracked.
+"""
+
+import os
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpRequest, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from core.models import Job, PaymentOutbox
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by resolved URL name",
+    ["view", "method", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being served",
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Counter("db_queries", "SQL statements run by requests", ["view"])
+DB_QUERY_SECONDS = Counter(
+    "db_query_seconds", "Time requests spent in SQL statements", ["view"]
+)
+PAYSTACK_LATENCY = Histogram(
+    "paystack_request_duration_seconds",
+    "Paystack HTTP call latency, per attempt",
+    ["operation"],
+)
+PAYSTACK_ERRORS = Counter(
+    "paystack_errors",
+    "Failed Paystack calls: transport errors, 4xx/5xx answers, open circuit",
+    ["operation", "reason"],
+)
+
+
+def view_label(request: HttpRequest) -> str:
+    """URL name (or route) of the request; bounded, unlike the path."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route
+
+
+def observe_request(
+    request: HttpRequest, status: int, seconds: float, queries: int, db: float
+) -> None:
+    view = view_label(request)
+    REQUEST_LATENCY.labels(view, request.method, str(status)).observe(seconds)
+    if queries:
+        DB_QUERIES.labels(view).inc(queries)
+        DB_QUERY_SECONDS.labels(view).inc(db)
+
+
+class QueueCollector:
+    """Pending background work, counted when scraped."""
+
+    def collect(self):
+        jobs = GaugeMetricFamily(
+            "job_queue_depth", "Jobs by queue and status", labels=["queue", "status"]
+        )
+        for row in Job.objects.values("queue", "status").annotate(n=Count("id")):
+            jobs.add_metric([row["queue"], row["status"]], row["n"])
+        yield jobs
+
+        outbox = GaugeMetricFamily(
+            "payment_outbox_depth",
+            "Payment outbox entries by status",
+            labels=["status"],
+        )
+        for row in PaymentOutbox.objects.values("status").annotate(n=Count("id")):
+            outbox.add_metric([row["status"]], row["n"])
+        yield outbox
+
+
+QUEUES = CollectorRegistry(auto_describe=False)
+QUEUES.register(QueueCollector())
+
+
+def registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    scraped = CollectorRegistry()
+    multiprocess.MultiProcessCollector(scraped)
+    return scraped
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    body = generate_latest(registry()) + generate_latest(QUEUES)
+    return HttpResponse(body, content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,98 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE products ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER products_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()
+    """,
+    "UPDATE products SET search_vector = "
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+    "CREATE INDEX products_search_vector_gin ON products USING gin (search_vector)",
+    "CREATE INDEX products_name_trgm ON products USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS products_name_trgm",
+    "DROP INDEX IF EXISTS products_search_vector_gin",
+    "DROP TRIGGER IF EXISTS products_search_vector_trigger ON products",
+    "DROP FUNCTION IF EXISTS products_search_vector_update()",
+    "ALTER TABLE products DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE products_fts USING fts5("
+    "product_id UNINDEXED, name, description, tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE products_fts_trgm USING fts5("
+    "product_id UNINDEXED, name, tokenize='trigram')",
+    """
+    CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (product_id, name, description)
+        VALUES (new.id, new.name, new.description);
+        INSERT INTO products_fts_trgm (product_id, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description ON products
+    BEGIN
+        DELETE FROM products_fts WHERE product_id = old.id;
+        DELETE FROM products_fts_trgm WHERE product_id = old.id;
+        INSERT INTO products_fts (product_id, name, description)
+        VALUES (new.id, new.name, new.description);
+        INSERT INTO products_fts_trgm (product_id, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE product_id = old.id;
+        DELETE FROM products_fts_trgm WHERE product_id = old.id;
+    END
+    """,
+    "INSERT INTO products_fts (product_id, name, description) "
+    "SELECT id, name, description FROM products",
+    "INSERT INTO products_fts_trgm (product_id, name) SELECT id, name FROM products",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS products_fts_delete",
+    "DROP TRIGGER IF EXISTS products_fts_update",
+    "DROP TRIGGER IF EXISTS products_fts_insert",
+    "DROP TABLE IF EXISTS products_fts_trgm",
+    "DROP TABLE IF EXISTS products_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql, params=None)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_product_keyset_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"postgresql": POSTGRES_FORWARD, "sqlite": SQLITE_FORWARD}),
+            _run({"postgresql": POSTGRES_REVERSE, "sqlite": SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_product_search_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="products_id_5ad420_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["current_price", "id"], name="products_price_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["vendor", "created_at", "id"],
+                name="products_vendor_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["vendor", "current_price", "id"],
+                name="products_vendor_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_on_flash_sales", "created_at", "id"],
+                name="products_flash_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("stock__gt", 0)),
+                fields=["created_at", "id"],
+                name="products_in_stock_idx",
+            ),
+        ),
+    ]
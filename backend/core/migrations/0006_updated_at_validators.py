@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_product_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="shippingaddress",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_cart_links(apps, schema_editor):
+    """
+    Point each cart item at its cart. Lines that were shared between carts
+    are copied per cart, and repeated products within a cart are merged.
+    """
+    Cart = apps.get_model("core", "Cart")
+    CartItem = apps.get_model("core", "CartItem")
+    Link = Cart.cart_items.through
+
+    assigned = {}  # cart item id -> cart id
+    lines = {}  # (cart id, product id) -> cart item
+    for link in Link.objects.select_related("cartitem").order_by("id"):
+        item = link.cartitem
+        key = (link.cart_id, item.product_id)
+        if key in lines:
+            lines[key].quantity += item.quantity
+            lines[key].save(update_fields=["quantity"])
+            continue
+        if item.pk in assigned:
+            item = CartItem.objects.create(
+                cart_id=link.cart_id, product_id=item.product_id, quantity=item.quantity
+            )
+        else:
+            item.cart_id = link.cart_id
+            item.save(update_fields=["cart"])
+        assigned[item.pk] = link.cart_id
+        lines[key] = item
+
+    CartItem.objects.filter(cart__isnull=True).delete()
+
+
+def restore_cart_links(apps, schema_editor):
+    Cart = apps.get_model("core", "Cart")
+    CartItem = apps.get_model("core", "CartItem")
+    Link = Cart.cart_items.through
+    Link.objects.bulk_create(
+        Link(cart_id=cart_id, cartitem_id=item_id)
+        for item_id, cart_id in CartItem.objects.values_list("id", "cart_id")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_updated_at_validators"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="cart",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.cart",
+            ),
+        ),
+        migrations.RunPython(copy_cart_links, restore_cart_links),
+    ]
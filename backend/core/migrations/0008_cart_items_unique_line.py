@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_cartitem_cart"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="cart",
+            name="cart_items",
+        ),
+        migrations.AlterField(
+            model_name="cartitem",
+            name="cart",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cart_items",
+                to="core.cart",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product"), name="cart_items_cart_product_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_cart_items_unique_line"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("quantity", models.PositiveIntegerField()),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "cart",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="core.cart",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="core.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Stock Reservations",
+                "db_table": "stock_reservations",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "expires_at"],
+                        name="stock_reser_product_e6f7d5_idx",
+                    ),
+                    models.Index(
+                        fields=["expires_at"], name="stock_reser_expires_fdd22d_idx"
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cart", "product"),
+                        name="stock_reservations_cart_product_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_stock_reservations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("event_key", models.CharField(max_length=200, unique=True)),
+                ("event", models.CharField(max_length=100)),
+                ("reference", models.CharField(blank=True, max_length=300)),
+                ("payload", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "Payment Events",
+                "db_table": "payment_events",
+                "indexes": [
+                    models.Index(
+                        fields=["reference"], name="payment_eve_referen_dc0c0e_idx"
+                    )
+                ],
+            },
+        ),
+    ]
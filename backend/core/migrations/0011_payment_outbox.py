@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_payment_events"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentOutbox",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("email", models.EmailField(max_length=254)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("reference", models.CharField(max_length=100, unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending"),
+                            ("Sent", "Sent"),
+                            ("Failed", "Failed"),
+                        ],
+                        default="Pending",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("authorization_url", models.URLField(blank=True, max_length=500)),
+                ("access_code", models.CharField(blank=True, max_length=100)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbox",
+                        to="core.order",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Payment Outbox",
+                "db_table": "payment_outbox",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "Pending")),
+                        fields=["available_at"],
+                        name="payment_outbox_due_idx",
+                    )
+                ],
+            },
+        ),
+    ]
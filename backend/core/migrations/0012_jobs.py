@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_payment_outbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("queue", models.CharField(default="default", max_length=50)),
+                ("task", models.CharField(max_length=200)),
+                ("payload", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("Queued", "Queued"), ("Dead", "Dead")],
+                        default="Queued",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=5)),
+                ("run_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Jobs",
+                "db_table": "jobs",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "Queued")),
+                        fields=["queue", "run_at"],
+                        name="jobs_due_idx",
+                    )
+                ],
+            },
+        ),
+    ]
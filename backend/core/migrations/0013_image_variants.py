@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:37
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="thumbnail_variants",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="vendor",
+            name="avatar_variants",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        # both columns stay varchar(100); only the Python field changes, and
+        # rebuilding products on SQLite would drop the search triggers
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="product",
+                    name="thumbnail",
+                    field=models.ImageField(
+                        upload_to=core.models.product_thumbail_path
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="vendor",
+                    name="avatar",
+                    field=models.ImageField(blank=True, null=True, upload_to="venders"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="orders_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_orders_user_created"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductDailySales",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField()),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Product Daily Sales",
+                "db_table": "product_daily_sales",
+            },
+        ),
+        migrations.CreateModel(
+            name="VendorDailySales",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField()),
+                ("orders", models.PositiveIntegerField(default=0)),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Vendor Daily Sales",
+                "db_table": "vendor_daily_sales",
+            },
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="sales_recorded",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(
+                    ("payment_status", "Successful"), ("sales_recorded", False)
+                ),
+                fields=["id"],
+                name="payments_unrecorded_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productdailysales",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_sales",
+                to="core.product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productdailysales",
+            name="vendor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.vendor",
+            ),
+        ),
+        migrations.AddField(
+            model_name="vendordailysales",
+            name="vendor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_sales",
+                to="core.vendor",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdailysales",
+            index=models.Index(
+                fields=["vendor", "day"], name="product_daily_vendor_day_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productdailysales",
+            constraint=models.UniqueConstraint(
+                fields=("product", "day"), name="product_daily_sales_unique"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="vendordailysales",
+            constraint=models.UniqueConstraint(
+                fields=("vendor", "day"), name="vendor_daily_sales_unique"
+            ),
+        ),
+    ]
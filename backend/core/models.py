@@ -1,14 +1,16 @@
 import datetime
-import os
 import uuid
+from decimal import Decimal
 from django.db import models
+from django.db.models import F, Sum
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
-from django_resized import ResizedImageField
+from core.cache import invalidate_products, invalidate_user, invalidate_vendors
 
 
 def order_reference_gen():
@@ -60,6 +62,14 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        invalidate_user(self.pk)
+        return super().delete(*args, **kwargs)
+
     class Meta:
         verbose_name = "CustomUser"
         verbose_name_plural = "CustomUsers"
@@ -80,6 +90,7 @@ class ShippingAddress(models.Model):
     lga = models.CharField(max_length=150)
     zip_code = models.CharField(max_length=10)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return f"{self.user.email} -> {self.first_name}"  # type: ignore
@@ -103,9 +114,9 @@ class Vendor(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
     brand_email = models.EmailField(unique=True)
     brand_name = models.CharField(max_length=128)
-    avatar = ResizedImageField(
-        quality=75, size=[50, 50], upload_to="venders", null=True, blank=True
-    )
+    avatar = models.ImageField(upload_to="venders", null=True, blank=True)
+    # responsive sizes built off the request path, see core.images
+    avatar_variants = models.JSONField(null=True, blank=True, editable=False)
     is_activated = models.BooleanField(default=False)
     total_sales_ever = models.DecimalField(max_digits=20, decimal_places=2, default=0)  # type: ignore
 
@@ -119,6 +130,19 @@ class Vendor(models.Model):
     def __str__(self) -> str:
         return f"{self.brand_name} -> {self.brand_email}"
 
+    def save(self, *args, **kwargs):
+        new_upload = bool(self.avatar) and not self.avatar._committed
+        super().save(*args, **kwargs)
+        invalidate_vendors([self.pk])
+        if new_upload:
+            from core.images import queue_variants
+
+            queue_variants("vendor", self.pk, self.avatar.name)
+
+    def delete(self, *args, **kwargs):
+        invalidate_vendors([self.pk])
+        return super().delete(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "Vendors"
         db_table = "vendors"
@@ -127,8 +151,7 @@ class Vendor(models.Model):
 
 
 def product_thumbail_path(instance, filename):
-    name, _ = os.path.splitext(filename)
-    return f"products/{name}.webp"
+    return f"products/{filename}"
 
 
 class Product(models.Model):
@@ -142,9 +165,10 @@ class Product(models.Model):
     old_price = models.DecimalField(
         max_digits=18, decimal_places=2, null=True, blank=True
     )
-    thumbnail = ResizedImageField(
-        quality=75, null=False, blank=False, upload_to=product_thumbail_path
+    thumbnail = models.ImageField(
+        null=False, blank=False, upload_to=product_thumbail_path
     )
+    thumbnail_variants = models.JSONField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -153,25 +177,61 @@ class Product(models.Model):
 
     class Meta:
         db_table = "products"
-        indexes = [models.Index(fields=["id"])]
+        # each index serves one (filter, sort) shape of products/all; all end
+        # in the keyset columns so a filtered page is still one range scan
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="products_created_id_idx"),
+            models.Index(fields=["current_price", "id"], name="products_price_id_idx"),
+            models.Index(
+                fields=["vendor", "created_at", "id"],
+                name="products_vendor_created_idx",
+            ),
+            models.Index(
+                fields=["vendor", "current_price", "id"],
+                name="products_vendor_price_idx",
+            ),
+            models.Index(
+                fields=["is_on_flash_sales", "created_at", "id"],
+                name="products_flash_created_idx",
+            ),
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(stock__gt=0),
+                name="products_in_stock_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if self.current_price > 1:
             self.old_price = self.current_price
+        new_upload = bool(self.thumbnail) and not self.thumbnail._committed
         super().save(*args, **kwargs)
+        invalidate_products([self.pk])
+        if new_upload:
+            from core.images import queue_variants
+
+            queue_variants("product", self.pk, self.thumbnail.name)
+
+    def delete(self, *args, **kwargs):
+        invalidate_products([self.pk])
+        return super().delete(*args, **kwargs)
 
 
 class CartItem(models.Model):
     id = models.BigAutoField(primary_key=True)
+    cart = models.ForeignKey(
+        "Cart", on_delete=models.CASCADE, related_name="cart_items"
+    )
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="cart_items"
     )
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
-    def sub_total(self) -> float:
-        return self.quantity * float(self.product.current_price)
+    def sub_total(self) -> Decimal:
+        return self.quantity * self.product.current_price
 
     def __str__(self) -> str:
         return f"CartItem: {self.product.id}"  # type: ignore
@@ -181,21 +241,30 @@ class CartItem(models.Model):
         db_table = "cart_items"
 
         indexes = [models.Index(fields=["id"])]
+        constraints = [
+            # one line per product, so batch updates can upsert on it
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="cart_items_cart_product_uniq"
+            )
+        ]
 
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
-    cart_items = models.ManyToManyField(CartItem, related_name="carts")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     @property
-    def total_price(self) -> float:
-        total = 0
-        for item in self.cart_items.all():
-            total += item.sub_total
-        return total
+    def total_price(self) -> Decimal:
+        """Sum of quantity * current price over the cart, in one query"""
+        total = self.cart_items.aggregate(
+            total=Sum(
+                F("quantity") * F("product__current_price"),
+                output_field=models.DecimalField(max_digits=20, decimal_places=2),
+            )
+        )["total"]
+        return total or Decimal("0.00")
 
     def __str__(self) -> str:
         return f"CartSummary for {self.user.email}"  # type: ignore
@@ -207,6 +276,43 @@ class Cart(models.Model):
         indexes = [models.Index(fields=["id"])]
 
 
+class StockReservation(models.Model):
+    """
+    Units of a product held for a cart until expires_at. Available stock is
+    Product.stock minus the unexpired holds of every cart.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    cart = models.ForeignKey(
+        Cart, on_delete=models.CASCADE, related_name="reservations"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.quantity} x {self.product_id} until {self.expires_at}"  # type: ignore
+
+    class Meta:
+        verbose_name_plural = "Stock Reservations"
+        db_table = "stock_reservations"
+
+        indexes = [
+            # active holds per product, summed on every reservation
+            models.Index(fields=["product", "expires_at"]),
+            # the sweeper walks expired holds
+            models.Index(fields=["expires_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="stock_reservations_cart_product_uniq"
+            )
+        ]
+
+
 class OrderItem(models.Model):
     id = models.BigAutoField(primary_key=True)
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
@@ -214,8 +320,8 @@ class OrderItem(models.Model):
     price_per_item = models.DecimalField(max_digits=18, decimal_places=2)
 
     @property
-    def sub_total(self) -> float:
-        return self.quantity * float(self.price_per_item)
+    def sub_total(self) -> Decimal:
+        return self.quantity * self.price_per_item
 
     def __str__(self) -> str:
         return f"OrderItem: {self.product_id} for Order {self.order_id}"  # type: ignore
@@ -255,12 +361,18 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def total_amount(self) -> float:
-        """Calculate total amount from order items"""
-        return sum(item.sub_total for item in self.order_items.all())
+    def total_amount(self) -> Decimal:
+        """Calculate total amount from order items, in one query"""
+        total = self.order_items.aggregate(
+            total=Sum(
+                F("quantity") * F("price_per_item"),
+                output_field=models.DecimalField(max_digits=20, decimal_places=2),
+            )
+        )["total"]
+        return total or Decimal("0.00")
 
     def save(self, *args, **kwargs):
-        if self.pk:  # if order is already saved
+        if not self._state.adding:  # if order is already saved
             self.amount = self.total_amount()
         super().save(*args, **kwargs)
 
@@ -272,7 +384,13 @@ class Order(models.Model):
         verbose_name_plural = "Orders"
         db_table = "orders"
 
-        indexes = [models.Index(fields=["id"])]
+        indexes = [
+            models.Index(fields=["id"]),
+            # order history: one user's orders in keyset order
+            models.Index(
+                fields=["user", "created_at", "id"], name="orders_user_created_idx"
+            ),
+        ]
 
 
 class Payment(models.Model):
@@ -306,6 +424,8 @@ class Payment(models.Model):
         max_length=300, unique=True, editable=False, blank=True
     )
     is_verified = models.BooleanField(default=False)
+    # counted in the sales rollups, see core.sales
+    sales_recorded = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -320,4 +440,177 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=["id"]),
             models.Index(fields=["payment_refrence"]),
+            # successful payments the sales rollups have yet to count
+            models.Index(
+                fields=["id"],
+                condition=models.Q(payment_status="Successful", sales_recorded=False),
+                name="payments_unrecorded_idx",
+            ),
+        ]
+
+
+class PaymentEvent(models.Model):
+    """
+    A gateway webhook event, stored once per `event_key` so redelivered
+    events are recognised and skipped.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    event_key = models.CharField(max_length=200, unique=True)
+    event = models.CharField(max_length=100)
+    reference = models.CharField(max_length=300, blank=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.event} for {self.reference}"
+
+    class Meta:
+        verbose_name_plural = "Payment Events"
+        db_table = "payment_events"
+
+        indexes = [models.Index(fields=["reference"])]
+
+
+class PaymentOutbox(models.Model):
+    """
+    Payment initialization for an order, written in the checkout transaction
+    and delivered to the gateway later by the process_payment_outbox worker.
+    """
+
+    class Status(models.TextChoices):
+        Pending = "Pending", "Pending"
+        Sent = "Sent", "Sent"
+        Failed = "Failed", "Failed"
+
+    id = models.BigAutoField(primary_key=True)
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="outbox")
+    email = models.EmailField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(max_length=100, unique=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.Pending
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    authorization_url = models.URLField(max_length=500, blank=True)
+    access_code = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.status} payment init for Order #{self.order_id}"  # type: ignore
+
+    class Meta:
+        verbose_name_plural = "Payment Outbox"
+        db_table = "payment_outbox"
+
+        indexes = [
+            # the worker claims due pending entries, oldest first
+            models.Index(
+                fields=["available_at"],
+                condition=models.Q(status="Pending"),
+                name="payment_outbox_due_idx",
+            )
+        ]
+
+
+class Job(models.Model):
+    """
+    A unit of background work for the runworker command (see core.jobs).
+    Finished jobs are deleted; jobs out of attempts stay behind as Dead.
+    """
+
+    class Status(models.TextChoices):
+        Queued = "Queued", "Queued"
+        Dead = "Dead", "Dead"
+
+    id = models.BigAutoField(primary_key=True)
+    queue = models.CharField(max_length=50, default="default")
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.Queued
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.task} ({self.status}, attempt {self.attempts})"
+
+    class Meta:
+        verbose_name_plural = "Jobs"
+        db_table = "jobs"
+
+        indexes = [
+            # workers claim due queued jobs per queue, oldest first
+            models.Index(
+                fields=["queue", "run_at"],
+                condition=models.Q(status="Queued"),
+                name="jobs_due_idx",
+            )
+        ]
+
+
+class VendorDailySales(models.Model):
+    """
+    A vendor's paid sales on one day (UTC), kept up to date by core.sales.
+    `orders` counts the paid orders holding at least one of its products.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    vendor = models.ForeignKey(
+        Vendor, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    day = models.DateField()
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    def __str__(self) -> str:
+        return f"{self.vendor_id} on {self.day}: {self.revenue}"  # type: ignore
+
+    class Meta:
+        verbose_name_plural = "Vendor Daily Sales"
+        db_table = "vendor_daily_sales"
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["vendor", "day"], name="vendor_daily_sales_unique"
+            )
+        ]
+
+
+class ProductDailySales(models.Model):
+    """A product's paid sales on one day (UTC), kept up to date by core.sales."""
+
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    # copied from the product so a vendor's rows are read without a join
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    def __str__(self) -> str:
+        return f"{self.product_id} on {self.day}: {self.revenue}"  # type: ignore
+
+    class Meta:
+        verbose_name_plural = "Product Daily Sales"
+        db_table = "product_daily_sales"
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "day"], name="product_daily_sales_unique"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["vendor", "day"], name="product_daily_vendor_day_idx")
         ]
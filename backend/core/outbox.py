@@ -0,0 +1,179 @@
+"""
+Transactional outbox for payment initialization.
+
+Checkout writes a PaymentOutbox row in the same transaction as the order,
+so an order never exists without its pending payment request and the
+request worker never waits on the gateway. The process_payment_outbox
+worker claims due rows (SKIP LOCKED where the database supports it, so
+several workers can run side by side), leases them by pushing available_at
+forward, and delivers them from a bounded thread pool. A failed delivery is
+rescheduled with exponential backoff until PAYMENT_OUTBOX_MAX_ATTEMPTS, then
+marked Failed. A worker that dies mid-delivery leaves its rows to be picked
+up again when the lease runs out; the stable reference sent with each
+attempt stops Paystack from creating a second transaction for a row. When a
+delivery fails in a way Paystack may still have accepted (a timeout after
+sending, or a retry refused as a duplicate reference), deliver() asks verify
+whether Paystack holds the reference and, if so, moves the row to a fresh
+one. Failures that never reached Paystack, such as an open circuit or a
+refused connection, are just rescheduled.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Order, Payment, PaymentOutbox
+from core.paystack import get_gateway
+
+
+def enqueue_payment(order: Order, email: str) -> PaymentOutbox:
+    """
+    Queue payment initialization for `order`, or queue it again after a
+    failed delivery. Call inside the transaction that creates the order.
+    """
+    entry, _ = PaymentOutbox.objects.update_or_create(
+        order=order,
+        defaults={
+            "email": email,
+            "amount": order.amount,
+            "reference": uuid4().hex,
+            "status": PaymentOutbox.Status.Pending,
+            "attempts": 0,
+            "available_at": timezone.now(),
+            "last_error": "",
+        },
+    )
+    return entry
+
+
+def retry_delay(attempts: int) -> timedelta:
+    seconds = settings.PAYMENT_OUTBOX_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.PAYMENT_OUTBOX_BACKOFF_MAX))
+
+
+def claim(batch_size: int) -> list[PaymentOutbox]:
+    """Lease up to `batch_size` due entries to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            PaymentOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=PaymentOutbox.Status.Pending, available_at__lte=now)
+            .order_by("available_at")[:batch_size]
+        )
+        if entries:
+            PaymentOutbox.objects.filter(id__in=[e.id for e in entries]).update(
+                attempts=F("attempts") + 1,
+                available_at=now + timedelta(seconds=settings.PAYMENT_OUTBOX_LEASE),
+                updated_at=now,
+            )
+    for entry in entries:
+        entry.attempts += 1
+    return entries
+
+
+def _initialize(entry: PaymentOutbox, gateway) -> dict:
+    try:
+        return gateway.initialize_transaction(
+            entry.email, entry.amount, reference=entry.reference
+        )
+    except Exception as e:
+        return {"status": False, "message": repr(e)}
+
+
+def _known(entry: PaymentOutbox, gateway) -> bool:
+    """Whether Paystack already holds a transaction under the entry's reference."""
+    try:
+        response = gateway.verify_transaction(entry.reference)
+    except Exception:
+        return False
+    return bool(response.get("status"))
+
+
+def deliver(entry: PaymentOutbox, gateway) -> bool:
+    """
+    Initialize the payment for one claimed entry and record the outcome.
+    Returns True once the gateway has accepted it.
+    """
+    response = _initialize(entry, gateway)
+    if response.get("maybe_applied") and _known(entry, gateway):
+        # An earlier attempt timed out after Paystack accepted it, so every
+        # retry is refused as a duplicate reference. Its checkout link was
+        # lost with the response and never reached the customer, so that
+        # transaction can be abandoned: start again under a new reference.
+        entry.reference = uuid4().hex
+        PaymentOutbox.objects.filter(
+            id=entry.id, status=PaymentOutbox.Status.Pending
+        ).update(reference=entry.reference)
+        response = _initialize(entry, gateway)
+
+    now = timezone.now()
+    pending = PaymentOutbox.objects.filter(
+        id=entry.id, status=PaymentOutbox.Status.Pending
+    )
+    if not response.get("status"):
+        exhausted = entry.attempts >= settings.PAYMENT_OUTBOX_MAX_ATTEMPTS
+        pending.update(
+            status=(
+                PaymentOutbox.Status.Failed
+                if exhausted
+                else PaymentOutbox.Status.Pending
+            ),
+            last_error=str(response.get("message", ""))[:1000],
+            available_at=now + retry_delay(entry.attempts),
+            updated_at=now,
+        )
+        return False
+
+    data = response["data"]
+    with transaction.atomic():
+        sent = pending.update(
+            status=PaymentOutbox.Status.Sent,
+            authorization_url=data["authorization_url"],
+            access_code=data.get("access_code", ""),
+            last_error="",
+            updated_at=now,
+        )
+        if sent:
+            order = Order.objects.only("id", "user_id").get(id=entry.order_id)
+            Payment.objects.create(
+                order=order,
+                user_id=order.user_id,  # type: ignore
+                amount=entry.amount,
+                payment_refrence=data["reference"],
+            )
+            Order.objects.filter(id=order.id, status=Order.Status.Pending).update(
+                status=Order.Status.Processing,
+                payment_refrence=data["reference"],
+                updated_at=now,
+            )
+    return True
+
+
+def drain(gateway=None, workers: int = 1, batch_size: int = 50) -> tuple[int, int]:
+    """
+    Deliver every due entry, `workers` at a time; returns (sent, failed).
+    Entries that fail are rescheduled into the future, so this terminates.
+    """
+    gateway = gateway or get_gateway()
+    sent = failed = 0
+
+    def run(entry: PaymentOutbox) -> bool:
+        try:
+            return deliver(entry, gateway)
+        finally:
+            if workers > 1:
+                connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while entries := claim(batch_size):
+            # one worker delivers in this thread, on this connection
+            results = pool.map(run, entries) if workers > 1 else map(run, entries)
+            for ok in results:
+                sent += ok
+                failed += not ok
+    return sent, failed
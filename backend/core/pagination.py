@@ -0,0 +1,218 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Callable
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvalidCursor(APIException):
+    status_code = 400
+    default_detail = "Invalid cursor"
+    default_code = "invalid_cursor"
+
+
+class BoundedPageSizeMixin:
+    """
+    Reads ?page_size= from the request, clamped to the configured maximum.
+    """
+
+    page_size_query_param = "page_size"
+
+    def __init__(self, page_size: int | None = None, max_page_size: int | None = None):
+        self.default_page_size = page_size or settings.CATALOG_PAGE_SIZE
+        self.max_page_size = max_page_size or settings.CATALOG_MAX_PAGE_SIZE
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.default_page_size
+        if size < 1:
+            return self.default_page_size
+        return min(size, self.max_page_size)
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            },
+            status=200,
+        )
+
+
+class KeysetPagination(BoundedPageSizeMixin):
+    """
+    Cursor pagination over a unique ordering, newest first by default.
+
+    Each page is a single indexed range scan, so deep pages cost the same
+    as the first one. Cursors are opaque base64 tokens holding the boundary
+    row's sort values and the direction of travel. The last ordering field
+    must be unique (the primary key) so that ties are broken.
+    """
+
+    cursor_query_param = "cursor"
+    default_ordering = ("-created_at", "-id")
+
+    def __init__(
+        self,
+        ordering: tuple[str, ...] | None = None,
+        page_size: int | None = None,
+        max_page_size: int | None = None,
+    ):
+        super().__init__(page_size=page_size, max_page_size=max_page_size)
+        self.ordering = ordering or self.default_ordering
+
+    @staticmethod
+    def _field_name(term: str) -> str:
+        return term.lstrip("-")
+
+    def encode_cursor(self, obj, reverse: bool) -> str:
+        values = []
+        for term in self.ordering:
+            value = getattr(obj, self._field_name(term))
+            values.append(
+                value.isoformat() if isinstance(value, datetime) else str(value)
+            )
+        payload = {"o": ",".join(self.ordering), "v": values, "r": int(reverse)}
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, request: Request) -> tuple[list[str], bool] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = payload["v"]
+            reverse = bool(payload.get("r", 0))
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor()
+        # a cursor minted under another sort order cannot be resumed
+        if payload.get("o") != ",".join(self.ordering):
+            raise InvalidCursor()
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor()
+        return values, reverse
+
+    def _after(self, values: list[str], reverse: bool) -> Q:
+        """
+        Rows strictly after `values` in the direction of travel, expanded to
+        (a > x) OR (a = x AND b > y) ... so each branch can use the index.
+        """
+        condition = Q()
+        for i, term in enumerate(self.ordering):
+            descending = term.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            equal = zip(map(self._field_name, self.ordering[:i]), values)
+            branch = Q(*equal, **{f"{self._field_name(term)}__{lookup}": values[i]})
+            condition |= branch
+        return condition
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request) -> list:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = False
+        if cursor is not None:
+            values, reverse = cursor
+            try:
+                queryset = queryset.filter(self._after(values, reverse))
+            except (DjangoValidationError, ValueError, TypeError):
+                raise InvalidCursor()
+
+        if reverse:
+            ordering = [t[1:] if t.startswith("-") else f"-{t}" for t in self.ordering]
+        else:
+            ordering = list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+
+        # fetch one extra row to learn whether another page exists
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def _link(self, obj, reverse: bool) -> str:
+        url = self.request.build_absolute_uri()
+        token = self.encode_cursor(obj, reverse)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        if not self.page:
+            # walked backwards past the start; the first page follows
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+
+class RankedPagination(BoundedPageSizeMixin):
+    """
+    Page-number pagination for ranked results (e.g. search) that have no
+    stable sort key to build a cursor from. No COUNT(*) is issued and the
+    depth is capped at max_results, since relevance past that is noise.
+    """
+
+    page_query_param = "page"
+    max_results = 1000
+
+    def paginate(self, fetch: Callable[[int, int], list], request: Request) -> list:
+        """
+        fetch(limit, offset) must return at most `limit` rows in rank order.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = max(int(request.query_params[self.page_query_param]), 1)
+        except (KeyError, ValueError):
+            self.page_number = 1
+
+        offset = (self.page_number - 1) * self.page_size
+        if offset >= self.max_results:
+            raise NotFound("Page out of range")
+        limit = min(self.page_size + 1, self.max_results - offset)
+
+        results = fetch(limit, offset)
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self) -> str | None:
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
@@ -0,0 +1,106 @@
+"""
+Payment confirmation driven by Paystack webhooks.
+
+Paystack signs every webhook body with HMAC-SHA512 under the secret key.
+Each verified event is stored once, keyed by event type and transaction id,
+so redeliveries are acknowledged without being applied twice. A successful
+charge moves its Payment and Order forward with one conditional UPDATE each;
+the conditions (reference, amount, current status) make the update a no-op
+for stale, mismatched or already applied charges. The confirmed payment is
+counted in the sales rollups (core.sales) in the same transaction.
+"""
+
+import hashlib
+import hmac
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import Order, Payment, PaymentEvent
+from core.sales import record_sales
+
+CHANNELS = {
+    "card": Payment.Payment_Method.Card,
+    "bank_transfer": Payment.Payment_Method.Bank_Transfer,
+    "ussd": Payment.Payment_Method.USSD,
+}
+
+
+def valid_signature(body: bytes, signature: str) -> bool:
+    expected = hmac.new(
+        settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+
+def event_key(event: dict, body: bytes) -> str:
+    transaction_id = event["data"].get("id")
+    if transaction_id is None:
+        return f"{event['event']}:{hashlib.sha256(body).hexdigest()}"
+    return f"{event['event']}:{transaction_id}"
+
+
+def confirm_charge(data: dict) -> bool:
+    """
+    Mark the payment for a successful charge, and its order, as successful.
+    Returns False when nothing matched (unknown reference, amount or currency
+    mismatch, or already confirmed).
+    """
+    if data.get("status") != "success" or data.get("currency", "NGN") != "NGN":
+        return False
+    reference = data.get("reference")
+    amount = Decimal(data.get("amount", 0)) / 100
+    now = timezone.now()
+    with transaction.atomic():
+        paid = (
+            Payment.objects.filter(payment_refrence=reference, amount=amount)
+            .exclude(payment_status=Payment.Payment_Status.Successful)
+            .update(
+                payment_status=Payment.Payment_Status.Successful,
+                payment_method=CHANNELS.get(data.get("channel"), ""),
+                is_verified=True,
+                updated_at=now,
+            )
+        )
+        if paid:
+            Order.objects.filter(
+                payments__payment_refrence=reference,
+                status__in=[Order.Status.Pending, Order.Status.Processing],
+            ).update(status=Order.Status.Successful, updated_at=now)
+            record_sales(Payment.objects.filter(payment_refrence=reference))
+    return bool(paid)
+
+
+def handle_event(event: dict, body: bytes) -> bool:
+    """
+    Record a verified webhook event and apply it. Returns False for an event
+    that was already received.
+    """
+    data = event["data"]
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                PaymentEvent.objects.create(
+                    event_key=event_key(event, body),
+                    event=event["event"],
+                    reference=data.get("reference") or "",
+                    payload=event,
+                )
+        except IntegrityError:
+            return False
+        if event["event"] == "charge.success":
+            confirm_charge(data)
+    return True
+
+
+def reconcile_due(reference: str) -> bool:
+    """
+    Whether a client poll may fall back to Paystack's verify API for this
+    reference; allowed once per PAYSTACK_VERIFY_INTERVAL seconds.
+    """
+    return cache.add(
+        f"paystack:verify:{reference}", 1, settings.PAYSTACK_VERIFY_INTERVAL
+    )
@@ -1,47 +1,401 @@
-from django.conf import settings
+"""
+Paystack transaction API client.
+
+Each client keeps one pooled session, so repeated calls reuse kept-alive TLS
+connections, and every request is bounded by connect and read timeouts.
+Idempotent calls (verify) are retried with capped exponential backoff on
+transport errors, 429 and 5xx. Initialize creates a transaction on Paystack,
+so it is only retried when the request provably never left this process.
+
+A circuit breaker, shared by every client in the process, opens after
+PAYSTACK_BREAKER_THRESHOLD consecutive failed calls and then fails fast for
+PAYSTACK_BREAKER_RESET seconds before letting a single probe through.
+
+AsyncPaystack is the httpx twin for ASGI views; it follows the same policy.
+Neither client raises: failures come back as {"status": False, "message": ...}.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from decimal import ROUND_HALF_UP, Decimal
+from functools import cache
+from typing import Callable
+from urllib.parse import quote
+from uuid import uuid4
+
+import httpx
 import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from core import metrics
+from core.timing import timed
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitBreaker:
+    """
+    Closed until `threshold` consecutive failures, then open for
+    `reset_timeout` seconds. After that one caller is let through as a probe;
+    its outcome closes the breaker or opens it again.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self.probing = False
+
+
+@cache
+def shared_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        settings.PAYSTACK_BREAKER_THRESHOLD, settings.PAYSTACK_BREAKER_RESET
+    )
+
+
+def to_kobo(amount) -> int:
+    """Paystack takes amounts as an integer count of the currency subunit."""
+    naira = Decimal(str(amount))
+    return int((naira * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def never_sent(exc: Exception) -> bool:
+    """True when the request failed before any byte reached Paystack."""
+    if isinstance(
+        exc,
+        (
+            requests.ConnectTimeout,
+            httpx.ConnectError,
+            httpx.ConnectTimeout,
+            httpx.PoolTimeout,
+        ),
+    ):
+        return True
+    if isinstance(exc, requests.ConnectionError) and exc.args:
+        return isinstance(getattr(exc.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def operation(path: str) -> str:
+    """Metric label for a path: "/transaction/verify/ref" -> "transaction/verify"."""
+    return "/".join(path.strip("/").split("/")[:2])
+
+
+def failed(message: str, maybe_applied: bool = False) -> dict:
+    """
+    A failed call. `maybe_applied` marks failures Paystack may still have
+    acted on: a timeout after the request was sent, or a refused duplicate
+    reference.
+    """
+    if maybe_applied:
+        return {"status": False, "message": message, "maybe_applied": True}
+    return {"status": False, "message": message}
+
+
+def duplicate_reference(body: Callable[[], dict]) -> bool:
+    """Whether a refusal's body says the reference was used before."""
+    try:
+        message = body().get("message", "")
+    except (ValueError, AttributeError):
+        return False
+    return "duplicate" in str(message).lower()
+
+
+class BasePaystack:
+    def __init__(
+        self,
+        base_url: str | None = None,
+        *,
+        connect_timeout: float | None = None,
+        read_timeout: float | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.base_url = (base_url or settings.PAYSTACK_BASE_URL).rstrip("/")
+        self.connect_timeout = connect_timeout or settings.PAYSTACK_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.PAYSTACK_READ_TIMEOUT
+        self.retries = settings.PAYSTACK_MAX_RETRIES if retries is None else retries
+        self.backoff = settings.PAYSTACK_BACKOFF if backoff is None else backoff
+        self.breaker = breaker or shared_breaker()
+        self.headers = {
+            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
+            "Content-Type": "application/json",
+        }
+
+    def delay(self, attempt: int) -> float:
+        ceiling = min(settings.PAYSTACK_BACKOFF_MAX, self.backoff * 2**attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def retry_error(self, attempt: int, idempotent: bool, exc: Exception) -> bool:
+        return attempt < self.retries and (idempotent or never_sent(exc))
+
+    def retry_status(self, attempt: int, idempotent: bool, status: int) -> bool:
+        return attempt < self.retries and idempotent and status in RETRY_STATUSES
+
+    @contextmanager
+    def observed(self, path: str):
+        with timed("paystack"), metrics.PAYSTACK_LATENCY.labels(operation(path)).time():
+            yield
+
+    def count_error(self, path: str, reason: str) -> None:
+        metrics.PAYSTACK_ERRORS.labels(operation(path), reason).inc()
+
+    def unavailable(self, path: str, failure: str) -> dict:
+        self.count_error(path, "circuit_open")
+        logger.warning("Paystack circuit open, skipping call")
+        return failed(f"{failure}: payment gateway unavailable")
+
+    def transport_failed(self, failure: str, path: str, exc: Exception) -> dict:
+        self.breaker.record_failure()
+        self.count_error(path, "transport")
+        logger.warning("Paystack %s failed: %r", path, exc)
+        return failed(failure, maybe_applied=not never_sent(exc))
+
+    def finish(self, status: int, body: Callable[[], dict], failure: str) -> dict:
+        if status in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if status >= 400:
+            logger.warning("Paystack answered %s", status)
+            return failed(failure, maybe_applied=duplicate_reference(body))
+        try:
+            return body()
+        except ValueError:
+            return failed(failure)
+
+    @staticmethod
+    def initialize_payload(
+        customer_email: str, amount, reference: str | None = None
+    ) -> dict:
+        payload = {
+            "amount": to_kobo(amount),
+            "email": customer_email,
+            "channels": ["card", "ussd", "bank_transfer"],
+            "currency": "NGN",
+        }
+        if reference:
+            payload["reference"] = reference
+        return payload
+
+    @staticmethod
+    def verify_path(ref_code: str) -> str:
+        return f"/transaction/verify/{quote(str(ref_code), safe='')}"
+
+
+class Paystack(BasePaystack):
+    def __init__(self, base_url: str | None = None, **options):
+        super().__init__(base_url, **options)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.PAYSTACK_POOL_SIZE,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _request(
+        self, method: str, path: str, failure: str, idempotent: bool, **kwargs
+    ) -> dict:
+        if not self.breaker.allow():
+            return self.unavailable(path, failure)
+        attempt = 0
+        while True:
+            try:
+                with self.observed(path):
+                    response = self.session.request(
+                        method,
+                        f"{self.base_url}{path}",
+                        timeout=(self.connect_timeout, self.read_timeout),
+                        **kwargs,
+                    )
+            except requests.RequestException as exc:
+                if not self.retry_error(attempt, idempotent, exc):
+                    return self.transport_failed(failure, path, exc)
+            else:
+                if response.status_code >= 400:
+                    self.count_error(path, f"{response.status_code // 100}xx")
+                if not self.retry_status(attempt, idempotent, response.status_code):
+                    return self.finish(response.status_code, response.json, failure)
+                response.close()
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    def initialize_transaction(
+        self, customer_email: str, amount, reference: str | None = None
+    ) -> dict:
+        return self._request(
+            "POST",
+            "/transaction/initialize",
+            "Initialise Transaction Failed",
+            idempotent=False,
+            json=self.initialize_payload(customer_email, amount, reference),
+        )
+
+    def verify_transaction(self, ref_code: str) -> dict:
+        return self._request(
+            "GET", self.verify_path(ref_code), "Verification failed", idempotent=True
+        )
+
+
+class AsyncPaystack(BasePaystack):
+    """
+    httpx based twin of Paystack for async views. The underlying AsyncClient
+    belongs to the event loop it first runs on, so keep one per loop and
+    close it with `await client.aclose()` (or use it as a context manager).
+    """
+
+    def __init__(self, base_url: str | None = None, **options):
+        super().__init__(base_url, **options)
+        pool = settings.PAYSTACK_POOL_SIZE
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _request(
+        self, method: str, path: str, failure: str, idempotent: bool, **kwargs
+    ) -> dict:
+        if not self.breaker.allow():
+            return self.unavailable(path, failure)
+        attempt = 0
+        while True:
+            try:
+                with self.observed(path):
+                    response = await self.client.request(
+                        method, f"{self.base_url}{path}", **kwargs
+                    )
+            except httpx.HTTPError as exc:
+                if not self.retry_error(attempt, idempotent, exc):
+                    return self.transport_failed(failure, path, exc)
+            else:
+                if response.status_code >= 400:
+                    self.count_error(path, f"{response.status_code // 100}xx")
+                if not self.retry_status(attempt, idempotent, response.status_code):
+                    return self.finish(response.status_code, response.json, failure)
+            await asyncio.sleep(self.delay(attempt))
+            attempt += 1
+
+    async def initialize_transaction(
+        self, customer_email: str, amount, reference: str | None = None
+    ) -> dict:
+        return await self._request(
+            "POST",
+            "/transaction/initialize",
+            "Initialise Transaction Failed",
+            idempotent=False,
+            json=self.initialize_payload(customer_email, amount, reference),
+        )
+
+    async def verify_transaction(self, ref_code: str) -> dict:
+        return await self._request(
+            "GET", self.verify_path(ref_code), "Verification failed", idempotent=True
+        )
+
+
+class FakePaystack:
+    """
+    In-process stand-in for Paystack, for tests and offline development
+    (PAYMENT_GATEWAY = "core.paystack.FakePaystack"). The next `fail` calls
+    fail the way the real client reports errors. Like Paystack, it refuses a
+    reference twice and verifies only the references it accepted.
+    """
+
+    def __init__(self, fail: int = 0):
+        self.fail = fail
+        self.calls: list[tuple] = []
+        self.references: set[str] = set()
+        self._lock = threading.Lock()
+
+    def initialize_transaction(
+        self, customer_email: str, amount, reference: str | None = None
+    ) -> dict:
+        with self._lock:
+            self.calls.append((customer_email, to_kobo(amount), reference))
+            if self.fail:
+                self.fail -= 1
+                return failed("Initialise Transaction Failed")
+            reference = reference or uuid4().hex
+            if reference in self.references:
+                return failed("Initialise Transaction Failed", maybe_applied=True)
+            self.references.add(reference)
+        return {
+            "status": True,
+            "message": "Authorization URL created",
+            "data": {
+                "authorization_url": f"https://checkout.paystack.com/{reference}",
+                "access_code": reference,
+                "reference": reference,
+            },
+        }
+
+    def verify_transaction(self, ref_code: str) -> dict:
+        if ref_code not in self.references:
+            return failed("Verification failed")
+        return {"status": True, "data": {"reference": ref_code, "status": "abandoned"}}
+
 
-class Paystack:
-	def __init__(self):
-		# secret_key = settings.PAYSTACK_SECRET_KEY
-		self.base_url = "https://api.paystack.co/transaction"
-		self.headers = {
-			"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-			"Content-Type": "application/json",
-		}
-		return
-
-	def initialize_transaction(self, customer_email:str, amount:float):
-		url = f"{self.base_url}/initialize"
-		payload = {
-			"amount": f"{round(amount, 2) * 100}",
-			"email": customer_email,
-			"channels": ["card", "ussd", "bank_transfer"],
-			"currency": "NGN"
-		}
-		try:
-			response = requests.post(url=url, headers=self.headers, json=payload)
-			response.raise_for_status()
-			return response.json()
-		except Exception:
-			# log the exceptions
-
-			return {
-				"status": False,
-				"message": "Initialise Transaction Failed"
-			}
-	
-	def verify_transaction(self, ref_code):
-		url = f"{self.base_url}/verify/{ref_code}"
-
-		try:
-			response = requests.get(url=url, headers=self.headers)
-			response.raise_for_status()
-			return response.json()
-		except Exception:
-			# log the exception
-			
-			return {
-				"status": False,
-				"message": "Verification failed"
-			}
\ No newline at end of file
+@cache
+def get_gateway():
+    """The PAYMENT_GATEWAY client, one per process."""
+    return import_string(settings.PAYMENT_GATEWAY)()
@@ -0,0 +1,112 @@
+"""
+Time-limited stock holds between add-to-cart and payment.
+
+Adding to a cart reserves the line's units for STOCK_RESERVATION_TTL
+seconds. Reserving locks the product rows (in id order, like checkout) and
+admits a hold only if stock minus every other cart's unexpired holds covers
+it, so the holds never promise more than exists. Checkout then converts the
+cart's holds into a stock decrement without recounting availability.
+Expired holds are ignored by every query here and deleted in bulk by the
+release_reservations command.
+"""
+
+from datetime import timedelta
+from typing import Iterable
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import Cart, Product, StockReservation
+
+
+class OutOfStock(ValueError):
+    def __init__(self, message: str, products: Iterable[UUID] = ()):
+        super().__init__(message)
+        self.products = [str(pk) for pk in products]
+
+
+def held_by_others(product_ids: Iterable[UUID], cart: Cart) -> dict[UUID, int]:
+    rows = (
+        StockReservation.objects.filter(
+            product_id__in=product_ids, expires_at__gt=timezone.now()
+        )
+        .exclude(cart=cart)
+        .values("product_id")
+        .annotate(held=Sum("quantity"))
+        .values_list("product_id", "held")
+    )
+    return dict(rows)
+
+
+def lock_available(cart: Cart, product_ids: Iterable[UUID]) -> dict[UUID, int]:
+    """
+    Lock the products in id order and return how many units `cart` may hold
+    of each. Must run inside a transaction.
+    """
+    product_ids = list(product_ids)
+    stock = dict(
+        Product.objects.select_for_update()
+        .filter(id__in=product_ids)
+        .order_by("id")
+        .values_list("id", "stock")
+    )
+    held = held_by_others(stock, cart)
+    return {pk: units - held.get(pk, 0) for pk, units in stock.items()}
+
+
+def reserve(cart: Cart, quantities: dict[UUID, int]) -> None:
+    """
+    Set the cart's holds to `quantities` (0 drops the hold) and restart
+    their TTL. Raises OutOfStock, naming the short products, if any line
+    cannot be covered; nothing is written in that case.
+    """
+    with transaction.atomic():
+        available = lock_available(cart, [pk for pk, q in quantities.items() if q])
+        short = [
+            pk for pk, qty in quantities.items() if qty and available.get(pk, 0) < qty
+        ]
+        if short:
+            raise OutOfStock("Not enough stock", short)
+
+        expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    cart=cart, product_id=pk, quantity=qty, expires_at=expires_at
+                )
+                for pk, qty in quantities.items()
+                if qty
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "product"],
+            update_fields=["quantity", "expires_at"],
+        )
+        released = [pk for pk, qty in quantities.items() if not qty]
+        if released:
+            cart.reservations.filter(product_id__in=released).delete()
+
+
+def active_holds(cart: Cart) -> dict[UUID, int]:
+    return dict(
+        cart.reservations.filter(expires_at__gt=timezone.now()).values_list(
+            "product_id", "quantity"
+        )
+    )
+
+
+def release_expired(chunk_size: int = 1000) -> int:
+    """
+    Delete expired holds in bounded batches; returns how many were removed.
+    """
+    now = timezone.now()
+    expired = StockReservation.objects.filter(expires_at__lte=now).order_by("id")
+    total = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            return total
+        deleted, _ = StockReservation.objects.filter(id__in=ids).delete()
+        total += deleted
@@ -0,0 +1,181 @@
+"""
+Daily sales rollups per vendor and per product.
+
+Vendor revenue computed on demand means scanning order_items through the
+orders m2m for every paid order. Instead record_sales() adds each successful
+payment's lines to VendorDailySales and ProductDailySales once, as upserts
+that increment the existing row with F() expressions, and adds the revenue
+to Vendor.total_sales_ever. confirm_charge calls it in the transaction that
+marks the payment successful; the backfill_sales command does the same for
+history. Payments are flagged sales_recorded as they are counted, so neither
+path can count one twice.
+
+A sale belongs to the day (UTC) its payment was confirmed, approximated by
+Payment.updated_at for history. dashboard() reads only the rollups.
+"""
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, QuerySet, Sum
+
+from core.cache import invalidate_vendors
+from core.models import (
+    OrderItem,
+    Payment,
+    ProductDailySales,
+    Vendor,
+    VendorDailySales,
+)
+
+
+def _increment(model, keys: dict, amounts: dict, defaults: dict | None = None):
+    """
+    Add `amounts` to the row at `keys`; a missing row is created with them
+    and `defaults`.
+    """
+    changes = {field: F(field) + value for field, value in amounts.items()}
+    if model.objects.filter(**keys).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **amounts, **(defaults or {}))
+    except IntegrityError:  # created concurrently
+        model.objects.filter(**keys).update(**changes)
+
+
+def record_sales(payments: QuerySet[Payment]) -> int:
+    """
+    Count the successful, not yet recorded payments among `payments` in the
+    rollups; returns how many were counted.
+    """
+    with transaction.atomic():
+        claimed = list(
+            payments.select_for_update()
+            .filter(
+                payment_status=Payment.Payment_Status.Successful, sales_recorded=False
+            )
+            .values_list("id", "order_id", "updated_at")
+        )
+        if not claimed:
+            return 0
+        Payment.objects.filter(id__in=[row[0] for row in claimed]).update(
+            sales_recorded=True
+        )
+
+        day_of = {order_id: paid_at.date() for _, order_id, paid_at in claimed}
+        lines = (
+            OrderItem.objects.filter(orders__in=day_of, product__isnull=False)
+            .values_list(
+                "orders",
+                "product_id",
+                "product__vendor_id",
+                "quantity",
+                "price_per_item",
+            )
+            .iterator(chunk_size=2000)
+        )
+        products = defaultdict(lambda: [0, Decimal(0)])
+        vendors = defaultdict(lambda: [set(), 0, Decimal(0)])
+        for order_id, product_id, vendor_id, quantity, price in lines:
+            day, revenue = day_of[order_id], quantity * price
+            product = products[(product_id, vendor_id, day)]
+            product[0] += quantity
+            product[1] += revenue
+            vendor = vendors[(vendor_id, day)]
+            vendor[0].add(order_id)
+            vendor[1] += quantity
+            vendor[2] += revenue
+
+        for (product_id, vendor_id, day), (units, revenue) in products.items():
+            _increment(
+                ProductDailySales,
+                {"product_id": product_id, "day": day},
+                {"units": units, "revenue": revenue},
+                defaults={"vendor_id": vendor_id},
+            )
+        earned = defaultdict(Decimal)
+        for (vendor_id, day), (orders, units, revenue) in vendors.items():
+            _increment(
+                VendorDailySales,
+                {"vendor_id": vendor_id, "day": day},
+                {"orders": len(orders), "units": units, "revenue": revenue},
+            )
+            earned[vendor_id] += revenue
+        for vendor_id, revenue in earned.items():
+            Vendor.objects.filter(id=vendor_id).update(
+                total_sales_ever=F("total_sales_ever") + revenue
+            )
+        invalidate_vendors(earned)  # product payloads show the vendor's sales
+    return len(claimed)
+
+
+def unrecorded() -> QuerySet[Payment]:
+    return Payment.objects.filter(
+        payment_status=Payment.Payment_Status.Successful, sales_recorded=False
+    )
+
+
+def backfill(chunk_size: int = 500) -> int:
+    """
+    Count every successful payment not counted yet, `chunk_size` payments
+    per transaction; returns how many were counted.
+    """
+    total = 0
+    while True:
+        ids = list(
+            unrecorded().order_by("id").values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return total
+        total += record_sales(Payment.objects.filter(id__in=ids))
+
+
+def reset() -> None:
+    """Forget all rollups, so the next backfill recomputes them from scratch."""
+    with transaction.atomic():
+        ProductDailySales.objects.all().delete()
+        VendorDailySales.objects.all().delete()
+        sold = Vendor.objects.exclude(total_sales_ever=0)
+        invalidate_vendors(sold.values_list("id", flat=True))
+        sold.update(total_sales_ever=0)
+        Payment.objects.filter(sales_recorded=True).update(sales_recorded=False)
+
+
+def dashboard(vendor: Vendor, start: date, end: date, top: int = 10) -> dict:
+    """A vendor's sales between `start` and `end` (inclusive), from the rollups."""
+    days = list(
+        VendorDailySales.objects.filter(vendor=vendor, day__range=(start, end))
+        .order_by("day")
+        .values("day", "orders", "units", "revenue")
+    )
+    products = (
+        ProductDailySales.objects.filter(vendor=vendor, day__range=(start, end))
+        .values("product_id", "product__name")
+        .annotate(sold=Sum("units"), earned=Sum("revenue"))
+        .order_by("-earned", "product_id")[:top]
+    )
+    return {
+        "vendor": vendor.id,
+        "total_sales_ever": f"{vendor.total_sales_ever:.2f}",
+        "is_diamond": vendor.is_diamond,
+        "start": start,
+        "end": end,
+        "totals": {
+            "orders": sum(row["orders"] for row in days),
+            "units": sum(row["units"] for row in days),
+            "revenue": f"{sum((row['revenue'] for row in days), Decimal(0)):.2f}",
+        },
+        "days": [{**row, "revenue": f"{row['revenue']:.2f}"} for row in days],
+        "top_products": [
+            {
+                "product": row["product_id"],
+                "name": row["product__name"],
+                "units": row["sold"],
+                "revenue": f"{row['earned']:.2f}",
+            }
+            for row in products
+        ],
+    }
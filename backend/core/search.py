@@ -0,0 +1,218 @@
+"""
+Full-text product search.
+
+On Postgres, products.search_vector holds a weighted tsvector (name "A",
+description "B") behind a GIN index, plus a pg_trgm GIN index on name for
+typo tolerance. On SQLite (development) the same role is played by two FTS5
+tables: products_fts (porter stemmed) and products_fts_trgm (trigram
+tokenizer). Both are kept current by triggers created in migration 0004, so
+ORM saves and bulk_create are covered; rebuild_index() exists for loads that
+bypass or disable the triggers.
+"""
+
+import re
+from datetime import datetime
+from uuid import UUID
+
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorExact,
+    SearchVectorField,
+    TrigramWordSimilarity,
+)
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from core.models import Product
+
+# pg_trgm's default word_similarity threshold; mirrored by the SQLite fallback
+SIMILARITY_THRESHOLD = 0.6
+# how many trigram candidates the SQLite fallback scores in Python
+TRIGRAM_CANDIDATES = 500
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_PG_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Trigram set of `text`, padded per word the way pg_trgm does it.
+    """
+    grams = set()
+    for word in _words(text):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def word_similarity(query: str, text: str) -> float:
+    """
+    Share of the query's trigrams found in the best-matching run of words in
+    `text`; close to pg_trgm's word_similarity() for short queries.
+    """
+    query_grams = trigrams(query)
+    words = _words(text)
+    if not query_grams or not words:
+        return 0.0
+    span = min(len(_words(query)), len(words))
+    best = 0
+    for i in range(len(words) - span + 1):
+        window = trigrams(" ".join(words[i : i + span]))
+        best = max(best, len(query_grams & window))
+    return best / len(query_grams)
+
+
+def _fts5_quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _search_postgres(query: str, limit: int, offset: int) -> list[UUID]:
+    # search_vector is maintained by a trigger, outside the model
+    vector = RawSQL("search_vector", [], output_field=SearchVectorField())
+    tsquery = SearchQuery(query, config="english", search_type="websearch")
+    ids = (
+        Product.objects.filter(
+            Q(SearchVectorExact(vector, tsquery))
+            | Q(TrigramWordSimilar(F("name"), query))  # typos: name %> query
+        )
+        .annotate(
+            rank=SearchRank(vector, tsquery, cover_density=True)
+            + TrigramWordSimilarity(query, "name")
+        )
+        .order_by("-rank", "id")
+        .values_list("id", flat=True)
+    )
+    return list(ids[offset : offset + limit])
+
+
+def _search_sqlite(query: str, limit: int, offset: int) -> list[UUID]:
+    words = _words(query)
+    if not words:
+        return []
+
+    # every word must match; the last one may be a prefix (search-as-you-type)
+    match = " ".join(_fts5_quote(w) for w in words[:-1])
+    match = f"{match} {_fts5_quote(words[-1])}*".strip()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT product_id FROM products_fts WHERE products_fts MATCH %s "
+            "ORDER BY bm25(products_fts, 0.0, 10.0, 1.0), product_id "
+            "LIMIT %s OFFSET %s",
+            [match, limit, offset],
+        )
+        hits = [UUID(row[0]) for row in cursor.fetchall()]
+        if hits:
+            return hits
+        if offset:
+            # an empty later page: past the last exact match, or the query
+            # has none and is paged through the trigram fallback below
+            cursor.execute(
+                "SELECT 1 FROM products_fts WHERE products_fts MATCH %s LIMIT 1",
+                [match],
+            )
+            if cursor.fetchone():
+                return []
+
+    # nothing matched exactly: score trigram candidates like pg_trgm would
+    grams = {g for w in words for g in (w[i : i + 3] for i in range(len(w) - 2))}
+    if not grams:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT product_id, name FROM products_fts_trgm "
+            "WHERE products_fts_trgm MATCH %s LIMIT %s",
+            [" OR ".join(_fts5_quote(g) for g in grams), TRIGRAM_CANDIDATES],
+        )
+        candidates = cursor.fetchall()
+
+    scored = sorted(
+        ((word_similarity(query, name), pid) for pid, name in candidates),
+        key=lambda pair: (-pair[0], pair[1]),
+    )
+    matches = [UUID(pid) for score, pid in scored if score >= SIMILARITY_THRESHOLD]
+    return matches[offset : offset + limit]
+
+
+def search_product_ids(query: str, limit: int, offset: int = 0) -> list[UUID]:
+    """
+    Ids of products matching `query`, best match first.
+    """
+    if connection.vendor == "postgresql":
+        return _search_postgres(query, limit, offset)
+    return _search_sqlite(query, limit, offset)
+
+
+def search_products(query: str, limit: int, offset: int = 0) -> list[Product]:
+    ids = search_product_ids(query, limit, offset)
+    products = Product.objects.select_related("vendor").in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def _reindex_chunk(ids: list[UUID]) -> None:
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE products SET search_vector = {_PG_VECTOR_SQL} "
+                "WHERE id = ANY(%s::uuid[])",
+                [[str(pk) for pk in ids]],
+            )
+        return
+
+    # Django stores UUIDs on SQLite as 32 char hex
+    keys = [pk.hex for pk in ids]
+    marks = ", ".join(["%s"] * len(keys))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM products_fts WHERE product_id IN ({marks})", keys)
+        cursor.execute(
+            f"DELETE FROM products_fts_trgm WHERE product_id IN ({marks})", keys
+        )
+        cursor.execute(
+            "INSERT INTO products_fts (product_id, name, description) "
+            f"SELECT id, name, description FROM products WHERE id IN ({marks})",
+            keys,
+        )
+        cursor.execute(
+            "INSERT INTO products_fts_trgm (product_id, name) "
+            f"SELECT id, name FROM products WHERE id IN ({marks})",
+            keys,
+        )
+
+
+def rebuild_index(since: datetime | None = None, chunk_size: int = 1000) -> int:
+    """
+    Recompute index entries for every product, or only those updated at or
+    after `since`. Works in id-ordered chunks, one transaction per chunk, so
+    it can run against a live table. Returns the number of products indexed.
+    """
+    products = Product.objects.order_by("id")
+    if since is not None:
+        products = products.filter(updated_at__gte=since)
+    elif connection.vendor != "postgresql":
+        # a full rebuild also drops entries left behind by deleted rows
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM products_fts")
+            cursor.execute("DELETE FROM products_fts_trgm")
+
+    total = 0
+    last_id = None
+    while True:
+        chunk = products if last_id is None else products.filter(id__gt=last_id)
+        ids = list(chunk.values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            _reindex_chunk(ids)
+        total += len(ids)
+        last_id = ids[-1]
+    return total
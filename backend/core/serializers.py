@@ -1,7 +1,13 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework.validators import UniqueValidator
 
+from core.images import bounded_upload, srcset
 from core.models import (
     Cart,
     CartItem,
@@ -70,10 +76,12 @@ class RegisterSerializer(serializers.Serializer):
 
 
 class VendorSerializer(serializers.ModelSerializer):
+    avatar_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Vendor
         # fields = "__all__"
-        exclude = ["user"]
+        exclude = ["user", "avatar_variants"]
         read_only_fields = [
             "id",
             "is_vendor",
@@ -84,24 +92,29 @@ class VendorSerializer(serializers.ModelSerializer):
             "total_sales_ever",
         ]
 
-    def validate_avatar(self, value):
-        if value.size > 5 * 1024 * 1024:
-            raise serializers.ValidationError("Image size cannot exceed 5MB")
+    def get_avatar_srcset(self, vendor) -> dict | None:
+        return srcset(
+            vendor.avatar_variants, vendor.avatar, self.context.get("request")
+        )
 
-        # Check file extension
-        if not value.name.lower().endswith((".png", ".jpg", ".jpeg", ".gif")):
-            raise serializers.ValidationError(
-                "Only PNG, JPG, JPEG, and GIF files are allowed"
-            )
-        return value
+    def validate_avatar(self, value):
+        if value is None:
+            return value
+        try:
+            return bounded_upload(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
 
 
 class ProductSerializer(serializers.ModelSerializer):
     vendor = VendorSerializer(read_only=True)
+    # {format: srcset}; null until the variants of the current upload are
+    # built, in which case `thumbnail` (the original) is the image to use
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["thumbnail_variants"]
         read_only_fields = [
             "id",
             "vendor",
@@ -111,12 +124,72 @@ class ProductSerializer(serializers.ModelSerializer):
             "old_price",
         ]
 
+    def get_thumbnail_srcset(self, product) -> dict | None:
+        return srcset(
+            product.thumbnail_variants, product.thumbnail, self.context.get("request")
+        )
+
+    def validate_thumbnail(self, value):
+        try:
+            return bounded_upload(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
     def validate_stock(self, value):
         if value < 1:
             raise serializers.ValidationError("Stock count cannot be less than one")
         return value
 
 
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    Validates the query string of the product listing.
+    """
+
+    SORT_CHOICES = ["newest", "price_asc", "price_desc"]
+
+    min_price = serializers.DecimalField(
+        max_digits=18, decimal_places=2, min_value=0, required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=18, decimal_places=2, min_value=0, required=False
+    )
+    vendor = serializers.ListField(child=serializers.UUIDField(), required=False)
+    flash_sale = serializers.BooleanField(required=False, allow_null=True, default=None)
+    in_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+    sort = serializers.ChoiceField(choices=SORT_CHOICES, default="newest")
+    facets = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        min_price, max_price = attrs.get("min_price"), attrs.get("max_price")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError("min_price cannot exceed max_price")
+        return attrs
+
+
+class SalesRangeSerializer(serializers.Serializer):
+    """
+    Validates the query string of the vendor sales dashboard; both ends are
+    inclusive and default to the last 30 days.
+    """
+
+    MAX_DAYS = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.setdefault("end", timezone.now().date())
+        start = attrs.setdefault("start", end - timedelta(days=29))
+        if start > end:
+            raise serializers.ValidationError("start cannot be after end")
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(
+                f"The range cannot exceed {self.MAX_DAYS} days"
+            )
+        return attrs
+
+
 class ShippingAddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShippingAddress
@@ -133,6 +206,9 @@ class CartItemSerializer(serializers.ModelSerializer):
     product_thumbnail = serializers.ImageField(
         source="product.thumbnail", read_only=True
     )
+    sub_total = serializers.DecimalField(
+        max_digits=20, decimal_places=2, read_only=True
+    )
 
     class Meta:
         model = CartItem
@@ -152,7 +228,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 class CartSerializer(serializers.ModelSerializer):
     cart_items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True
+        max_digits=20, decimal_places=2, read_only=True
     )
 
     class Meta:
@@ -161,10 +237,27 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "user", "created_at", "updated_at", "total_price"]
 
 
+class CartOperationSerializer(serializers.Serializer):
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    MODE_CHOICES = ["set", "add"]
+
+    mode = serializers.ChoiceField(choices=MODE_CHOICES, default="set")
+    items = CartOperationSerializer(
+        many=True, allow_empty=False, max_length=settings.CART_BATCH_MAX_ITEMS
+    )
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source="product.name", read_only=True)
+    # the product is null once it has been deleted
+    product_name = serializers.CharField(
+        source="product.name", read_only=True, default=None
+    )
     product_thumbnail = serializers.ImageField(
-        source="product.thumbnail", read_only=True
+        source="product.thumbnail", read_only=True, default=None
     )
 
     class Meta:
@@ -182,24 +275,29 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    """
+    Expects order_items prefetched with their products and shipping_address
+    selected, see views._orders_queryset(); nothing here queries per order.
+    """
+
     order_items = OrderItemSerializer(many=True, read_only=True)
-    shipp_addr_details = ShippingAddressSerializer(source="shipp_addr", read_only=True)
-    total_amount = serializers.DecimalField(
-        max_digits=12, decimal_places=2, read_only=True
+    shipping_address_details = ShippingAddressSerializer(
+        source="shipping_address", read_only=True
     )
+    total_amount = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
         fields = [
             "id",
             "user",
-            "shipp_addr",
-            "shipp_addr_details",
+            "shipping_address",
+            "shipping_address_details",
             "status",
             "order_items",
             "amount",
+            "order_refrence",
             "payment_refrence",
-            "transaction_refrence",
             "created_at",
             "updated_at",
             "total_amount",
@@ -212,3 +310,8 @@ class OrderSerializer(serializers.ModelSerializer):
             "updated_at",
             "total_amount",
         ]
+
+    def get_total_amount(self, order: Order) -> str:
+        # from the prefetched lines; Order.total_amount() would query
+        total = sum((item.sub_total for item in order.order_items.all()), Decimal(0))
+        return f"{total:.2f}"
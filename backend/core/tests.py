@@ -1,3 +1,2094 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import tempfile
+import hashlib
+import hmac
+import json
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import httpx
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import (
+    Cart,
+    CartItem,
+    CustomUser,
+    Job,
+    Order,
+    OrderItem,
+    Payment,
+    PaymentEvent,
+    PaymentOutbox,
+    Product,
+    ProductDailySales,
+    ShippingAddress,
+    StockReservation,
+    Vendor,
+    VendorDailySales,
+)
+from core import benchmark, emails, images, imports, payments, sales, tokens, views
+from core.cache import USER_FIELDS, cached_user, get_or_compute
+from core.filters import SORT_ORDERINGS
+from core.jobs import enqueue, run_once, task
+from core.outbox import drain
+from core.paystack import AsyncPaystack, CircuitBreaker, FakePaystack, Paystack
+from core.search import search_product_ids
+from core.serializers import ProductFilterSerializer
+from core.timing import QueryBudgetExceeded
+
+
+class CatalogFixtures:
+    """
+    Base fixture: one vendor, helpers for products and logged in clients.
+    """
+
+    def setUp(self):
+        cache.clear()
+        vendor_user = CustomUser.objects.create_user(
+            email="vendor@example.com", password="Password@2", is_vendor=True
+        )
+        self.vendor = Vendor.objects.create(
+            user=vendor_user, brand_email="brand@example.com", brand_name="Brand"
+        )
+        self.user = CustomUser.objects.create_user(
+            email="user@example.com", password="Password@2"
+        )
+
+    def make_product(self, **fields) -> Product:
+        fields.setdefault("name", "Product")
+        fields.setdefault("stock", 10)
+        fields.setdefault("description", "A product")
+        fields.setdefault("current_price", Decimal("100.00"))
+        fields.setdefault("thumbnail", "products/placeholder.webp")
+        return Product.objects.create(vendor=self.vendor, **fields)
+
+    def client_for(self, user) -> APIClient:
+        client = APIClient()
+        client.cookies["access_token"] = str(RefreshToken.for_user(user).access_token)
+        return client
+
+    def make_address(self, user) -> ShippingAddress:
+        return ShippingAddress.objects.create(
+            user=user,
+            first_name="Ada",
+            last_name="Obi",
+            phone="+2348000000000",
+            address="1 Marina",
+            country="Nigeria",
+            state="Lagos",
+            lga="Lagos Island",
+            zip_code="101001",
+        )
+
+
+class CatalogTestCase(CatalogFixtures, TestCase):
+    pass
+
+
+class CartQueryTests(CatalogTestCase):
+    def fill_cart(self, lines: int) -> Cart:
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        for i in range(lines):
+            product = self.make_product(
+                name=f"Product {i}", current_price=Decimal("10.50")
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        return cart
+
+    def count_cart_queries(self) -> int:
+        client = self.client_for(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/carts")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_total_price_is_a_decimal_aggregate(self):
+        cart = self.fill_cart(3)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_price, Decimal("63.00"))
+
+    def test_cart_queries_do_not_grow_with_lines(self):
+        self.fill_cart(1)
+        self.count_cart_queries()  # the first request also caches the user
+        small = self.count_cart_queries()
+        self.fill_cart(39)
+        self.assertEqual(self.count_cart_queries(), small)
+
+    def test_cart_response(self):
+        self.fill_cart(2)
+        data = self.client_for(self.user).get("/api/carts").json()
+        self.assertEqual(len(data["cart_items"]), 2)
+        self.assertEqual(data["cart_items"][0]["sub_total"], "21.00")
+        self.assertEqual(data["total_price"], "42.00")
+
+
+class CartBatchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+        self.products = [self.make_product(name=f"Product {i}") for i in range(3)]
+
+    def batch(self, items, mode="set"):
+        return self.client.post(
+            "/api/carts/batch", {"mode": mode, "items": items}, format="json"
+        )
+
+    def test_set_add_and_remove_lines(self):
+        first, second, third = (str(p.id) for p in self.products)
+        response = self.batch(
+            [
+                {"product_id": first, "quantity": 2},
+                {"product_id": second, "quantity": 1},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["cart_items"]), 2)
+
+        response = self.batch(
+            [
+                {"product_id": first, "quantity": 3},
+                {"product_id": second, "quantity": 0},
+                {"product_id": third, "quantity": 1},
+            ],
+            mode="add",
+        )
+        quantities = {
+            line["product"]: line["quantity"] for line in response.json()["cart_items"]
+        }
+        self.assertEqual(quantities, {first: 5, second: 1, third: 1})
+
+        response = self.batch([{"product_id": second, "quantity": 0}])
+        self.assertNotIn(
+            second, [line["product"] for line in response.json()["cart_items"]]
+        )
+
+    def test_rejects_unknown_products_and_short_stock(self):
+        response = self.batch(
+            [{"product_id": "00000000-0000-0000-0000-000000000000", "quantity": 1}]
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.batch(
+            [{"product_id": str(self.products[0].id), "quantity": 11}]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        extra = [self.make_product(name=f"Extra {i}") for i in range(20)]
+        self.batch([{"product_id": str(self.products[1].id), "quantity": 1}])
+        with CaptureQueriesContext(connection) as small:
+            self.batch([{"product_id": str(self.products[0].id), "quantity": 1}])
+        items = [{"product_id": str(p.id), "quantity": 1} for p in extra]
+        with CaptureQueriesContext(connection) as large:
+            self.batch(items)
+        self.assertEqual(len(large), len(small))
+
+
+class CheckoutTests(CatalogTestCase):
+    def test_checkout_creates_order_and_takes_stock(self):
+        first = self.make_product(stock=5, current_price=Decimal("10.00"))
+        second = self.make_product(stock=5, current_price=Decimal("2.50"))
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=first, quantity=2)
+        CartItem.objects.create(cart=cart, product=second, quantity=4)
+        address = self.make_address(self.user)
+
+        response = self.client_for(self.user).post(f"/api/checkout/{address.id}")
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.amount, Decimal("30.00"))
+        self.assertEqual(order.order_items.count(), 2)
+        self.assertEqual(order.status, Order.Status.Pending)
+        self.assertEqual(order.outbox.amount, Decimal("30.00"))
+        self.assertEqual(response.json()["payment"]["status"], "Pending")
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, second.stock), (3, 1))
+        self.assertFalse(cart.cart_items.exists())
+
+    def test_checkout_rolls_back_when_any_line_is_short(self):
+        plenty = self.make_product(stock=5)
+        scarce = self.make_product(stock=1)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=plenty, quantity=1)
+        CartItem.objects.create(cart=cart, product=scarce, quantity=2)
+        address = self.make_address(self.user)
+
+        response = self.client_for(self.user).post(f"/api/checkout/{address.id}")
+        self.assertEqual(response.status_code, 400)
+        plenty.refresh_from_db()
+        self.assertEqual(plenty.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cart.cart_items.count(), 2)
+
+
+def serializes_writers() -> bool:
+    """
+    Row locks, or SQLite on a file taking its lock at BEGIN IMMEDIATE (see
+    DATABASES); a shared in-memory SQLite fails concurrent writers outright.
+    """
+    if connection.features.has_select_for_update:
+        return True
+    options = connection.settings_dict["OPTIONS"]
+    return (
+        connection.vendor == "sqlite"
+        and options.get("transaction_mode") == "IMMEDIATE"
+        and not connection.is_in_memory_db()
+    )
+
+
+class CheckoutConcurrencyTests(CatalogFixtures, TransactionTestCase):
+    buyers = 12
+    stock = 5
+
+    def setUp(self):
+        if not serializes_writers():
+            self.skipTest("the database does not serialize concurrent writers")
+        super().setUp()
+
+    def checkout_concurrently(self, product: Product) -> list[int]:
+        clients = []
+        for i in range(self.buyers):
+            buyer = CustomUser.objects.create_user(
+                email=f"buyer{i}@example.com", password="Password@2"
+            )
+            cart = Cart.objects.create(user=buyer)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            clients.append((self.client_for(buyer), self.make_address(buyer)))
+
+        start = threading.Barrier(self.buyers)
+        statuses = []
+
+        def buy(client, address):
+            try:
+                start.wait()
+                response = client.post(f"/api/checkout/{address.id}")
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=pair) for pair in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_concurrent_checkouts_never_oversell(self):
+        product = self.make_product(stock=self.stock)
+        statuses = self.checkout_concurrently(product)
+
+        product.refresh_from_db()
+        sold = Order.objects.count()
+        self.assertLessEqual(sold, self.stock)
+        self.assertEqual(product.stock, self.stock - sold)
+        self.assertEqual(statuses.count(201), sold)
+        # the losers are told it is sold out, not failed by a lock error
+        self.assertEqual(sorted(statuses), [201] * sold + [400] * (self.buyers - sold))
+        self.assertEqual(sold, self.stock)
+
+
+class StockReservationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_product(stock=3)
+        self.other = CustomUser.objects.create_user(
+            email="other@example.com", password="Password@2"
+        )
+
+    def add(self, user, quantity):
+        return self.client_for(user).post(
+            f"/api/cart/add/{self.product.id}", {"quantity": quantity}, format="json"
+        )
+
+    def test_holds_reduce_availability_for_other_carts(self):
+        self.assertEqual(self.add(self.user, 2).status_code, 200)
+        self.assertEqual(self.add(self.other, 2).status_code, 400)
+        self.assertEqual(self.add(self.other, 1).status_code, 200)
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        self.add(self.user, 3)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.add(self.other, 3).status_code, 200)
+
+        call_command("release_reservations", stdout=mock.MagicMock())
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_checkout_converts_holds(self):
+        self.add(self.user, 2)
+        address = self.make_address(self.user)
+        response = self.client_for(self.user).post(f"/api/checkout/{address.id}")
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_with_lapsed_hold_respects_other_holds(self):
+        self.add(self.user, 2)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.add(self.other, 2)
+        address = self.make_address(self.user)
+        response = self.client_for(self.user).post(f"/api/checkout/{address.id}")
+        self.assertEqual(response.status_code, 400)
+
+
+class StubPaystack(BaseHTTPRequestHandler):
+    """
+    Answers from `script`, a list of (status, body, delay) consumed one per
+    request (the last entry repeats), and records what it received.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.answer()
+
+    def do_POST(self):
+        self.answer()
+
+    def answer(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        server = self.server
+        server.received.append((self.command, self.path, self.headers, body))
+        server.peers.add(self.client_address)
+        status, payload, delay = (
+            server.script.pop(0) if len(server.script) > 1 else server.script[0]
+        )
+        if delay:
+            threading.Event().wait(delay)
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            pass  # the client timed out and hung up
+
+    def log_message(self, *args):
+        pass
+
+
+VERIFIED = {"status": True, "data": {"status": "success"}}
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def serve_stub_paystack(test) -> ThreadingHTTPServer:
+    """A StubPaystack server on a free port, shut down after `test`."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPaystack)
+    server.daemon_threads = True
+    server.received, server.peers = [], set()
+    server.script = [(200, VERIFIED, 0)]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+class PaystackClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = serve_stub_paystack(self)
+        self.base_url = "http://127.0.0.1:%d" % self.server.server_port
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+
+    def paystack(self, cls=Paystack, **options):
+        options.setdefault("backoff", 0)
+        options.setdefault("breaker", self.breaker)
+        client = cls(self.base_url, **options)
+        if cls is Paystack:
+            self.addCleanup(client.close)
+        return client
+
+    def test_initialize_sends_kobo_and_reuses_the_connection(self):
+        paystack = self.paystack()
+        paystack.initialize_transaction("ada@example.com", Decimal("1234.56"))
+        self.assertEqual(paystack.verify_transaction("ref/1"), VERIFIED)
+
+        (_, path, headers, body), (_, verify_path, _, _) = self.server.received
+        self.assertEqual(path, "/transaction/initialize")
+        self.assertEqual(body["amount"], 123456)
+        self.assertTrue(headers["Authorization"].startswith("Bearer "))
+        self.assertEqual(verify_path, "/transaction/verify/ref%2F1")
+        self.assertEqual(len(self.server.peers), 1)
+
+    def test_only_idempotent_calls_are_retried(self):
+        self.server.script = [(503, {}, 0), (503, {}, 0), (200, VERIFIED, 0)]
+        self.assertEqual(self.paystack().verify_transaction("ref"), VERIFIED)
+        self.assertEqual(len(self.server.received), 3)
+
+        self.server.received.clear()
+        self.server.script = [(503, {}, 0)]
+        response = self.paystack().initialize_transaction("ada@example.com", 10)
+        self.assertFalse(response["status"])
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_read_timeout_bounds_the_call(self):
+        self.server.script = [(200, VERIFIED, 1)]
+        paystack = self.paystack(read_timeout=0.1, retries=0)
+        self.assertFalse(paystack.verify_transaction("ref")["status"])
+
+    def test_breaker_fails_fast_then_probes(self):
+        errors = {
+            reason: sample(
+                "paystack_errors_total",
+                operation="transaction/verify",
+                reason=reason,
+            )
+            for reason in ("5xx", "circuit_open")
+        }
+        clock = mock.Mock(return_value=0.0)
+        self.breaker.clock = clock
+        self.server.script = [(500, {}, 0)]
+        paystack = self.paystack(retries=0)
+        paystack.verify_transaction("ref")
+        paystack.verify_transaction("ref")
+        self.assertTrue(self.breaker.is_open)
+
+        response = paystack.verify_transaction("ref")
+        self.assertIn("unavailable", response["message"])
+        self.assertEqual(len(self.server.received), 2)
+        for reason, count in [("5xx", 2), ("circuit_open", 1)]:
+            self.assertEqual(
+                sample(
+                    "paystack_errors_total",
+                    operation="transaction/verify",
+                    reason=reason,
+                ),
+                errors[reason] + count,
+            )
+
+        clock.return_value = 61.0
+        self.server.script = [(200, VERIFIED, 0)]
+        self.assertEqual(paystack.verify_transaction("ref"), VERIFIED)
+        self.assertFalse(self.breaker.is_open)
+
+    def test_async_client_retries_and_verifies(self):
+        self.server.script = [(502, {}, 0), (200, VERIFIED, 0)]
+
+        async def verify():
+            async with self.paystack(AsyncPaystack) as paystack:
+                return await paystack.verify_transaction("ref")
+
+        self.assertEqual(asyncio.run(verify()), VERIFIED)
+        self.assertEqual(len(self.server.received), 2)
+
+
+# charge.success as delivered by Paystack (trimmed, identifiers replaced)
+CHARGE_SUCCESS = {
+    "event": "charge.success",
+    "data": {
+        "id": 302961,
+        "domain": "live",
+        "status": "success",
+        "reference": "qTPrJoy9Bx",
+        "amount": 1250050,
+        "message": None,
+        "gateway_response": "Approved by Financial Institution",
+        "paid_at": "2016-09-30T21:10:19.000Z",
+        "created_at": "2016-09-30T21:09:56.000Z",
+        "channel": "card",
+        "currency": "NGN",
+        "ip_address": "41.242.49.37",
+        "metadata": 0,
+        "log": None,
+        "fees": None,
+        "customer": {
+            "id": 68324,
+            "first_name": "Ada",
+            "last_name": "Obi",
+            "email": "user@example.com",
+            "customer_code": "CUS_qo38as2hpsgk2r0",
+            "phone": None,
+            "metadata": None,
+            "risk_action": "default",
+        },
+        "authorization": {
+            "authorization_code": "AUTH_f5rnfq9p",
+            "bin": "539999",
+            "last4": "8877",
+            "exp_month": "08",
+            "exp_year": "2020",
+            "card_type": "mastercard DEBIT",
+            "bank": "Guaranty Trust Bank",
+            "country_code": "NG",
+            "brand": "mastercard",
+        },
+        "plan": {},
+    },
+}
+
+
+class PaystackWebhookTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(
+            user=self.user, amount=Decimal("12500.50"), status=Order.Status.Processing
+        )
+        self.payment = Payment.objects.create(
+            order=self.order,
+            user=self.user,
+            amount=Decimal("12500.50"),
+            payment_refrence="qTPrJoy9Bx",
+        )
+
+    def deliver(self, event, signature=None):
+        body = json.dumps(event).encode()
+        if signature is None:
+            key = settings.PAYSTACK_SECRET_KEY.encode()
+            signature = hmac.new(key, body, hashlib.sha512).hexdigest()
+        return APIClient().post(
+            "/api/payments/webhook",
+            body,
+            content_type="application/json",
+            HTTP_X_PAYSTACK_SIGNATURE=signature,
+        )
+
+    def assert_statuses(self, payment_status, order_status):
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, payment_status)
+        self.assertEqual(self.order.status, order_status)
+
+    def test_charge_success_confirms_payment_and_order(self):
+        self.assertEqual(self.deliver(CHARGE_SUCCESS).status_code, 200)
+        self.assert_statuses(Payment.Payment_Status.Successful, Order.Status.Successful)
+        self.assertTrue(self.payment.is_verified)
+        self.assertEqual(self.payment.payment_method, Payment.Payment_Method.Card)
+
+    def test_rejects_bad_signatures(self):
+        self.assertEqual(self.deliver(CHARGE_SUCCESS, "0" * 128).status_code, 401)
+        self.assert_statuses(Payment.Payment_Status.Initiated, Order.Status.Processing)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_redelivered_events_are_applied_once(self):
+        self.deliver(CHARGE_SUCCESS)
+        Order.objects.update(status=Order.Status.Delivered)
+        with mock.patch("core.payments.confirm_charge") as confirm:
+            self.assertEqual(self.deliver(CHARGE_SUCCESS).status_code, 200)
+        confirm.assert_not_called()
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        self.assert_statuses(Payment.Payment_Status.Successful, Order.Status.Delivered)
+
+    def test_amount_mismatch_is_recorded_but_not_applied(self):
+        event = {**CHARGE_SUCCESS, "data": {**CHARGE_SUCCESS["data"], "amount": 100}}
+        self.assertEqual(self.deliver(event).status_code, 200)
+        self.assert_statuses(Payment.Payment_Status.Initiated, Order.Status.Processing)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    @mock.patch("core.views.get_gateway")
+    def test_verify_reads_the_webhook_result(self, gateway):
+        verify = gateway.return_value.verify_transaction
+        self.deliver(CHARGE_SUCCESS)
+        response = self.client_for(self.user).get("/api/payments/verify/qTPrJoy9Bx")
+        self.assertEqual(response.json()["order_status"], Order.Status.Successful)
+        verify.assert_not_called()
+
+    @mock.patch("core.views.get_gateway")
+    def test_verify_falls_back_to_paystack_once_per_interval(self, gateway):
+        verify = gateway.return_value.verify_transaction
+        verify.return_value = {"status": True, "data": CHARGE_SUCCESS["data"]}
+        Payment.objects.update(amount=Decimal("1.00"))  # keeps it unconfirmed
+        client = self.client_for(self.user)
+        client.get("/api/payments/verify/qTPrJoy9Bx")
+        client.get("/api/payments/verify/qTPrJoy9Bx")
+        self.assertEqual(verify.call_count, 1)
+
+
+class PaymentOutboxFixtures(CatalogFixtures):
+    def place_order(self, user) -> Order:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.create(
+            cart=cart, product=self.make_product(current_price=Decimal("25.00"))
+        )
+        address = self.make_address(user)
+        response = self.client_for(user).post(f"/api/checkout/{address.id}")
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(id=response.json()["order"])
+
+
+class PaymentOutboxTests(PaymentOutboxFixtures, TestCase):
+    def payment_status(self, order):
+        return self.client_for(self.user).get(f"/api/orders/{order.id}/payment")
+
+    def test_worker_initializes_queued_payments(self):
+        order = self.place_order(self.user)
+        self.assertEqual(self.payment_status(order).status_code, 202)
+
+        gateway = FakePaystack()
+        self.assertEqual(drain(gateway), (1, 0))
+        self.assertEqual(drain(gateway), (0, 0))
+        self.assertEqual(
+            gateway.calls, [("user@example.com", 2500, order.outbox.reference)]
+        )
+
+        response = self.payment_status(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.json()["authorization_url"].endswith(order.outbox.reference)
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.Processing)
+        self.assertEqual(order.payments.payment_refrence, order.outbox.reference)
+
+    @override_settings(PAYMENT_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_deliveries_back_off_then_fail_and_can_be_requeued(self):
+        order = self.place_order(self.user)
+        gateway = FakePaystack(fail=2)
+        self.assertEqual(drain(gateway), (0, 1))
+        entry = PaymentOutbox.objects.get(order=order)
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.available_at, timezone.now())
+        self.assertEqual(entry.last_error, "Initialise Transaction Failed")
+
+        PaymentOutbox.objects.update(available_at=timezone.now())
+        self.assertEqual(drain(gateway), (0, 1))
+        self.assertEqual(self.payment_status(order).status_code, 502)
+
+        response = self.client_for(self.user).post(f"/api/orders/{order.id}/pay")
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.json()["reference"], entry.reference)
+        self.assertEqual(drain(gateway), (1, 0))
+        self.assertEqual(self.payment_status(order).status_code, 200)
+
+    @override_settings(PAYMENT_OUTBOX_MAX_ATTEMPTS=2)
+    def test_reference_accepted_before_a_timeout_is_replaced(self):
+        order = self.place_order(self.user)
+        reference = order.outbox.reference
+        server = serve_stub_paystack(self)
+        initialized = {
+            "status": True,
+            "message": "Authorization URL created",
+            "data": {
+                "authorization_url": "https://checkout.paystack.com/fresh",
+                "access_code": "fresh",
+                "reference": "fresh",
+            },
+        }
+        server.script = [
+            # Paystack accepts the first attempt, too slowly, nor can it verify
+            (200, initialized, 1),
+            (200, VERIFIED, 1),
+            # then refuses the retry, since it has the reference
+            (400, {"status": False, "message": "Duplicate Transaction Reference"}, 0),
+            (200, {"status": True, "data": {"status": "abandoned"}}, 0),
+            (200, initialized, 0),
+        ]
+        gateway = Paystack(
+            "http://127.0.0.1:%d" % server.server_port,
+            read_timeout=0.2,
+            retries=0,
+            breaker=CircuitBreaker(threshold=5, reset_timeout=60),
+        )
+        self.addCleanup(gateway.close)
+
+        self.assertEqual(drain(gateway), (0, 1))
+        PaymentOutbox.objects.update(available_at=timezone.now())
+        self.assertEqual(drain(gateway), (1, 0))
+
+        entry = PaymentOutbox.objects.get(order=order)
+        self.assertEqual((entry.status, entry.attempts), (entry.Status.Sent, 2))
+        self.assertEqual(entry.authorization_url, "https://checkout.paystack.com/fresh")
+        self.assertNotEqual(entry.reference, reference)
+        sent = [
+            (path.split("/")[2], body["reference"] if body else path.split("/")[3])
+            for _, path, _, body in server.received
+        ]
+        self.assertEqual(
+            sent,
+            [
+                ("initialize", reference),
+                ("verify", reference),
+                ("initialize", reference),
+                ("verify", reference),
+                ("initialize", entry.reference),
+            ],
+        )
+        self.assertEqual(self.payment_status(order).status_code, 200)
+
+    def test_failures_that_cannot_have_reached_paystack_skip_verify(self):
+        self.place_order(self.user)
+        server = serve_stub_paystack(self)
+        server.script = [(500, {"status": False, "message": "Oops"}, 0)] * 2
+        gateway = Paystack(
+            "http://127.0.0.1:%d" % server.server_port,
+            retries=0,
+            breaker=CircuitBreaker(threshold=2, reset_timeout=60),
+        )
+        self.addCleanup(gateway.close)
+
+        for _ in range(3):  # a 5xx twice, which opens the breaker, then nothing
+            self.assertEqual(drain(gateway), (0, 1))
+            PaymentOutbox.objects.update(available_at=timezone.now())
+        self.assertTrue(gateway.breaker.is_open)
+        self.assertEqual(
+            [path.split("/")[2] for _, path, _, _ in server.received],
+            ["initialize", "initialize"],
+        )
+        self.assertIn("unavailable", PaymentOutbox.objects.get().last_error)
+
+    def test_fake_gateway_refuses_a_known_reference(self):
+        order = self.place_order(self.user)
+        reference = order.outbox.reference
+        gateway = FakePaystack()
+        gateway.references.add(reference)
+        self.assertEqual(drain(gateway), (1, 0))
+        order.outbox.refresh_from_db()
+        self.assertNotEqual(order.outbox.reference, reference)
+        self.assertEqual(
+            [call[2] for call in gateway.calls], [reference, order.outbox.reference]
+        )
+
+
+class PaymentOutboxWorkerPoolTests(PaymentOutboxFixtures, TransactionTestCase):
+    def setUp(self):
+        if not serializes_writers():
+            self.skipTest("the database does not serialize concurrent writers")
+        super().setUp()
+
+    def test_pool_delivers_each_entry_once(self):
+        for i in range(6):
+            buyer = CustomUser.objects.create_user(
+                email=f"buyer{i}@example.com", password="Password@2"
+            )
+            self.place_order(buyer)
+        gateway = FakePaystack()
+        self.assertEqual(drain(gateway, workers=3, batch_size=4), (6, 0))
+        self.assertEqual(len(gateway.calls), 6)
+        self.assertEqual(Payment.objects.count(), 6)
+
+
+@task
+def flaky_job(payload):
+    raise RuntimeError(payload["reason"])
+
+
+@task(batch=True)
+def short_batch_job(payloads):
+    return [None] * (len(payloads) - 1)
+
+
+class JobQueueTests(TestCase):
+    queues = ["default", "email"]
+
+    def test_emails_are_sent_in_one_batch_over_one_connection(self):
+        for i in range(3):
+            emails.queue_email(f"user{i}@example.com", "Hello", "Hi there")
+        self.assertEqual(mail.outbox, [])
+
+        with mock.patch.object(
+            emails, "get_connection", wraps=emails.get_connection
+        ) as get_connection:
+            self.assertEqual(run_once(self.queues, batch_size=10), 3)
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Job.objects.exists())
+
+    def test_registration_queues_the_welcome_email(self):
+        response = APIClient().post(
+            "/api/auth/register",
+            {
+                "email": "new@example.com",
+                "password": "Password@2",
+                "confirm_password": "Password@2",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        run_once(self.queues, batch_size=10)
+        self.assertEqual(mail.outbox[0].to, ["new@example.com"])
+        self.assertEqual(mail.outbox[0].alternatives[0].mimetype, "text/html")
+
+    def test_delayed_jobs_wait(self):
+        emails.queue_email("user@example.com", "Later", "Later", delay=60)
+        self.assertEqual(run_once(self.queues, batch_size=10), 0)
+
+    @override_settings(JOBS_BACKOFF=30)
+    def test_failures_back_off_then_dead_letter(self):
+        job = enqueue(flaky_job, {"reason": "smtp down"}, max_attempts=2)
+        run_once(self.queues, batch_size=10)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.Queued, 1))
+        self.assertIn("smtp down", job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(run_once(self.queues, batch_size=10), 0)
+
+        Job.objects.update(run_at=timezone.now())
+        run_once(self.queues, batch_size=10)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.Dead, 2))
+        self.assertEqual(run_once(self.queues, batch_size=10), 0)
+
+    def test_batch_returning_too_few_results_fails_every_job(self):
+        for i in range(3):
+            enqueue(short_batch_job, {"n": i})
+        self.assertEqual(run_once(self.queues, batch_size=10), 3)
+        self.assertEqual(
+            list(Job.objects.values_list("status", flat=True)), [Job.Status.Queued] * 3
+        )
+        for error in Job.objects.values_list("last_error", flat=True):
+            self.assertIn("returned 2 results for 3 jobs", error)
+
+
+def png_upload(width: int, height: int, name: str = "photo.png") -> SimpleUploadedFile:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "teal").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageVariantTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.vendor_client = self.client_for(self.vendor.user)
+
+    def upload(self, product=None, **files):
+        if product is None:
+            return self.vendor_client.post(
+                "/api/products",
+                {
+                    "name": "Lamp",
+                    "description": "A lamp",
+                    "stock": 3,
+                    "current_price": "50.00",
+                    "thumbnail": files.get("thumbnail") or png_upload(1300, 650),
+                },
+                format="multipart",
+            )
+        return self.vendor_client.patch(
+            f"/api/products/update/{product}", files, format="multipart"
+        )
+
+    def details(self, product_id):
+        return self.client.get(f"/api/products/details/{product_id}").json()
+
+    def test_upload_is_stored_as_is_and_variants_follow(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        product = response.json()
+        self.assertIsNone(product["thumbnail_srcset"])
+        self.assertTrue(product["thumbnail"].endswith(".png"))
+        self.assertEqual(Job.objects.get().queue, "images")
+
+        self.assertEqual(run_once(["images"], batch_size=10), 1)
+        srcset = self.details(product["id"])["thumbnail_srcset"]
+        self.assertEqual(set(srcset), {"avif", "webp", "jpeg"})
+        widths = [entry.rsplit(" ", 1)[1] for entry in srcset["webp"].split(", ")]
+        self.assertEqual(widths, ["150w", "300w", "600w", "1200w"])
+        self.assertIn("/media/products/variants/photo-600.avif", srcset["avif"])
+
+    @override_settings(IMAGE_WORKERS=0)
+    def test_replaced_upload_serves_the_original_until_rebuilt(self):
+        product_id = self.upload().json()["id"]
+        run_once(["images"], batch_size=10)
+        self.upload(product_id, thumbnail=png_upload(200, 100, "small.png"))
+        self.assertIsNone(self.details(product_id)["thumbnail_srcset"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_once(["images"], batch_size=10)
+        srcset = self.details(product_id)["thumbnail_srcset"]
+        self.assertEqual(srcset["jpeg"].rsplit(" ", 1)[1], "150w")
+
+    def test_uploads_are_bounded_on_arrival(self):
+        product_id = self.upload().json()["id"]
+        response = self.upload(product_id, thumbnail=png_upload(3000, 1500, "big.png"))
+        self.assertEqual(response.status_code, 200)
+        product = Product.objects.get(id=product_id)
+        with Image.open(product.thumbnail) as image:
+            self.assertEqual((image.format, image.size), ("PNG", (1920, 960)))
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (20, 20)).save(buffer, format="BMP")
+        bmp = SimpleUploadedFile("photo.png", buffer.getvalue(), "image/png")
+        response = self.upload(thumbnail=bmp)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only GIF, JPEG, PNG, WEBP", response.json()["thumbnail"][0])
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=100 * 100):
+            response = self.upload(thumbnail=png_upload(200, 100))
+        self.assertEqual(response.status_code, 400)
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (700, 700), os.urandom(700 * 700 * 3)).save(
+            buffer, format="PNG"
+        )
+        noise = SimpleUploadedFile("noise.png", buffer.getvalue(), "image/png")
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=1024 * 1024):
+            response = self.upload(thumbnail=noise)
+        self.assertEqual(
+            response.json(), {"thumbnail": ["Image size cannot exceed 1MB"]}
+        )
+
+        response = self.client_for(self.user).post(
+            "/api/vendors",
+            {
+                "brand_name": "Lamps",
+                "brand_email": "lamps@example.com",
+                "avatar": png_upload(2500, 2500, "logo.png"),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201)
+        with Image.open(Vendor.objects.get(brand_name="Lamps").avatar) as image:
+            self.assertEqual(image.size, (1920, 1920))
+
+
+class SeedCommandTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def seed(self, **options):
+        options = {"users": 4, "vendors": 2, "products": 30, "orders": 12} | options
+        call_command("seed", images=3, chunk_size=7, stdout=io.StringIO(), **options)
+
+    def test_seed_is_deterministic_and_idempotent(self):
+        self.seed()
+        self.assertEqual(CustomUser.objects.count(), 6)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 12)
+        for order in Order.objects.all():
+            self.assertEqual(order.amount, order.total_amount())
+        names = dict(Product.objects.values_list("id", "name"))
+
+        self.seed(products=40, orders=20, idempotent=True)
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(
+            Payment.objects.count(),
+            Order.objects.filter(status__in=["Successful", "Delivered"]).count(),
+        )
+        seeded = Product.objects.filter(id__in=names).values_list("id", "name")
+        self.assertEqual(dict(seeded), names)
+
+    def test_products_need_a_vendor(self):
+        stdout = io.StringIO()
+        call_command("seed", vendors=0, products=5, images=0, stdout=stdout)
+        self.assertIn("Products need at least one vendor", stdout.getvalue())
+        self.assertFalse(CustomUser.objects.exists())
+
+        self.seed(vendors=0, products=0, orders=0)
+        self.assertEqual(CustomUser.objects.count(), 4)
+
+    def test_seeded_products_show_in_cached_listings(self):
+        self.assertEqual(self.client.get("/api/products/all").json()["results"], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seed(products=3, orders=0)
+        listing = self.client.get("/api/products/all").json()["results"]
+        self.assertEqual(len(listing), 3)
+
+    def test_paid_orders_are_counted_in_sales(self):
+        self.seed()
+        self.seed(orders=20, idempotent=True)
+        paid = Order.objects.filter(status__in=["Successful", "Delivered"])
+        revenue = sum(order.amount for order in paid)
+        self.assertGreater(revenue, 0)
+        self.assertFalse(Payment.objects.filter(sales_recorded=False).exists())
+        self.assertEqual(
+            sum(Vendor.objects.values_list("total_sales_ever", flat=True)), revenue
+        )
+        self.assertEqual(
+            sum(VendorDailySales.objects.values_list("revenue", flat=True)), revenue
+        )
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def results(self, p95, rps, queries, errors=0) -> dict:
+        stats = {
+            "latency_ms": {"p95": p95},
+            "throughput_rps": rps,
+            "queries_per_request": queries,
+            "errors": errors,
+        }
+        return {"results": {"client": {"carts": stats}}}
+
+    def test_compare_flags_slower_and_chattier_endpoints(self):
+        baseline = self.results(p95=10.0, rps=100.0, queries=5.0)
+        self.assertEqual(
+            benchmark.compare(baseline, self.results(10.9, 91.0, 5.5), 0.1), []
+        )
+        regressions = benchmark.compare(baseline, self.results(12.0, 80.0, 6.0), 0.1)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[0].startswith("client carts: p95"))
+
+    def test_command_reports_and_fails_on_regression(self):
+        output = f"{settings.MEDIA_ROOT}/bench.json"
+        call_command(
+            "benchmark",
+            products=20,
+            users=2,
+            requests=4,
+            warmup=1,
+            endpoints=["products/details", "checkout"],
+            output=output,
+            stderr=io.StringIO(),
+        )
+        with open(output) as f:
+            report = json.load(f)
+        checkout = report["results"]["client"]["checkout"]
+        self.assertEqual((checkout["requests"], checkout["errors"]), (4, 0))
+        self.assertGreater(checkout["queries_per_request"], 1)
+
+        baseline = f"{settings.MEDIA_ROOT}/baseline.json"
+        checkout["queries_per_request"] = 1
+        with open(baseline, "w") as f:
+            json.dump(report, f)
+        with self.assertRaisesMessage(CommandError, "client checkout: queries"):
+            call_command("benchmark", compare=[baseline, output])
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1.0, QUERY_BUDGET_RAISE=True)
+class ServerTimingTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        cart = Cart.objects.create(user=self.user)
+        for i in range(8):
+            CartItem.objects.create(cart=cart, product=self.make_product(name=f"P{i}"))
+
+    def timings(self, response) -> dict:
+        entries = [entry.split(";") for entry in response["Server-Timing"].split(", ")]
+        return {entry[0]: entry[1:] for entry in entries}
+
+    def test_hot_views_report_timings_within_their_query_budget(self):
+        product = Product.objects.first()
+        for path, api in [
+            ("/api/products/all", self.client),
+            (f"/api/products/details/{product.id}", self.client),
+            ("/api/carts", self.client_for(self.user)),
+        ]:
+            response = api.get(path)
+            self.assertEqual(response.status_code, 200)
+            timings = self.timings(response)
+            self.assertRegex(timings["db"][1], r'^desc="\d+ queries"$')
+            self.assertIn("serialize", timings)
+            self.assertIn("total", timings)
+
+    def test_exceeding_the_budget_raises(self):
+        with mock.patch.object(views.cart_items, "query_budget", 2):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "more than 2 queries"):
+                self.client_for(self.user).get("/api/carts")
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_verbose_timings_are_for_staff_only(self):
+        staff = CustomUser.objects.create_user(
+            email="staff@example.com", password="Password@2", is_staff=True
+        )
+        response = self.client_for(self.user).get(
+            "/api/carts", HTTP_X_SERVER_TIMING="verbose"
+        )
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        response = self.client_for(staff).get(
+            "/api/carts", HTTP_X_SERVER_TIMING="verbose"
+        )
+        self.assertIn("sql1", self.timings(response))
+
+
+class MetricsTests(CatalogTestCase):
+    def test_requests_and_queues_are_exported(self):
+        labels = {"view": "list_products", "method": "GET", "status": "200"}
+        before = sample("http_request_duration_seconds_count", **labels)
+        self.client.get("/api/products/all")
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels), before + 1
+        )
+        enqueue(emails.deliver_emails, {}, queue="email")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_bucket{le="0.005",method="GET"', body
+        )
+        self.assertIn('db_queries_total{view="list_products"}', body)
+        self.assertIn('job_queue_depth{queue="email",status="Queued"} 1.0', body)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_guards_the_endpoint(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+
+class CachedUserTests(CatalogTestCase):
+    def user_queries(self, api) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(api.get("/api/auth/user").status_code, 200)
+        return sum("custom_users" in query["sql"] for query in queries)
+
+    def test_authenticated_requests_reuse_the_cached_user(self):
+        api = self.client_for(self.user)
+        self.assertEqual(self.user_queries(api), 1)
+        self.assertEqual(self.user_queries(api), 0)
+
+        header = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        header.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(self.user_queries(header), 0)
+
+    def test_only_auth_fields_are_cached(self):
+        self.user_queries(self.client_for(self.user))
+        key = f"user:{self.user.id}:v{cache.get(f'user:{self.user.id}:version')}"
+        self.assertEqual(set(cache.get(key)), set(USER_FIELDS))
+        self.assertNotIn(self.user.password, repr(cache.get(key)))
+
+        user = cached_user(self.user.id, lambda: None)
+        self.assertEqual((user.email, user.is_vendor), ("user@example.com", False))
+        with self.assertNumQueries(1):  # deferred, loaded on demand
+            self.assertTrue(user.check_password("Password@2"))
+
+    def test_becoming_a_vendor_refreshes_the_cached_user(self):
+        api = self.client_for(self.user)
+        self.user_queries(api)
+        brand = {"brand_name": "Ada Wares", "brand_email": "wares@example.com"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(api.post("/api/vendors", brand).status_code, 201)
+        self.assertTrue(CustomUser.objects.get(id=self.user.id).is_vendor)
+
+        self.assertEqual(self.user_queries(api), 1)
+        response = api.post("/api/vendors", brand)
+        self.assertEqual(response.status_code, 403)
+
+
+class RefreshTokenBlacklistTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        tokens.revoked.cache_clear()
+        self.addCleanup(tokens.revoked.cache_clear)
+
+    def refresh(self) -> tuple[int, int]:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/auth/refresh")
+        lookups = sum("blacklistedtoken" in query["sql"] for query in queries)
+        return response.status_code, lookups
+
+    def test_refresh_checks_the_filter_and_logout_revokes(self):
+        credentials = {"email": "user@example.com", "password": "Password@2"}
+        self.assertEqual(
+            self.client.post("/api/auth/login", credentials).status_code, 200
+        )
+        self.assertEqual(self.refresh(), (201, 1))  # loads the filter
+        self.assertEqual(self.refresh(), (201, 0))
+
+        refresh_token = self.client.cookies["refresh_token"].value
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/auth/logout")
+        self.client.cookies["refresh_token"] = refresh_token  # replayed
+        # the bumped version triggers a top-up, then the hit is confirmed
+        self.assertEqual(self.refresh(), (401, 2))
+
+    def test_purge_deletes_expired_tokens_only(self):
+        now = timezone.now()
+        for i, expires_at in enumerate(
+            [now - timedelta(days=1)] * 3 + [now + timedelta(days=1)]
+        ):
+            token = OutstandingToken.objects.create(
+                jti=f"jti-{i}", token="t", expires_at=expires_at
+            )
+            BlacklistedToken.objects.create(token=token)
+        call_command("purge_expired_tokens", chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)), ["jti-3"]
+        )
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class ThrottlingTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # the start of a minute, so no test straddles two windows
+        clock = mock.patch("core.throttling.time")
+        clock.start().time.return_value = 1_800_000_000.0
+        self.addCleanup(clock.stop)
+
+    def login(self, email: str, address: str) -> int:
+        credentials = {"email": email, "password": "wrong"}
+        response = self.client.post("/api/auth/login", credentials, REMOTE_ADDR=address)
+        return response.status_code
+
+    def test_login_is_limited_per_email_and_per_address(self):
+        statuses = [self.login("User@Example.com ", f"10.0.0.{i}") for i in range(6)]
+        self.assertEqual(statuses, [400] * 5 + [429])
+        self.assertEqual(self.login("other@example.com", "10.0.1.1"), 400)
+
+        statuses = [self.login(f"u{i}@example.com", "10.0.2.1") for i in range(21)]
+        self.assertEqual(statuses[-2:], [400, 429])
+
+    def test_cart_writes_are_limited_per_user_with_retry_after(self):
+        product = self.make_product()
+        rates = {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], "cart": "2/min"}
+        api = self.client_for(self.user)
+        with override_settings(
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK,
+                "DEFAULT_THROTTLE_RATES": rates,
+            }
+        ):
+            responses = [
+                api.post(f"/api/cart/add/{product.id}", {"quantity": 1}, format="json")
+                for _ in range(3)
+            ]
+            self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+            self.assertEqual(responses[2]["Retry-After"], "60")
+
+            # the batch endpoint draws on the same budget
+            batch = {"items": [{"product_id": str(product.id), "quantity": 1}]}
+            response = api.post("/api/carts/batch", batch, format="json")
+            self.assertEqual(response.status_code, 429)
+
+            other = self.client_for(CustomUser.objects.get(email="vendor@example.com"))
+            self.assertEqual(other.post(f"/api/cart/add/{product.id}").status_code, 200)
+            responses = [
+                other.post("/api/carts/batch", batch, format="json") for _ in range(2)
+            ]
+            self.assertEqual([r.status_code for r in responses], [200, 429])
+
+            with override_settings(THROTTLING=False):
+                self.assertEqual(
+                    api.post(f"/api/cart/add/{product.id}").status_code, 200
+                )
+
+    def test_throttle_overhead_is_a_few_cache_operations(self):
+        with mock.patch("core.throttling.cache", wraps=cache) as shared:
+            self.login("user@example.com", "10.0.0.1")
+            # per throttle: incr misses, add, then read the previous window
+            self.assertEqual(len(shared.method_calls), 6)
+            shared.reset_mock()
+            self.login("user@example.com", "10.0.0.1")
+            self.assertEqual(
+                [name for name, _, _ in shared.method_calls], ["incr", "get"] * 2
+            )
+
+        for endpoint, stats in benchmark.run_throttles(200).items():
+            self.assertEqual(stats["errors"], 0, endpoint)
+
+
+class OrderHistoryTests(CatalogTestCase):
+    def make_order(self, lines: int) -> Order:
+        order = Order.objects.create(
+            user=self.user,
+            shipping_address=self.make_address(self.user),
+            amount=Decimal("0.00"),
+        )
+        items = [
+            OrderItem.objects.create(
+                product=self.make_product(name=f"Line {i}"),
+                quantity=2,
+                price_per_item=Decimal("100.00"),
+            )
+            for i in range(lines)
+        ]
+        order.order_items.add(*items)
+        return order
+
+    def queries(self, api: APIClient, path: str) -> tuple[dict, int]:
+        with CaptureQueriesContext(connection) as queries:
+            response = api.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_is_flat_in_orders_and_lines(self):
+        api = self.client_for(self.user)
+        api.get("/api/orders")  # caches the user
+        self.make_order(lines=1)
+        _, few = self.queries(api, "/api/orders")
+        for _ in range(5):
+            self.make_order(lines=4)
+        body, many = self.queries(api, "/api/orders")
+        self.assertEqual(few, many)
+        self.assertEqual(len(body["results"]), 6)
+        self.assertEqual(body["results"][0]["total_amount"], "800.00")
+
+        order = self.make_order(lines=3)
+        body, count = self.queries(api, f"/api/orders/{order.id}")
+        self.assertLessEqual(count, 2)
+        self.assertEqual(len(body["order_items"]), 3)
+        self.assertEqual(body["shipping_address_details"]["state"], "Lagos")
+
+    def test_pages_follow_the_cursor_and_hide_other_users(self):
+        orders = [self.make_order(lines=1) for _ in range(3)]
+        api = self.client_for(self.user)
+        first = api.get("/api/orders?page_size=2").json()
+        second = api.get(first["next"]).json()
+        ids = [order["id"] for order in first["results"] + second["results"]]
+        self.assertEqual(ids, [str(order.id) for order in reversed(orders)])
+        self.assertIsNone(second["next"])
+
+        other = self.client_for(CustomUser.objects.get(email="vendor@example.com"))
+        self.assertEqual(other.get("/api/orders").json()["results"], [])
+        self.assertEqual(other.get(f"/api/orders/{orders[0].id}").status_code, 404)
+
+    def test_lines_of_deleted_products_still_render(self):
+        order = self.make_order(lines=1)
+        order.order_items.get().product.delete()
+        body = self.client_for(self.user).get(f"/api/orders/{order.id}").json()
+        self.assertIsNone(body["order_items"][0]["product_name"])
+
+
+class SalesRollupTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shirt = self.make_product(name="Shirt")
+        self.cap = self.make_product(name="Cap")
+
+    def paid_order(self, reference: str, status=Payment.Payment_Status.Initiated):
+        order = Order.objects.create(user=self.user, amount=Decimal("12500.50"))
+        order.order_items.add(
+            OrderItem.objects.create(
+                product=self.shirt, quantity=2, price_per_item=Decimal("5000.25")
+            ),
+            OrderItem.objects.create(
+                product=self.cap, quantity=1, price_per_item=Decimal("2500.00")
+            ),
+        )
+        return Payment.objects.create(
+            order=order,
+            user=self.user,
+            amount=Decimal("12500.50"),
+            payment_refrence=reference,
+            payment_status=status,
+        )
+
+    def assert_rollups(self, orders: int):
+        day = VendorDailySales.objects.get(vendor=self.vendor)
+        self.assertEqual(
+            (day.orders, day.units, day.revenue),
+            (orders, 3 * orders, Decimal("12500.50") * orders),
+        )
+        shirt = ProductDailySales.objects.get(product=self.shirt)
+        self.assertEqual(
+            (shirt.units, shirt.revenue), (2 * orders, Decimal("10000.50") * orders)
+        )
+        self.vendor.refresh_from_db()
+        self.assertEqual(self.vendor.total_sales_ever, Decimal("12500.50") * orders)
+
+    def test_recorded_sales_refresh_cached_products(self):
+        url = f"/api/products/details/{self.shirt.id}"
+        self.assertEqual(
+            self.client.get(url).json()["vendor"]["total_sales_ever"], "0.00"
+        )
+        self.paid_order("ref-1", status=Payment.Payment_Status.Successful)
+        with self.captureOnCommitCallbacks(execute=True):
+            sales.record_sales(Payment.objects.all())
+        vendor = self.client.get(url).json()["vendor"]
+        self.assertEqual(vendor["total_sales_ever"], "12500.50")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sales.reset()
+        self.assertEqual(
+            self.client.get(url).json()["vendor"]["total_sales_ever"], "0.00"
+        )
+
+    def test_confirmed_charge_is_counted_once(self):
+        payment = self.paid_order(CHARGE_SUCCESS["data"]["reference"])
+        self.assertTrue(payments.confirm_charge(CHARGE_SUCCESS["data"]))
+        self.assertFalse(payments.confirm_charge(CHARGE_SUCCESS["data"]))
+        self.assertEqual(sales.record_sales(Payment.objects.all()), 0)
+        self.assert_rollups(orders=1)
+        self.assertEqual(
+            VendorDailySales.objects.get().day,
+            Payment.objects.get(id=payment.id).updated_at.date(),
+        )
+
+    def test_backfill_counts_history_in_chunks(self):
+        for i in range(3):
+            self.paid_order(f"ref-{i}", status=Payment.Payment_Status.Successful)
+        self.paid_order("ref-unpaid")
+        call_command("backfill_sales", chunk_size=2, stdout=io.StringIO())
+        call_command("backfill_sales", stdout=io.StringIO())
+        self.assert_rollups(orders=3)
+
+        call_command("backfill_sales", rebuild=True, stdout=io.StringIO())
+        self.assert_rollups(orders=3)
+
+    def test_dashboard_reads_the_rollups(self):
+        self.paid_order("ref-0", status=Payment.Payment_Status.Successful)
+        sales.backfill()
+        api = self.client_for(self.vendor.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = api.get("/api/vendors/sales")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("order_items" in q["sql"] for q in queries))
+        body = response.json()
+        self.assertEqual(
+            body["totals"], {"orders": 1, "units": 3, "revenue": "12500.50"}
+        )
+        self.assertEqual(
+            [(p["name"], p["revenue"]) for p in body["top_products"]],
+            [("Shirt", "10000.50"), ("Cap", "2500.00")],
+        )
+
+        self.assertEqual(
+            api.get("/api/vendors/sales?start=2020-01-01").status_code, 400
+        )
+        self.assertEqual(
+            self.client_for(self.user).get("/api/vendors/sales").status_code, 403
+        )
+
+
+class ImageServer(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hosts.append(self.headers["Host"])
+        data = png_upload(40, 20).read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ProductImportTests(CatalogTestCase):
+    CSV = (
+        "name,description,current_price,stock,image_url\n"
+        "Kettle,Boils water,4500.00,12,https://cdn.example.com/kettle.png\n"
+        "Toaster,Two slots,abc,3,https://cdn.example.com/toaster.png\n"
+        '"Blender","Six speeds, glass jar",12000,5,https://cdn.example.com/b.png\n'
+        "Iron,,900,0,ftp://cdn.example.com/iron.png\n"
+        "Fan,Quiet,15000.5,7,https://cdn.example.com/fan.png\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    @override_settings(IMPORT_CHUNK_SIZE=2)
+    def test_upload_creates_valid_rows_and_reports_the_rest(self):
+        upload = SimpleUploadedFile("catalog.csv", self.CSV.encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.vendor.user).post(
+                "/api/products/import", {"file": upload}, format="multipart"
+            )
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report["created"], report["failed"]), (3, 2))
+        self.assertEqual([e["line"] for e in report["errors"]], [3, 5])
+        self.assertEqual(
+            set(report["errors"][1]["errors"]), {"description", "stock", "image_url"}
+        )
+
+        blender = Product.objects.get(name="Blender")
+        self.assertEqual(blender.description, "Six speeds, glass jar")
+        self.assertEqual((blender.vendor, blender.thumbnail.name), (self.vendor, ""))
+        self.assertEqual(
+            Job.objects.filter(
+                queue="images", task__endswith="fetch_thumbnails"
+            ).count(),
+            3,
+        )
+        results = self.client.get("/api/products/search?q=blender").json()["results"]
+        self.assertEqual([p["name"] for p in results], ["Blender"])
+
+        response = self.client_for(self.user).post("/api/products/import")
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_reads_jsonl(self):
+        path = f"{settings.MEDIA_ROOT}/catalog.jsonl"
+        with open(path, "w") as f:
+            f.write(
+                '{"name": "Mug", "description": "Ceramic", "current_price": 1500,'
+                ' "stock": 40, "image_url": "https://cdn.example.com/mug.png"}\n'
+                "\n"
+                "{not json\n"
+                '["a list"]\n'
+            )
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            "import_products",
+            path,
+            vendor="brand@example.com",
+            stdout=stdout,
+            stderr=stderr,
+        )
+        self.assertIn("Created 1 products, 2 rows failed", stdout.getvalue())
+        self.assertIn("line 3:", stderr.getvalue())
+        self.assertEqual(Product.objects.get(name="Mug").current_price, Decimal("1500"))
+
+    def serve_images(self) -> ThreadingHTTPServer:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ImageServer)
+        server.hosts = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_fetch_job_stores_the_image_from_public_hosts_only(self):
+        server = self.serve_images()
+        url = f"http://127.0.0.1:{server.server_port}/lamp.png"
+        row = f"name,description,current_price,stock,image_url\nLamp,Desk lamp,50,3,{url}\n"
+        vendor = Vendor.objects.get()
+        imports.import_products(vendor, io.BytesIO(row.encode()), "csv")
+        lamp = Product.objects.get(name="Lamp")
+
+        run_once(["images"], 10)
+        job = Job.objects.get(task__endswith="fetch_thumbnails")
+        self.assertIn("not a public address", job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        with override_settings(IMPORT_IMAGE_ALLOW_PRIVATE=True):
+            run_once(["images"], 10)
+        lamp.refresh_from_db()
+        self.assertEqual(lamp.thumbnail.name, f"products/{lamp.id}.png")
+        self.assertTrue(Job.objects.filter(task__endswith="build_variants").exists())
+
+    def test_download_connects_to_the_address_it_checked(self):
+        server = self.serve_images()
+        lookup = socket.getaddrinfo
+        lookups = []
+
+        def rebinding(host, port, *args, **kwargs):
+            lookups.append(host)
+            if host == "images.example.com":
+                # vetted on the first lookup, internal on any later one
+                host = "127.0.0.1" if lookups.count(host) == 1 else "10.0.0.1"
+            return lookup(host, port, *args, **kwargs)
+
+        url = f"http://images.example.com:{server.server_port}/lamp.png"
+        with (
+            mock.patch("socket.getaddrinfo", side_effect=rebinding),
+            override_settings(IMPORT_IMAGE_ALLOW_PRIVATE=True),
+            httpx.Client(timeout=5) as client,
+        ):
+            data = images._download(client, url)
+        self.assertEqual(data[:8], b"\x89PNG\r\n\x1a\n")
+        self.assertEqual(lookups.count("images.example.com"), 1)
+        self.assertEqual(server.hosts, [f"images.example.com:{server.server_port}"])
+
+        public = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", 80))]
+        private = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", 80))]
+        with (
+            mock.patch("socket.getaddrinfo", return_value=public + private),
+            httpx.Client(timeout=5) as client,
+            self.assertRaisesMessage(ValueError, "not a public address"),
+        ):
+            images._download(client, "http://images.example.com/lamp.png")
+        self.assertEqual(len(server.hosts), 1)
+
+
+@override_settings(CATALOG_FEED_TOKEN="feed-secret")
+class CatalogExportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.kettle = self.make_product(
+            name="Kettle & <Jug>\x0b", description='Says "hi"\nBoils', stock=0
+        )
+        self.lamp = self.make_product(name="Lamp", thumbnail="")
+
+    def download(self, fmt: str) -> bytes:
+        response = self.client.get(
+            f"/api/products/export.{fmt}", HTTP_AUTHORIZATION="Bearer feed-secret"
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+        return b"".join(response.streaming_content)
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(io.StringIO(self.download("csv").decode())))
+        by_id = {row["id"]: row for row in rows}
+        kettle = by_id[str(self.kettle.id)]
+        self.assertEqual(kettle["description"], 'Says "hi"\nBoils')
+        self.assertEqual(kettle["price"], "100.00")
+        self.assertEqual(kettle["brand"], "Brand")
+        self.assertEqual(
+            kettle["image_link"], "http://testserver/media/products/placeholder.webp"
+        )
+        self.assertEqual(by_id[str(self.lamp.id)]["image_link"], "")
+
+    def test_merchant_xml_feed(self):
+        ns = {"g": "http://base.google.com/ns/1.0"}
+        channel = ElementTree.fromstring(self.download("xml")).find("channel")
+        items = {item.find("g:id", ns).text: item for item in channel.iter("item")}
+        kettle = items[str(self.kettle.id)]
+        self.assertEqual(kettle.find("title").text, "Kettle & <Jug>")
+        self.assertEqual(kettle.find("g:price", ns).text, "100.00 NGN")
+        self.assertEqual(kettle.find("g:availability", ns).text, "out_of_stock")
+        self.assertTrue(kettle.find("link").text.endswith(f"/product/{self.kettle.id}"))
+        self.assertIsNone(items[str(self.lamp.id)].find("g:image_link", ns))
+
+    def test_feed_needs_the_token(self):
+        url = "/api/products/export.csv"
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.download("csv").count(b"/product/"), 2)
+        with override_settings(CATALOG_FEED_TOKEN=""):
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer ")
+            self.assertEqual(response.status_code, 404)
+
+    def test_command_writes_the_feed(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        output = f"{media.name}/feed.xml"
+        stdout = io.StringIO()
+        call_command("export_catalog", output, chunk_size=1, stdout=stdout)
+        self.assertIn("Exported 2 products", stdout.getvalue())
+        self.assertIn("rows/s", stdout.getvalue())
+        with open(output) as f:
+            self.assertEqual(
+                len(ElementTree.parse(f).getroot().findall("channel/item")), 2
+            )
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [self.make_product(name=f"P{i}") for i in range(7)]
+        # three share one created_at, two another: ties are broken by id
+        now = timezone.now()
+        Product.objects.filter(id__in=[p.id for p in self.products[:3]]).update(
+            created_at=now
+        )
+        Product.objects.filter(id__in=[p.id for p in self.products[3:5]]).update(
+            created_at=now - timedelta(hours=1)
+        )
+        self.expected = list(
+            Product.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.expected = [str(pk) for pk in self.expected]
+
+    def walk(self, url: str, link: str) -> list[list[str]]:
+        pages = []
+        while url:
+            body = self.client.get(url).json()
+            pages.append([product["id"] for product in body["results"]])
+            url = body[link]
+        return pages
+
+    def test_walks_forward_and_back_without_gaps_or_duplicates(self):
+        forward = self.walk("/api/products/all?page_size=3", "next")
+        self.assertEqual([len(page) for page in forward], [3, 3, 1])
+        self.assertEqual(sum(forward, []), self.expected)
+
+        body = self.client.get("/api/products/all?page_size=3").json()
+        last = self.client.get(self.client.get(body["next"]).json()["next"]).json()
+        backward = self.walk(last["previous"], "previous")
+        self.assertEqual(sum(reversed(backward), []), self.expected[:6])
+
+    @override_settings(CATALOG_MAX_PAGE_SIZE=4)
+    def test_page_size_is_capped(self):
+        body = self.client.get("/api/products/all?page_size=100").json()
+        self.assertEqual(len(body["results"]), 4)
+        self.assertIsNotNone(body["next"])
+
+    def test_tampered_cursor_is_rejected(self):
+        def encode(payload: dict) -> str:
+            raw = json.dumps(payload).encode()
+            return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+        ordering = "-created_at,-id"
+        for bad in [
+            "not-base64!",
+            encode(["a list"]),
+            encode({"o": ordering, "v": ["yesterday", "not-a-uuid"]}),
+            encode({"o": ordering, "v": [timezone.now().isoformat()]}),
+            encode({"o": "-id", "v": [str(self.products[0].id)]}),
+        ]:
+            response = self.client.get(f"/api/products/all?cursor={bad}")
+            self.assertEqual(response.status_code, 400, bad)
+            self.assertEqual(response.json(), {"detail": "Invalid cursor"})
+
+
+class ProductSearchTests(CatalogTestCase):
+    def names(self, query: str, limit: int = 10, offset: int = 0) -> list[str]:
+        ids = search_product_ids(query, limit, offset)
+        names = dict(Product.objects.filter(id__in=ids).values_list("id", "name"))
+        return [names[pk] for pk in ids]
+
+    def test_name_hits_rank_above_description_hits(self):
+        self.make_product(name="Glass jar", description="Fits any blender")
+        self.make_product(name="Blender", description="Six speeds")
+        self.make_product(name="Toaster", description="Two slots")
+        self.assertEqual(self.names("blender"), ["Blender", "Glass jar"])
+        # the last word is a prefix while typing
+        self.assertEqual(self.names("blen"), ["Blender", "Glass jar"])
+
+    def test_misspelt_query_falls_back_to_trigrams(self):
+        self.make_product(name="Blender")
+        self.make_product(name="Toaster")
+        self.assertEqual(self.names("blendr"), ["Blender"])
+        self.assertEqual(self.names("xyzzy"), [])
+
+    def test_trigram_fallback_is_paged(self):
+        for i in range(3):
+            self.make_product(name=f"Blender {i}")
+        self.assertEqual(len(self.names("blendr", 2)), 2)
+        self.assertEqual(len(self.names("blendr", 2, 2)), 1)
+        pages = [self.names("blendr", 1, offset) for offset in range(3)]
+        self.assertEqual(
+            sorted(sum(pages, [])), ["Blender 0", "Blender 1", "Blender 2"]
+        )
+        # past the last exact match there is no fallback
+        self.assertEqual(self.names("blender", 2, 4), [])
+
+        body = self.client.get("/api/products/search?q=blendr&page_size=2").json()
+        self.assertEqual(len(body["results"]), 2)
+        body = self.client.get(body["next"]).json()
+        self.assertEqual(len(body["results"]), 1)
+        self.assertIsNone(body["next"])
+
+    def test_triggers_follow_writes(self):
+        kettle = self.make_product(name="Kettle", description="Boils water")
+        self.assertEqual(self.names("kettle"), ["Kettle"])
+
+        kettle.name = "Percolator"
+        kettle.save()
+        self.assertEqual(self.names("kettle"), [])
+        self.assertEqual(self.names("percolator"), ["Percolator"])
+        self.assertEqual(self.names("boils"), ["Percolator"])
+
+        Product.objects.bulk_create(
+            [
+                Product(
+                    vendor=self.vendor,
+                    name="Kettle",
+                    description="",
+                    current_price=Decimal("20.00"),
+                    stock=1,
+                )
+            ]
+        )
+        self.assertEqual(self.names("kettle"), ["Kettle"])
+
+        Product.objects.all().delete()
+        self.assertEqual(self.names("kettle"), [])
+        self.assertEqual(self.names("percolatr"), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "Postgres full-text search")
+class PostgresSearchTests(CatalogTestCase):
+    def names(self, query: str, limit: int = 10, offset: int = 0) -> list[str]:
+        ids = search_product_ids(query, limit, offset)
+        names = dict(Product.objects.filter(id__in=ids).values_list("id", "name"))
+        return [names[pk] for pk in ids]
+
+    def test_stemmed_matches_rank_name_above_description(self):
+        self.make_product(name="Glass jar", description="Fits any blender")
+        self.make_product(name="Blender", description="Six speeds")
+        self.make_product(name="Toaster", description="Two slots")
+        self.assertEqual(self.names("blenders"), ["Blender", "Glass jar"])
+        # websearch syntax
+        self.assertEqual(self.names("blender -jar"), ["Blender"])
+
+    def test_misspelt_query_falls_back_to_trigrams(self):
+        self.make_product(name="Blender")
+        self.make_product(name="Toaster", description="Browns bread")
+        self.assertEqual(self.names("blendr"), ["Blender"])
+        self.assertEqual(self.names("xyzzy"), [])
+
+    def test_pages_are_disjoint_and_ordered(self):
+        for i in range(3):
+            self.make_product(name=f"Blender {i}")
+        pages = [self.names("blendr", 1, offset) for offset in range(3)]
+        self.assertEqual(
+            sorted(sum(pages, [])), ["Blender 0", "Blender 1", "Blender 2"]
+        )
+        self.assertEqual(sum(pages, []), self.names("blendr"))
+        self.assertEqual(len(self.names("blendr", 2, 2)), 1)
+
+
+class ProductFilterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Vendor.objects.create(
+            user=CustomUser.objects.create_user(
+                email="other@example.com", password="Password@2", is_vendor=True
+            ),
+            brand_email="other@brand.example.com",
+            brand_name="Other",
+        )
+        self.a = self.make_product(name="A", current_price=Decimal("1000"), stock=5)
+        self.b = self.make_product(name="B", current_price=Decimal("30000"), stock=0)
+        self.c = self.make_product(
+            name="C", current_price=Decimal("7000"), stock=3, is_on_flash_sales=True
+        )
+        self.d = self.make_product(name="D", current_price=Decimal("120000"), stock=1)
+        self.e = self.make_product(name="E", current_price=Decimal("7000"), stock=2)
+        Product.objects.filter(name__in="CDE").update(vendor=self.other)
+
+    def names(self, query: str) -> list[str]:
+        names, url = [], f"/api/products/all?page_size=2&{query}"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            names += [product["name"] for product in response.json()["results"]]
+            url = response.json()["next"]
+        return names
+
+    def test_sort_orderings(self):
+        self.assertEqual(set(ProductFilterSerializer.SORT_CHOICES), set(SORT_ORDERINGS))
+        self.assertEqual(self.names("sort=newest"), ["E", "D", "C", "B", "A"])
+        # equal prices are ordered by id, in the sort's direction
+        tied = [p.name for p in sorted([self.c, self.e], key=lambda p: p.id)]
+        self.assertEqual(self.names("sort=price_asc"), ["A", *tied, "B", "D"])
+        self.assertEqual(self.names("sort=price_desc"), ["D", "B", *tied[::-1], "A"])
+        self.assertEqual(
+            self.client.get("/api/products/all?sort=name").status_code, 400
+        )
+
+    def test_filters(self):
+        self.assertEqual(
+            self.names("sort=price_asc&min_price=5000&max_price=30000")[-1], "B"
+        )
+        self.assertEqual(
+            set(self.names("min_price=5000&max_price=30000")), {"B", "C", "E"}
+        )
+        self.assertEqual(self.names(f"vendor={self.vendor.id}"), ["B", "A"])
+        self.assertEqual(
+            len(self.names(f"vendor={self.vendor.id}&vendor={self.other.id}")), 5
+        )
+        self.assertEqual(self.names("in_stock=false"), ["B"])
+        self.assertEqual(self.names("in_stock=true"), ["E", "D", "C", "A"])
+        self.assertEqual(self.names("flash_sale=true"), ["C"])
+        self.assertEqual(
+            self.names("flash_sale=true&vendor=" + str(self.vendor.id)), []
+        )
+        response = self.client.get("/api/products/all?min_price=10&max_price=5")
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets_ignore_their_own_filter(self):
+        query = f"vendor={self.vendor.id}&min_price=5000&max_price=50000&facets=true"
+        body = self.client.get(f"/api/products/all?{query}").json()
+        self.assertEqual([p["name"] for p in body["results"]], ["B"])
+        # vendor counts apply the price filter but not the vendor one
+        self.assertEqual(
+            [(v["brand_name"], v["count"]) for v in body["facets"]["vendors"]],
+            [("Other", 2), ("Brand", 1)],
+        )
+        # price counts apply the vendor filter but not the price one
+        self.assertEqual(
+            [bucket["count"] for bucket in body["facets"]["price"]], [1, 0, 1, 0, 0, 0]
+        )
+        self.assertEqual(
+            body["facets"]["price"][-1], {"min": "500000", "max": None, "count": 0}
+        )
+
+        # every other filter narrows both facets
+        body = self.client.get(f"/api/products/all?{query}&in_stock=true").json()
+        self.assertEqual(body["results"], [])
+        self.assertEqual(
+            [(v["brand_name"], v["count"]) for v in body["facets"]["vendors"]],
+            [("Other", 2)],
+        )
+        self.assertEqual(
+            [bucket["count"] for bucket in body["facets"]["price"]], [1, 0, 0, 0, 0, 0]
+        )
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def test_reads_go_through_the_cache(self):
+        product = self.make_product(name="Kettle")
+        url = f"/api/products/details/{product.id}"
+        self.assertEqual(self.client.get(url).json()["name"], "Kettle")
+        self.client.get("/api/products/all")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()["name"], "Kettle")
+            self.assertEqual(
+                len(self.client.get("/api/products/all").json()["results"]), 1
+            )
+
+    def test_concurrent_misses_compute_once(self):
+        calls, barrier = [], threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        def read(results):
+            barrier.wait()
+            results.append(get_or_compute("single-flight", compute, 60))
+
+        results = []
+        threads = [threading.Thread(target=read, args=(results,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 8)
+
+    def test_product_writes_invalidate(self):
+        product = self.make_product(name="Kettle")
+        url = f"/api/products/details/{product.id}"
+        self.client.get(url)
+        self.client.get("/api/products/all")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Percolator"
+            product.save()
+        self.assertEqual(self.client.get(url).json()["name"], "Percolator")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            imports._insert(
+                self.vendor,
+                [
+                    {
+                        "name": "Toaster",
+                        "description": "Two slots",
+                        "current_price": Decimal("30.00"),
+                        "stock": 2,
+                        "image_url": "https://images.example.com/toaster.png",
+                    }
+                ],
+            )
+        names = [
+            p["name"] for p in self.client.get("/api/products/all").json()["results"]
+        ]
+        self.assertEqual(names, ["Toaster", "Percolator"])
+
+    def test_vendor_writes_invalidate_their_products(self):
+        product = self.make_product(name="Kettle")
+        for index in range(3):
+            self.make_product(name=f"Cup {index}")
+        url = f"/api/products/details/{product.id}"
+        self.assertEqual(self.client.get(url).json()["vendor"]["brand_name"], "Brand")
+        self.client.get("/api/products/all")
+
+        # one version bump, not one per product
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            self.vendor.brand_name = "Renamed"
+            self.vendor.save()
+        self.assertEqual(self.client.get(url).json()["vendor"]["brand_name"], "Renamed")
+        listing = self.client.get("/api/products/all").json()["results"]
+        self.assertEqual(
+            {product["vendor"]["brand_name"] for product in listing}, {"Renamed"}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get("/api/products/all").json()["results"], [])
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def test_product_details_answer_304(self):
+        product = self.make_product(name="Kettle")
+        url = f"/api/products/details/{product.id}"
+        response = self.client.get(url)
+        etag, modified = response["ETag"], response["Last-Modified"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b""))
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Percolator"
+            product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        etag = response["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.brand_name = "Renamed"
+            self.vendor.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["vendor"]["brand_name"], "Renamed")
+
+    def test_listing_etag_follows_writes(self):
+        self.make_product(name="Kettle")
+        etag = self.client.get("/api/products/all")["ETag"]
+        response = self.client.get("/api/products/all", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.brand_name = "Renamed"
+            self.vendor.save()
+        response = self.client.get("/api/products/all", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_validator_is_private(self):
+        product = self.make_product()
+        client = self.client_for(self.user)
+        response = client.get("/api/carts")
+        etag = response["ETag"]
+        self.assertIn("private", response["Cache-Control"])
+        self.assertEqual(
+            client.get("/api/carts", HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        other = CustomUser.objects.create_user(
+            email="other@example.com", password="Password@2"
+        )
+        response = self.client_for(other).get("/api/carts", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        client.post(f"/api/cart/add/{product.id}", {"quantity": 2}, format="json")
+        response = client.get("/api/carts", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_address_validators(self):
+        address = self.make_address(self.user)
+        client = self.client_for(self.user)
+        url = f"/api/address/{address.id}"
+        list_etag = client.get("/api/address")["ETag"]
+        etag = client.get(url)["ETag"]
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            client.get("/api/address", HTTP_IF_NONE_MATCH=list_etag).status_code, 304
+        )
+
+        address.lga = "Eti-Osa"
+        address.save()
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(
+            client.get("/api/address", HTTP_IF_NONE_MATCH=list_etag).status_code, 200
+        )
+        # someone else's address is not found, not validated
+        other = CustomUser.objects.create_user(
+            email="other@example.com", password="Password@2"
+        )
+        response = self.client_for(other).get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
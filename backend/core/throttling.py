@@ -0,0 +1,119 @@
+"""
+Rate limits for the endpoints worth abusing: login, registration and cart
+writes.
+
+DRF's SimpleRateThrottle keeps a list of request times per client and
+writes it back with cache.set, so concurrent requests served by different
+workers overwrite each other and the limit leaks. These throttles
+approximate a sliding window with two fixed-window counters instead. The
+current window is counted with cache.incr, which is atomic on every shared
+backend, and the previous window's count is weighted by how much of it the
+sliding window [now - duration, now] still covers. That is two or three
+cache operations per key and request. Rejected requests count too, so a
+client that keeps hammering stays limited until it slows down.
+
+Rates are DEFAULT_THROTTLE_RATES scopes ("5/min"); THROTTLING = False turns
+every throttle off (the benchmark does). With the default locmem cache each
+process limits on its own, so point CACHE_BACKEND at redis or memcached when
+running several workers.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    scope: str
+
+    def __init__(self):
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.retry_after: float | None = None
+
+    @staticmethod
+    def parse_rate(rate: str | None) -> tuple[int | None, int | None]:
+        if rate is None:
+            return None, None
+        num, period = rate.split("/")
+        return int(num), {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+
+    def idents(self, request: Request) -> list[str]:
+        """Who the request counts against; each is limited separately."""
+        raise NotImplementedError
+
+    def hit(self, key: str) -> int:
+        try:
+            return cache.incr(key)
+        except ValueError:  # first request of the window
+            if cache.add(key, 1, timeout=2 * self.duration):
+                return 1
+            return cache.incr(key)  # another worker added it first
+
+    def allow_request(self, request: Request, view) -> bool:
+        if self.rate is None or not settings.THROTTLING:
+            return True
+        window, into = divmod(time.time(), self.duration)
+        window = int(window)
+        for ident in self.idents(request):
+            key = f"throttle:{self.scope}:{ident}"
+            current = self.hit(f"{key}:{window}")
+            previous = cache.get(f"{key}:{window - 1}", 0)
+            if current + previous * (1 - into / self.duration) > self.num_requests:
+                spare = self.num_requests - current
+                if spare > 0:  # wait for the previous window to fade out
+                    self.retry_after = self.duration * (1 - spare / previous) - into
+                else:
+                    self.retry_after = self.duration - into
+                return False
+        return True
+
+    def wait(self) -> float | None:
+        return self.retry_after
+
+
+class IPThrottle(SlidingWindowThrottle):
+    def idents(self, request: Request) -> list[str]:
+        return [f"ip:{self.get_ident(request)}"]
+
+
+class UserThrottle(SlidingWindowThrottle):
+    """Per user; anonymous requests are limited by address."""
+
+    def idents(self, request: Request) -> list[str]:
+        if request.user and request.user.is_authenticated:
+            return [f"user:{request.user.pk}"]
+        return [f"ip:{self.get_ident(request)}"]
+
+
+class EmailThrottle(SlidingWindowThrottle):
+    """Per email address in the body, from any number of addresses."""
+
+    def idents(self, request: Request) -> list[str]:
+        email = request.data.get("email")  # type: ignore
+        if not isinstance(email, str) or not email.strip():
+            return []
+        # hashed: cache keys must not hold addresses, nor spaces for memcached
+        digest = hashlib.blake2b(email.strip().lower().encode(), digest_size=16)
+        return [f"email:{digest.hexdigest()}"]
+
+
+class LoginRateThrottle(IPThrottle):
+    scope = "login"
+
+
+class LoginEmailRateThrottle(EmailThrottle):
+    scope = "login_email"
+
+
+class RegisterRateThrottle(IPThrottle):
+    scope = "register"
+
+
+class CartRateThrottle(UserThrottle):
+    scope = "cart"
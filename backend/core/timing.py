@@ -0,0 +1,172 @@
+"""
+Per-request timing: SQL, serialization and outbound HTTP, reported in a
+Server-Timing header and a JSON log line, and fed to core.metrics.
+
+ServerTimingMiddleware counts every query of every request through
+connection.execute_wrapper (about a microsecond each) and lets code time
+named spans with timed(). A sampled fraction of requests
+(SERVER_TIMING_SAMPLE_RATE) gets the header and the log line. Staff can ask
+for them on any request with `X-Server-Timing: verbose`, which also lists the
+slowest queries; their SQL is never shown to anyone else.
+
+Views declare how many queries they may run with @query_budget, others get
+QUERY_BUDGET. Going over is logged, or raises QueryBudgetExceeded when
+QUERY_BUDGET_RAISE is on, so an N+1 fails the test that triggers it.
+"""
+
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_QUERIES = 5
+_current: ContextVar["Timing | None"] = ContextVar("server_timing", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Timing:
+    """What one request spent; also its execute_wrapper."""
+
+    def __init__(self, verbose: bool):
+        self.verbose = verbose
+        self.budget = settings.QUERY_BUDGET
+        self.view = ""
+        self.queries = 0
+        self.db = 0.0
+        self.spans: dict[str, float] = {}
+        self.slowest: list[tuple[float, str]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if self.over_budget and settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(
+                f"{self.view} ran more than {self.budget} queries"
+            )
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.db += elapsed
+            if self.verbose:
+                heapq.heappush(self.slowest, (elapsed, sql))
+                if len(self.slowest) > SLOWEST_QUERIES:
+                    heapq.heappop(self.slowest)
+
+    @property
+    def over_budget(self) -> bool:
+        return bool(self.budget) and self.queries > self.budget
+
+    def header(self, total: float, verbose: bool) -> str:
+        entries = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"']
+        entries += [
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()
+        ]
+        if verbose:
+            for rank, (seconds, sql) in enumerate(sorted(self.slowest, reverse=True)):
+                desc = sql[:100].replace("\\", "\\\\").replace('"', '\\"')
+                entries.append(f'sql{rank + 1};dur={seconds * 1000:.1f};desc="{desc}"')
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def timed(name: str):
+    """Add the time spent in the block to span `name` of the current request."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timing.spans[name] = timing.spans.get(name, 0.0) + elapsed
+
+
+def query_budget(queries: int):
+    """Most queries the view may run per request; goes above @api_view."""
+
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("render"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wants_verbose = request.headers.get("X-Server-Timing") == "verbose"
+        timing = Timing(verbose=wants_verbose)
+        token = _current.set(timing)
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timing):
+                response = self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            _current.reset(token)
+        total = time.perf_counter() - started
+        metrics.observe_request(
+            request, response.status_code, total, timing.queries, timing.db
+        )
+
+        # DRF authenticates inside the view and copies the user back here
+        user = getattr(request, "user", None)
+        verbose = wants_verbose and bool(user and user.is_staff)
+        sampled = random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+        if sampled or verbose:
+            response["Server-Timing"] = timing.header(total, verbose)
+        if sampled or verbose or timing.over_budget:
+            log = logger.warning if timing.over_budget else logger.info
+            log(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "view": timing.view,
+                        "status": response.status_code,
+                        "total_ms": round(total * 1000, 1),
+                        "db_ms": round(timing.db * 1000, 1),
+                        "queries": timing.queries,
+                        "query_budget": timing.budget,
+                        "spans_ms": {
+                            name: round(seconds * 1000, 1)
+                            for name, seconds in timing.spans.items()
+                        },
+                    }
+                )
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = _current.get()
+        if timing is not None:
+            view = getattr(view_func, "cls", view_func)  # DRF views carry their class
+            timing.view = view.__name__
+            timing.budget = getattr(view_func, "query_budget", timing.budget)
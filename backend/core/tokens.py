@@ -0,0 +1,165 @@
+"""
+Refresh tokens with a blacklist check that rarely touches the database.
+
+simplejwt looks every refresh token up in BlacklistedToken. Here each
+process keeps a Bloom filter of the revoked, unexpired JTIs. It is loaded
+from the database on first use and then topped up incrementally (rows with
+a higher id) whenever the shared "jwt:blacklist:version" counter moves,
+which blacklist() bumps, or TOKEN_BLACKLIST_SYNC_INTERVAL passes (for
+caches that are not shared between processes). A JTI missing from the
+filter is certainly not revoked; a hit is confirmed in the database, since
+it may be a false positive.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from functools import cache as memoize
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+VERSION_KEY = "jwt:blacklist:version"
+# rows re-read below the highest id seen, for inserts that commit out of order
+SYNC_OVERLAP = 1000
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # double hashing: h1 + i * h2 over one 128 bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8]), int.from_bytes(digest[8:]) | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        if item in self:
+            return
+        for position in self._positions(item):
+            self.array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.array[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevokedTokens:
+    """This process's view of the blacklist."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter: BloomFilter | None = None
+        self.last_id = 0
+        self.version = None
+        self.synced_at = 0.0
+
+    def _rows(self, after: int = 0):
+        return (
+            BlacklistedToken.objects.filter(
+                id__gt=after, token__expires_at__gt=timezone.now()
+            )
+            .order_by("id")
+            .values_list("id", "token__jti")
+            .iterator(chunk_size=5000)
+        )
+
+    def sync(self) -> None:
+        version = cache.get(VERSION_KEY)
+        now = time.monotonic()
+        if (
+            self.filter is not None
+            and version == self.version
+            and now - self.synced_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+        ):
+            return
+        with self.lock:
+            rebuild = self.filter is None or self.filter.count > self.filter.capacity
+            if rebuild:
+                size = self.filter.count * 2 if self.filter else 0
+                fresh = BloomFilter(
+                    max(settings.TOKEN_BLACKLIST_FILTER_CAPACITY, size),
+                    settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE,
+                )
+                last_id = 0
+            else:
+                fresh, last_id = self.filter, self.last_id
+            for row_id, jti in self._rows(after=max(0, last_id - SYNC_OVERLAP)):
+                fresh.add(jti)
+                last_id = max(last_id, row_id)
+            self.filter, self.last_id = fresh, last_id
+            self.version, self.synced_at = version, now
+
+    def add(self, jti: str) -> None:
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+
+    def __contains__(self, jti: str) -> bool:
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+@memoize
+def revoked() -> RevokedTokens:
+    return RevokedTokens()
+
+
+def _announce(jti: str) -> None:
+    revoked().add(jti)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+
+
+class RefreshToken(BaseRefreshToken):
+    def check_blacklist(self) -> None:
+        if self.payload[api_settings.JTI_CLAIM] in revoked():
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        transaction.on_commit(lambda: _announce(jti))
+        return blacklisted
+
+
+def purge_expired(chunk_size: int = 1000) -> int:
+    """
+    Delete expired outstanding tokens, and with them their blacklist
+    entries, in bounded batches; returns how many tokens were removed.
+    An expired token fails validation on its own, so neither row is needed.
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).order_by(
+        "id"
+    )
+    total = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
@@ -1,6 +1,7 @@
 from django.urls import path
 from core import views
 from core import auth_views
+from core.exports import catalog_feed
 
 urlpatterns = [
     path("auth/register", auth_views.register_user, name="register_user"),
@@ -12,14 +13,28 @@ urlpatterns = [
     path("address", views.shipping_address, name="create_address"),
     path("address/<uuid:id>", views.shipping_address_detail, name="address"),
     path("vendors", views.become_vendor, name="vendor"),
-    path("products", views.create_product),
-    path("products/update/<uuid:id>", views.update_product),
-    path("products/delete/<uuid:id>", views.delete_product),
-    path("products/details/<uuid:id>", views.product_details),
-    path("products/all", views.list_products),
+    path("vendors/sales", views.vendor_sales, name="vendor_sales"),
+    path("products", views.create_product, name="create_product"),
+    path("products/import", views.import_products, name="import_products"),
+    path("products/update/<uuid:id>", views.update_product, name="update_product"),
+    path("products/delete/<uuid:id>", views.delete_product, name="delete_product"),
+    path("products/details/<uuid:id>", views.product_details, name="product_details"),
+    path("products/all", views.list_products, name="list_products"),
+    path("products/search", views.product_search, name="product_search"),
+    path("products/export.csv", catalog_feed, {"fmt": "csv"}, name="catalog_csv"),
+    path("products/export.xml", catalog_feed, {"fmt": "xml"}, name="catalog_xml"),
     # Cart URLs
     # path("cart", views.get_or_create_cart, name="get_or_create_cart"),
     path("cart/add/<uuid:productId>", views.add_to_cart, name="add_to_cart"),
-    path("carts", views.cart_items),
-    path("checkout", views.checkout),
+    path("carts", views.cart_items, name="cart_items"),
+    path("carts/batch", views.batch_update_cart, name="batch_update_cart"),
+    path("checkout/<uuid:ship_addr_Id>", views.checkout, name="checkout"),
+    # Orders
+    path("orders", views.list_orders, name="list_orders"),
+    path("orders/<uuid:orderId>", views.order_details, name="order_details"),
+    # Payments
+    path("orders/<uuid:orderId>/pay", views.initialize_payment, name="pay_order"),
+    path("orders/<uuid:orderId>/payment", views.payment_status, name="payment_status"),
+    path("payments/webhook", views.paystack_webhook, name="paystack_webhook"),
+    path("payments/verify/<str:refrence>", views.verify_payment, name="verify_payment"),
 ]
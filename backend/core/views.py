@@ -1,9 +1,16 @@
+import json
 from uuid import UUID
 from rest_framework.response import Response
 from rest_framework.request import Request
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    parser_classes,
+    permission_classes,
+    throttle_classes,
+)
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from core.models import (
     Cart,
@@ -11,22 +18,48 @@ from core.models import (
     Order,
     OrderItem,
     Payment,
+    PaymentOutbox,
     Product,
     ShippingAddress,
     Vendor,
 )
+from core.cache import get_or_compute, product_detail_key, product_list_key
+from core.checkout import EmptyCart, place_order
+from core.conditional import (
+    address_list_validator,
+    address_validator,
+    cart_validator,
+    conditional,
+    product_list_validator,
+    product_validator,
+)
+from core import imports
+from core.filters import SORT_ORDERINGS, filter_products, product_facets
+from core.pagination import KeysetPagination, RankedPagination
 from core.permissions import IsVendor
 from core.serializers import (
+    CartBatchSerializer,
     CartItemSerializer,
+    CartSerializer,
     OrderSerializer,
+    ProductFilterSerializer,
     ProductSerializer,
+    SalesRangeSerializer,
     ShippingAddressSerializer,
     VendorSerializer,
 )
+from core.throttling import CartRateThrottle
+from django.conf import settings
 from django.db import transaction
-from core.paystack import Paystack
-
-_paystack = Paystack()
+from django.db.models import Prefetch
+from django.urls import reverse
+from core.outbox import enqueue_payment
+from core.payments import confirm_charge, handle_event, reconcile_due, valid_signature
+from core.paystack import get_gateway
+from core.reservations import OutOfStock, reserve
+from core import sales
+from core.search import search_products
+from core.timing import query_budget, timed
 
 
 @api_view(["POST"])
@@ -42,12 +75,32 @@ def become_vendor(request: Request) -> Response:
     if serializer.is_valid():
         user.is_vendor = True
         user.is_customer = False
-        # In production activate with OTP or Magic Link via email
-        serializer.save(user=user, is_activated=True)
+        with transaction.atomic():
+            user.save(update_fields=["is_vendor", "is_customer"])
+            # In production activate with OTP or Magic Link via email
+            serializer.save(user=user, is_activated=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(4)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsVendor])
+def vendor_sales(request: Request) -> Response:
+    """Daily totals and best sellers, `?start=` to `?end=` (YYYY-MM-DD)."""
+    filters = SalesRangeSerializer(data=request.query_params)
+    if not filters.is_valid():
+        return Response(filters.errors, status=400)
+    try:
+        vendor = Vendor.objects.get(user=request.user)
+    except Vendor.DoesNotExist:
+        return Response({"details": "Vendor not found"}, status=404)
+    data = sales.dashboard(
+        vendor, filters.validated_data["start"], filters.validated_data["end"]
+    )
+    return Response(data, status=200)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated, IsVendor])
 @parser_classes([MultiPartParser, FormParser])
@@ -65,6 +118,30 @@ def create_product(request: Request) -> Response:
     return Response(serializer.errors, status=400)
 
 
+@query_budget(0)  # a few queries per chunk, so it grows with the file
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsVendor])
+@parser_classes([MultiPartParser])
+def import_products(request: Request) -> Response:
+    """
+    Create products from an uploaded `file`, .csv or .jsonl, with the fields
+    name, description, current_price, stock and image_url; see core.imports.
+    """
+    upload = request.FILES.get("file")
+    fmt = imports.format_of(upload.name) if upload else None
+    if fmt is None:
+        return Response(
+            {"details": "Upload a .csv or .jsonl file as `file`"}, status=400
+        )
+    try:
+        vendor = Vendor.objects.get(user=request.user)
+    except Vendor.DoesNotExist:
+        return Response({"details": "Only vendors can import products"}, status=400)
+
+    report = imports.import_products(vendor, upload.file, fmt)
+    return Response(report, status=200)
+
+
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated, IsVendor])
 @parser_classes([MultiPartParser, FormParser])
@@ -102,25 +179,69 @@ def delete_product(request: Request, id: UUID):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@query_budget(6)
 @api_view(["GET"])
+@conditional(product_list_validator)
 def list_products(request: Request) -> Response:
-    products = Product.objects.select_related("vendor").all()
+    params = ProductFilterSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=400)
+    filters = params.validated_data
+
+    def render() -> dict:
+        paginator = KeysetPagination(ordering=SORT_ORDERINGS[filters["sort"]])
+        products = paginator.paginate_queryset(
+            filter_products(Product.objects.select_related("vendor"), filters),
+            request,
+        )
+        serializer = ProductSerializer(
+            products, many=True, context={"request": request}
+        )
+        with timed("serialize"):
+            data = dict(paginator.get_paginated_response(serializer.data).data)
+        if filters["facets"]:
+            data["facets"] = product_facets(Product.objects.all(), filters)
+        return data
+
+    key = product_list_key(request.build_absolute_uri())
+    data = get_or_compute(key, render, settings.CATALOG_CACHE_TIMEOUT)
+    return Response(data, status=200)
+
+
+@api_view(["GET"])
+def product_search(request: Request) -> Response:
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"details": "Search query is required"}, status=400)
+
+    paginator = RankedPagination()
+    products = paginator.paginate(
+        lambda limit, offset: search_products(query, limit, offset), request
+    )
     serializer = ProductSerializer(products, many=True, context={"request": request})
-    return Response(serializer.data, status=200)
+    return paginator.get_paginated_response(serializer.data)
 
 
+@query_budget(4)
 @api_view(["GET"])
+@conditional(product_validator)
 def product_details(request: Request, id: UUID) -> Response:
-    try:
+    def render() -> dict:
         product = Product.objects.select_related("vendor").get(id=id)
-        psz = ProductSerializer(product, context={"request": request})
-        return Response(data=psz.data, status=200)
+        with timed("serialize"):
+            return dict(ProductSerializer(product, context={"request": request}).data)
+
+    key = product_detail_key(id, request.get_host())
+    try:
+        data = get_or_compute(key, render, settings.CATALOG_CACHE_TIMEOUT)
     except Product.DoesNotExist:
         return Response({"details": "product not found"}, status=404)
+    return Response(data=data, status=200)
 
 
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
+@conditional(address_list_validator, private=True)
 def shipping_address(request: Request) -> Response:
     user = request.user
     if request.method == "GET":
@@ -138,6 +259,7 @@ def shipping_address(request: Request) -> Response:
 
 @api_view(["GET", "PUT", "DELETE"])
 @permission_classes([IsAuthenticated])
+@conditional(address_validator, private=True)
 def shipping_address_detail(request: Request, id: UUID) -> Response:
     try:
         address = ShippingAddress.objects.get(id=id, user=request.user)
@@ -163,17 +285,27 @@ def shipping_address_detail(request: Request, id: UUID) -> Response:
 # cart items and cart
 
 
+def _cart_data(request: Request) -> dict:
+    # cart, its lines (joined to their products) and the total: three
+    # queries however many lines the cart holds
+    cart, _ = Cart.objects.prefetch_related(
+        Prefetch("cart_items", queryset=CartItem.objects.select_related("product"))
+    ).get_or_create(user=request.user)
+    with timed("serialize"):
+        return CartSerializer(cart, context={"request": request}).data
+
+
+@query_budget(8)  # five, plus creating the cart on a first visit
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional(cart_validator, private=True)
 def cart_items(request: Request) -> Response:
-    user = request.user
-    cart_items = user.cart.cart_items.all()
-    serializer = CartItemSerializer(cart_items, many=True)
-    return Response(serializer.data, status=200)
+    return Response(_cart_data(request), status=200)
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([CartRateThrottle])
 def add_to_cart(request: Request, productId: UUID) -> Response:
     try:
         product = Product.objects.get(id=productId)
@@ -184,25 +316,95 @@ def add_to_cart(request: Request, productId: UUID) -> Response:
         return Response({"details": "Product is out of stock"}, status=400)
 
     count = request.data.get("quantity", 1)  # type: ignore
-    with transaction.atomic():
-        cart_item, created = CartItem.objects.get_or_create(
-            product=product, quantity=count
+    try:
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user=request.user)
+            cart_item, created = CartItem.objects.get_or_create(
+                cart=cart, product=product, defaults={"quantity": count}
+            )
+            if not created:
+                cart_item.quantity += int(count)
+                cart_item.save()
+            reserve(cart, {product.id: cart_item.quantity})
+    except OutOfStock:
+        return Response({"details": "Product is out of stock"}, status=400)
+    return Response({"details": "Product added to cart"}, status=200)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@throttle_classes([CartRateThrottle])
+def batch_update_cart(request: Request) -> Response:
+    """
+    Apply many {product_id, quantity} operations in one transaction. In
+    "set" mode quantity replaces the line (0 removes it); in "add" mode it is
+    added to the existing line, e.g. when merging a guest cart.
+    """
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    mode = serializer.validated_data["mode"]
+
+    # repeated products collapse into one operation
+    requested: dict[UUID, int] = {}
+    for item in serializer.validated_data["items"]:
+        previous = requested.get(item["product_id"], 0) if mode == "add" else 0
+        requested[item["product_id"]] = previous + item["quantity"]
+
+    found = Product.objects.filter(id__in=requested).values_list("id", flat=True)
+    missing = [str(pk) for pk in set(requested) - set(found)]
+    if missing:
+        return Response(
+            {"details": "Products not found", "products": missing}, status=404
         )
-        if not created:
-            cart_item.quantity += int(count)
-            cart_item.save()
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart.cart_items.add(cart_item)
-        return Response({"details": "Product added to cart"}, status=200)
-    return Response({"details": "Could not add to cart"}, status=500)
+    try:
+        _apply_cart_batch(request.user, mode, requested)
+    except OutOfStock as e:
+        return Response(
+            {"details": "Not enough stock", "products": e.products}, status=400
+        )
+    return Response(_cart_data(request), status=200)
+
+
+def _apply_cart_batch(user, mode: str, requested: dict[UUID, int]) -> None:
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        # serialize concurrent batches against the same cart
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+
+        quantities = dict(requested)
+        if mode == "add":
+            existing = cart.cart_items.filter(product_id__in=requested).values_list(
+                "product_id", "quantity"
+            )
+            for product_id, quantity in existing:
+                quantities[product_id] += quantity
+
+        # holds follow the lines; raises OutOfStock (rolling back) when short
+        reserve(cart, quantities)
+
+        upserts = [
+            CartItem(cart=cart, product_id=pk, quantity=qty)
+            for pk, qty in quantities.items()
+            if qty > 0
+        ]
+        CartItem.objects.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=["cart", "product"],
+            update_fields=["quantity", "updated_at"],
+        )
+        removed = [pk for pk, qty in quantities.items() if qty == 0]
+        if removed:
+            cart.cart_items.filter(product_id__in=removed).delete()
 
 
 @api_view(["GET", "PUT", "DELETE"])
 @permission_classes([IsAuthenticated])
 def cart_item_detail(request: Request, id: UUID) -> Response:
     try:
-        cart_item = CartItem.objects.get(id=id, user=request.user)
+        cart_item = CartItem.objects.get(id=id, cart__user=request.user)
     except CartItem.DoesNotExist:
         return Response({"details": "Cart item not found"}, status=404)
     if request.method == "GET":
@@ -224,14 +426,10 @@ def cart_item_detail(request: Request, id: UUID) -> Response:
 @permission_classes([IsAuthenticated])
 def checkout(request: Request, ship_addr_Id: UUID) -> Response:
     try:
-        cart = Cart.objects.prefetch_related("carts").get(user=request.user)
+        cart = Cart.objects.get(user=request.user)
     except Cart.DoesNotExist:
         return Response({"details": "Cart not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    cartitems = cart.cart_items.all()
-    if cartitems.count() == 0:
-        return Response({"details": "Cart is empty"}, status=status.HTTP_404_NOT_FOUND)
-
     try:
         shipp_addr = ShippingAddress.objects.get(id=ship_addr_Id, user=request.user)
     except ShippingAddress.DoesNotExist:
@@ -239,151 +437,178 @@ def checkout(request: Request, ship_addr_Id: UUID) -> Response:
             {"details": "Shipping address not found"}, status=status.HTTP_404_NOT_FOUND
         )
 
-    # Create the order and its items inside a transaction
     try:
-        with transaction.atomic():
-            order = Order.objects.create(
-                user=request.user, shipp_addr=shipp_addr, amount=0
-            )
-
-            # Create OrderItems from CartItems
-            for ci in cartitems:
-                product = ci.product
-                if product.stock < ci.quantity:
-                    # Out of stock; rollback
-                    raise ValueError(
-                        f"Product '{product.name}' does not have enough stock"
-                    )
-
-                order_item = OrderItem.objects.create(
-                    product=product,
-                    quantity=ci.quantity,
-                    price_per_item=product.current_price,
-                )
-
-                order.order_items.add(order_item)
-
-                # decrement stock and save product
-                product.stock = product.stock - ci.quantity
-                product.save()
-
-            # Recalculate and save order amount (Order.save computes amount from items)
-            order.save()
-
-            # Clear the cart: delete cart items and clear m2m
-            for ci in cartitems:
-                # remove from any carts and delete the cart item
-                ci.delete()
-            cart.cart_items.clear()
-
-    except ValueError as e:
+        order = place_order(cart, shipp_addr)
+    except EmptyCart as e:
+        return Response({"details": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except OutOfStock as e:
         return Response({"details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
     except Exception:
         return Response(
             {"details": "Could not create order"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    # serializer = OrderSerializer(order)
-    response = _paystack.initialize_transaction(
-        request.user.email, order.total_amount()
+    return Response(
+        {
+            "order": order.id,
+            "order_refrence": order.order_refrence,
+            "amount": order.amount,
+            "payment": _payment_status_data(order.outbox),
+        },
+        status=status.HTTP_201_CREATED,
     )
-    if not response["status"]:
-        return Response(data=response, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-    refrence = response["data"]["reference"]
-    with transaction.atomic():
-        order.status = Order.Status.Processing
-        Payment.objects.create(
-            order=order,
-            amount=order.total_amount,
-            paystack_refrence=refrence,
-            user=request.user,
+
+
+def _orders_queryset(user):
+    """A user's orders with everything OrderSerializer reads, in two queries."""
+    return (
+        Order.objects.filter(user=user)
+        .select_related("shipping_address")
+        .prefetch_related(
+            Prefetch(
+                "order_items", queryset=OrderItem.objects.select_related("product")
+            )
         )
-    return Response(data=response, status=status.HTTP_201_CREATED)
+    )
 
 
+@query_budget(3)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_orders(request: Request) -> Response:
-    orders = Order.objects.filter(user=request.user).prefetch_related("order_items")
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data, status=200)
+    """Newest first, in keyset pages: `?cursor=` and `?page_size=`."""
+    paginator = KeysetPagination()
+    orders = paginator.paginate_queryset(_orders_queryset(request.user), request)
+    with timed("serialize"):
+        data = OrderSerializer(orders, many=True, context={"request": request}).data
+    return paginator.get_paginated_response(data)
 
 
+@query_budget(3)
 @api_view(["GET"])
+@permission_classes([IsAuthenticated])
 def order_details(request: Request, orderId: UUID) -> Response:
     try:
-        order = Order.objects.prefetch_related("order_items").get(
-            user=request.user, id=orderId
-        )
+        order = _orders_queryset(request.user).get(id=orderId)
     except Order.DoesNotExist:
         return Response(
             {"details": "Order not found"}, status=status.HTTP_404_NOT_FOUND
         )
-    serializer = OrderSerializer(order)
+    serializer = OrderSerializer(order, context={"request": request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+def _payment_status_data(entry: PaymentOutbox) -> dict:
+    return {
+        "status": entry.status,
+        "reference": entry.reference,
+        "authorization_url": entry.authorization_url or None,
+        "access_code": entry.access_code or None,
+        "attempts": entry.attempts,
+        "status_url": reverse("payment_status", args=[entry.order_id]),
+    }
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def initialize_payment(request: Request, orderId: UUID) -> Response:
-    try:
-        order = Order.objects.get(user=request.user, id=orderId)
-    except Order.DoesNotExist:
-        return Response(
-            {"details": "Order not found"}, status=status.HTTP_404_NOT_FOUND
-        )
-
-    if order.status != Order.Status.Pending:
-        return Response(
-            {"details": "Only pending orders can be paid for"},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
-
-    response = _paystack.initialize_transaction(
-        request.user.email, order.total_amount()
-    )
-    if not response["status"]:
-        return Response(data=response, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-    refrence = response["data"]["reference"]
+    """Queue payment initialization again for an order whose delivery failed."""
     with transaction.atomic():
-        order.status = Order.Status.Processing
-        Payment.objects.create(
-            order=order,
-            amount=order.total_amount,
-            paystack_refrence=refrence,
-            user=request.user,
-        )
-        order.save()
+        try:
+            order = (
+                Order.objects.select_for_update()
+                .select_related("outbox")
+                .get(user=request.user, id=orderId)
+            )
+        except Order.DoesNotExist:
+            return Response(
+                {"details": "Order not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        if order.status != Order.Status.Pending:
+            return Response(
+                {"details": "Only pending orders can be paid for"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        entry = getattr(order, "outbox", None)
+        if entry is None or entry.status == PaymentOutbox.Status.Failed:
+            entry = enqueue_payment(order, request.user.email)
 
-    return Response(data=response, status=status.HTTP_200_OK)
+    return Response(_payment_status_data(entry), status=status.HTTP_202_ACCEPTED)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def verify_payment(request: Request, refrence: str):
-    if not refrence:
-        return Response({"details": "response code not found"}, status=400)
+def payment_status(request: Request, orderId: UUID) -> Response:
+    """
+    Poll for the authorization URL of a checkout: 202 while the payment is
+    being initialized, 200 once it is ready, 502 if initialization failed.
+    """
+    try:
+        entry = PaymentOutbox.objects.get(order__user=request.user, order_id=orderId)
+    except PaymentOutbox.DoesNotExist:
+        return Response(
+            {"details": "Payment not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+    code = {
+        PaymentOutbox.Status.Pending: status.HTTP_202_ACCEPTED,
+        PaymentOutbox.Status.Sent: status.HTTP_200_OK,
+        PaymentOutbox.Status.Failed: status.HTTP_502_BAD_GATEWAY,
+    }[entry.status]
+    return Response(_payment_status_data(entry), status=code)
 
-    response = _paystack.verify_transaction(refrence)
-    if not response["status"]:
-        return Response(data=response, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def verify_payment(request: Request, refrence: str) -> Response:
     try:
-        payment = Payment.objects.select_related("payments").get(
-            paystack_refrence=refrence, user=request.user
+        payment = Payment.objects.select_related("order").get(
+            payment_refrence=refrence, user=request.user
         )
     except Payment.DoesNotExist:
         return Response(
-            {"details": f"Payment with the refrence{refrence} does no exist for you"}
+            {"details": "Payment not found"}, status=status.HTTP_404_NOT_FOUND
         )
 
-    payment.order.status = Order.Status.Successful
-    payment.payment_status = Payment.Payment_Status.Successful
-    payment.save()
+    # the webhook confirms payments; ask Paystack only if it seems to be late
+    if payment.payment_status != Payment.Payment_Status.Successful and reconcile_due(
+        refrence
+    ):
+        response = get_gateway().verify_transaction(refrence)
+        if response["status"] and confirm_charge(response["data"]):
+            payment.refresh_from_db()
+            payment.order.refresh_from_db(fields=["status"])
+
+    return Response(
+        {
+            "reference": payment.payment_refrence,
+            "payment_status": payment.payment_status,
+            "is_verified": payment.is_verified,
+            "order_status": payment.order.status,
+        },
+        status=status.HTTP_200_OK,
+    )
 
-    ## process shipping
-    ## notify the customer
 
-    return Response(data=response, status=status.HTTP_200_OK)
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def paystack_webhook(request: Request) -> Response:
+    body = request.body
+    if not valid_signature(body, request.headers.get("x-paystack-signature", "")):
+        return Response(
+            {"details": "Invalid signature"}, status=status.HTTP_401_UNAUTHORIZED
+        )
+    try:
+        event = json.loads(body)
+        if not isinstance(event.get("event"), str) or not isinstance(
+            event.get("data"), dict
+        ):
+            raise ValueError
+        handle_event(event, body)
+    except (ValueError, TypeError, AttributeError, ArithmeticError):
+        return Response(
+            {"details": "Malformed event"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(status=status.HTTP_200_OK)
@@ -0,0 +1,24 @@
+"""
+gunicorn settings, read from the working directory by default.
+
+Metrics are shared between workers through PROMETHEUS_MULTIPROC_DIR (see
+core.metrics): start from an empty directory and retire the files of
+workers that exit, so their gauges stop counting.
+"""
+
+import os
+import shutil
+
+
+def on_starting(server):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,7 +29,7 @@ SECRET_KEY = config("SECRET_KEY")
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config("DEBUG", cast=bool, default=False)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config("ALLOWED_HOSTS", cast=Csv(), default="")
 
 
 # Application definition
@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.timing.ServerTimingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -109,6 +110,42 @@ DATABASES = {
         "PORT": config("DATABASE_PORT", cast=int),
     }
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # Writers take SQLite's lock when their transaction begins (BEGIN
+    # IMMEDIATE) and wait for it, instead of failing with "database is
+    # locked" when a read lock cannot be upgraded. SQLite has no row locks,
+    # so this is what serializes checkouts there. Tests use a file database,
+    # since a shared in-memory one fails concurrent writers outright.
+    _sqlite_name = Path(DATABASES["default"]["NAME"])
+    DATABASES["default"]["OPTIONS"] = {"transaction_mode": "IMMEDIATE", "timeout": 20}
+    DATABASES["default"]["TEST"] = {
+        "NAME": config(
+            "DATABASE_TEST_NAME",
+            default=str(_sqlite_name.with_name(f"test_{_sqlite_name.name}")),
+        )
+    }
+# Cache
+# Local development uses locmem; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (file based, redis, memcached) when running several workers.
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="zconfig"),
+    }
+}
+
+# Catalog read-through cache (seconds)
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", cast=int, default=300)
+CATALOG_CACHE_LOCK_TIMEOUT = config("CATALOG_CACHE_LOCK_TIMEOUT", cast=int, default=5)
+
+# Users resolved from JWTs (core.cache.cached_user): shared cache lifetime,
+# and lifetime and size of each process's LRU (seconds, entries)
+USER_CACHE_TIMEOUT = config("USER_CACHE_TIMEOUT", cast=int, default=300)
+USER_CACHE_LOCAL_TTL = config("USER_CACHE_LOCAL_TTL", cast=float, default=30)
+USER_CACHE_LOCAL_SIZE = config("USER_CACHE_LOCAL_SIZE", cast=int, default=1024)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -132,9 +169,59 @@ AUTH_PASSWORD_VALIDATORS = [
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "core.auth_middleware.JWTCookieAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+        "core.auth_middleware.CachedJWTAuthentication",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.timing.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    # core.throttling scopes: login and register per address, login_email
+    # per submitted email, cart per user
+    "DEFAULT_THROTTLE_RATES": {
+        "login": config("THROTTLE_LOGIN", default="20/min"),
+        "login_email": config("THROTTLE_LOGIN_EMAIL", default="5/min"),
+        "register": config("THROTTLE_REGISTER", default="10/hour"),
+        "cart": config("THROTTLE_CART", default="60/min"),
+    },
+    # proxies in front of the app whose X-Forwarded-For entry is trusted
+    "NUM_PROXIES": config("NUM_PROXIES", cast=int, default=0),
 }
+THROTTLING = config("THROTTLING", cast=bool, default=True)
+
+# Request timing (core.timing): share of requests that get a Server-Timing
+# header and a log line, and the query budget of views without their own
+SERVER_TIMING_SAMPLE_RATE = config(
+    "SERVER_TIMING_SAMPLE_RATE", cast=float, default=0.01
+)
+QUERY_BUDGET = config("QUERY_BUDGET", cast=int, default=50)
+QUERY_BUDGET_RAISE = config("QUERY_BUDGET_RAISE", cast=bool, default=False)
+
+# Bearer token required by /metrics (core.metrics); empty leaves it open
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Catalog pagination (products/all)
+CATALOG_PAGE_SIZE = config("CATALOG_PAGE_SIZE", cast=int, default=24)
+CATALOG_MAX_PAGE_SIZE = config("CATALOG_MAX_PAGE_SIZE", cast=int, default=100)
+# Lower edges (NGN) of the price facet buckets; the last bucket is open-ended
+CATALOG_PRICE_BUCKETS = [0, 5_000, 20_000, 50_000, 100_000, 500_000]
+
+# Catalog exports (core.exports): product pages live on the storefront at
+# CATALOG_SITE_URL; the live feeds need CATALOG_FEED_TOKEN and are off without it
+CATALOG_SITE_URL = config("CATALOG_SITE_URL", default="http://localhost:3000")
+CATALOG_FEED_TITLE = config("CATALOG_FEED_TITLE", default="Product catalog")
+CATALOG_CURRENCY = "NGN"
+CATALOG_FEED_TOKEN = config("CATALOG_FEED_TOKEN", default="")
+# origin of relative media URLs in feeds written by export_catalog
+CATALOG_MEDIA_BASE_URL = config(
+    "CATALOG_MEDIA_BASE_URL", default="http://localhost:8000"
+)
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", cast=int, default=2000)
+
+# Most operations accepted by one POST /api/carts/batch
+CART_BATCH_MAX_ITEMS = config("CART_BATCH_MAX_ITEMS", cast=int, default=100)
+
+# Seconds a cart line holds its units before they return to the pool
+STOCK_RESERVATION_TTL = config("STOCK_RESERVATION_TTL", cast=int, default=15 * 60)
 
 # Simple JWT Authentication Config
 SIMPLE_JWT = {
@@ -155,6 +242,19 @@ SIMPLE_JWT = {
     "JTI_CLAIM": "jti",
 }
 
+# Refresh token blacklist filter (core.tokens): expected revoked, unexpired
+# tokens, false positive rate, and seconds between syncs when the cache
+# is not shared between processes
+TOKEN_BLACKLIST_FILTER_CAPACITY = config(
+    "TOKEN_BLACKLIST_FILTER_CAPACITY", cast=int, default=100_000
+)
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = config(
+    "TOKEN_BLACKLIST_FILTER_ERROR_RATE", cast=float, default=0.001
+)
+TOKEN_BLACKLIST_SYNC_INTERVAL = config(
+    "TOKEN_BLACKLIST_SYNC_INTERVAL", cast=float, default=5
+)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -192,15 +292,78 @@ EMAIL_USE_TLS = config("EMAIL_USE_TLS", cast=bool)
 # EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL")
 
-
-# # Django Resized settings
-DJANGO_RESIZED_DEFAULT_SIZE = [300, 300]
-DJANGO_RESIZED_DEFAULT_QUALITY = 75
-DJANGO_RESIZED_DEFAULT_KEEP_META = False
-DJANGO_RESIZED_DEFAULT_FORCE_FORMAT = "AVIF"
-DJANGO_RESIZED_DEFAULT_FORMAT_EXTENSIONS = {"JPEG": ".jpg", "AVIF": ".avif"}
-# DJANGO_RESIZED_DEFAULT_NORMALIZE_ROTATION = True
+# Background jobs (core.jobs, runworker): worker threads, jobs claimed per
+# round, seconds a claimed job stays leased, and retry policy
+JOBS_CONCURRENCY = config("JOBS_CONCURRENCY", cast=int, default=2)
+JOBS_BATCH_SIZE = config("JOBS_BATCH_SIZE", cast=int, default=20)
+JOBS_LEASE = config("JOBS_LEASE", cast=int, default=300)
+JOBS_POLL_INTERVAL = config("JOBS_POLL_INTERVAL", cast=float, default=1.0)
+JOBS_MAX_ATTEMPTS = config("JOBS_MAX_ATTEMPTS", cast=int, default=5)
+# Failed jobs back off from JOBS_BACKOFF seconds, doubling per attempt
+JOBS_BACKOFF = config("JOBS_BACKOFF", cast=int, default=10)
+JOBS_BACKOFF_MAX = config("JOBS_BACKOFF_MAX", cast=int, default=3600)
+
+
+# Responsive image variants (core.images), encoded by the job worker in a
+# pool of IMAGE_WORKERS processes; 0 encodes inline in the worker thread
+IMAGE_VARIANT_WIDTHS = [150, 300, 600, 1200]
+IMAGE_VARIANT_FORMATS = ["avif", "webp", "jpeg"]
+IMAGE_VARIANT_QUALITY = config("IMAGE_VARIANT_QUALITY", cast=int, default=75)
+IMAGE_WORKERS = config("IMAGE_WORKERS", cast=int, default=2)
+# Uploads (thumbnails, avatars, imported images) are checked on arrival and
+# shrunk to fit IMAGE_UPLOAD_MAX_SIDE; only the variants are left to the pool
+IMAGE_UPLOAD_MAX_BYTES = config(
+    "IMAGE_UPLOAD_MAX_BYTES", cast=int, default=5 * 1024 * 1024
+)
+IMAGE_UPLOAD_MAX_PIXELS = config(
+    "IMAGE_UPLOAD_MAX_PIXELS", cast=int, default=50_000_000
+)
+IMAGE_UPLOAD_MAX_SIDE = config("IMAGE_UPLOAD_MAX_SIDE", cast=int, default=1920)
+IMAGE_UPLOAD_FORMATS = ["JPEG", "PNG", "WEBP", "GIF"]
+
+# Bulk product import (core.imports): rows per bulk_create, errors reported,
+# and the limits on the image each row links to
+IMPORT_CHUNK_SIZE = config("IMPORT_CHUNK_SIZE", cast=int, default=500)
+IMPORT_MAX_ERRORS = config("IMPORT_MAX_ERRORS", cast=int, default=1000)
+IMPORT_IMAGE_MAX_BYTES = config(
+    "IMPORT_IMAGE_MAX_BYTES", cast=int, default=10 * 1024 * 1024
+)
+IMPORT_IMAGE_TIMEOUT = config("IMPORT_IMAGE_TIMEOUT", cast=float, default=10.0)
+# fetch image URLs that resolve to private or loopback addresses
+IMPORT_IMAGE_ALLOW_PRIVATE = config(
+    "IMPORT_IMAGE_ALLOW_PRIVATE", cast=bool, default=False
+)
 
 
 # Paystack Settings
 PAYSTACK_SECRET_KEY = config("PAYSTACK_SECRET_KEY")
+PAYSTACK_BASE_URL = config("PAYSTACK_BASE_URL", default="https://api.paystack.co")
+# Seconds to open a connection / wait between bytes of the response
+PAYSTACK_CONNECT_TIMEOUT = config("PAYSTACK_CONNECT_TIMEOUT", cast=float, default=3.05)
+PAYSTACK_READ_TIMEOUT = config("PAYSTACK_READ_TIMEOUT", cast=float, default=10.0)
+# Kept-alive connections per process
+PAYSTACK_POOL_SIZE = config("PAYSTACK_POOL_SIZE", cast=int, default=10)
+# Retries of idempotent calls; backoff doubles from PAYSTACK_BACKOFF seconds
+PAYSTACK_MAX_RETRIES = config("PAYSTACK_MAX_RETRIES", cast=int, default=2)
+PAYSTACK_BACKOFF = config("PAYSTACK_BACKOFF", cast=float, default=0.25)
+PAYSTACK_BACKOFF_MAX = config("PAYSTACK_BACKOFF_MAX", cast=float, default=2.0)
+# Consecutive failed calls that open the breaker, and seconds it stays open
+PAYSTACK_BREAKER_THRESHOLD = config("PAYSTACK_BREAKER_THRESHOLD", cast=int, default=5)
+PAYSTACK_BREAKER_RESET = config("PAYSTACK_BREAKER_RESET", cast=float, default=30.0)
+# Webhooks confirm payments; a polling client may fall back to the verify API
+# at most once per this many seconds per reference
+PAYSTACK_VERIFY_INTERVAL = config("PAYSTACK_VERIFY_INTERVAL", cast=int, default=30)
+
+# Client used to initialize payments; core.paystack.FakePaystack works offline
+PAYMENT_GATEWAY = config("PAYMENT_GATEWAY", default="core.paystack.Paystack")
+# Payment outbox worker: threads per worker, entries claimed per round, and
+# seconds a claimed entry stays leased before another worker may retry it
+PAYMENT_OUTBOX_WORKERS = config("PAYMENT_OUTBOX_WORKERS", cast=int, default=4)
+PAYMENT_OUTBOX_BATCH_SIZE = config("PAYMENT_OUTBOX_BATCH_SIZE", cast=int, default=50)
+PAYMENT_OUTBOX_LEASE = config("PAYMENT_OUTBOX_LEASE", cast=int, default=60)
+# Failed deliveries back off from PAYMENT_OUTBOX_BACKOFF seconds, doubling
+PAYMENT_OUTBOX_MAX_ATTEMPTS = config("PAYMENT_OUTBOX_MAX_ATTEMPTS", cast=int, default=5)
+PAYMENT_OUTBOX_BACKOFF = config("PAYMENT_OUTBOX_BACKOFF", cast=int, default=15)
+PAYMENT_OUTBOX_BACKOFF_MAX = config(
+    "PAYMENT_OUTBOX_BACKOFF_MAX", cast=int, default=3600
+)
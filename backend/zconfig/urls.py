@@ -22,6 +22,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from core.metrics import metrics_view
 # from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
@@ -34,6 +35,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("core.urls")),
     path("health", healthcheck),
+    path("metrics", metrics_view, name="metrics"),
     # path("api/token", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     # path("api/token/refresh", TokenRefreshView.as_view(), name="token_refresh"),
 ]
@@ -16,7 +16,7 @@ export async function GetProductDetails(
 export async function GetAllProductDetails(): Promise<Product[] | undefined> {
   try {
     const response = await axiosInstance.get("/api/products/all");
-    return response.data;
+    return response.data.results;
   } catch (err) {
     console.error(err);
     return undefined;